@@ -1,18 +1,63 @@
-from typing import Optional
+import re
+from typing import Iterable, Optional, Tuple, Union
 
 from .core.board import (get_raw_piece, is_empty_square, print_board,
-                    sq_to_index, get_piece_color, PAWN, Color, PieceName,
-                    Board)
-from .core.piece_movement_rules import (is_castle_move, is_in_check, is_in_checkmate,
+                    sq_to_index, get_piece_color, PAWN, QUEEN, Color, PieceName,
+                    Board, MOVE_PROMOTION_SHIFT, NAME_TO_CODE, TYPE_MASK, get_color)
+from .core.piece_movement_rules import (gen_legal_move_codes, is_castle_move, is_in_check, is_in_checkmate,
                                    is_in_stalemate, is_legal_move, is_valid_en_passant)
 from .core import utils
-from .core.move import Move
+from .core.move import MOVE_SQUARES_MASK, Move, pack_move
 
 
 class MoveError(Exception):
     pass
 
 
+class IllegalMoveError(MoveError):
+    """A move given to Game.apply_moves which can't be played"""
+
+    def __init__(self, ply: int, move, color: Color, reason: str):
+        """
+        :param ply: position of the move in the moves given, from 1
+        :param move: the move as it was given
+        :param color: player whose move it was
+        :param reason: why the move can't be played
+        """
+        super().__init__("ply {} ({} to move): {}: {}".format(ply, utils.full_color_name(color), move, reason))
+        self.ply = ply
+        self.move = move
+        self.color = color
+        self.reason = reason
+
+
+_UCI_MOVE = re.compile(r"^([a-h][1-8])([a-h][1-8])([nbrqNBRQ]?)$")
+_SQUARE = re.compile(r"^[a-h][1-8]$")
+
+# a move for Game.apply_moves: UCI (e.g. "e2e4" or "e7e8q"), (from square, to square, promotion) or a Move
+MoveInput = Union[str, Tuple[str, str, Optional[PieceName]], Move]
+# bits of a packed move which tell the moves of a position apart
+LOOKUP_MASK = MOVE_SQUARES_MASK | (TYPE_MASK << MOVE_PROMOTION_SHIFT)
+
+
+def _parse_move_input(move: MoveInput) -> Optional[Tuple[str, str, Optional[str]]]:
+    """:returns: (from square, to square, promotion or None), or None if the move can't be read"""
+    if isinstance(move, str):
+        match = _UCI_MOVE.match(move)
+        return (match.groups() if match else None)
+    if isinstance(move, Move):
+        return _parse_move_input(move.uci())
+    if not isinstance(move, (tuple, list)) or len(move) != 3:
+        return None
+    from_square, to_square, promotion = move
+    if not (isinstance(from_square, str) and _SQUARE.match(from_square) and
+            isinstance(to_square, str) and _SQUARE.match(to_square)):
+        return None
+    if promotion not in (None, "", "N", "B", "R", "Q", "n", "b", "r", "q"):
+        return None
+    return from_square, to_square, promotion
+
+
 class Game:
 
     def __init__(self, board: Optional[list] = None):
@@ -37,8 +82,8 @@ class Game:
                 return "O-O-O"
 
         else:
-            is_ep = get_raw_piece(self._board._board[from_index]) == PAWN and is_valid_en_passant(self._board, from_index, to_index)
-            piece = get_raw_piece(self._board._board[from_index])
+            is_ep = get_raw_piece(self._board[from_index]) == PAWN and is_valid_en_passant(self._board, from_index, to_index)
+            piece = get_raw_piece(self._board[from_index])
             s = ("-" if is_empty_square(self._board, to_index) and not is_ep else "x")
             if promotion:
                 # promotion always pawn
@@ -71,19 +116,18 @@ class Game:
 
         if not is_legal_move(self._board, from_index, to_index):
             print_board(self._board)
-            piece = self._board._board[from_index]
+            piece = self._board[from_index]
             color = utils.full_color_name(get_piece_color(piece))
             raise MoveError("{} cannot move piece {} from {} to {}".format(
                 color, piece, from_square, to_square
             ))
 
-        # is_ep = (get_raw_piece(self._board[from_index]) == PAWN and
-        #          is_valid_en_passant(self._board, from_index, to_index))
         is_castle = is_castle_move(self._board, from_index, to_index)
-        is_ep = is_valid_en_passant(self._board, from_index, to_index)
+        is_ep = (get_raw_piece(self._board[from_index]) == PAWN and
+                 is_valid_en_passant(self._board, from_index, to_index))
 
         move = Move(
-            piece=self._board._board[from_index],
+            piece=self._board[from_index],
             src=from_index,
             dest=to_index,
             promotion=promotion,
@@ -92,6 +136,42 @@ class Game:
         )
         self._board.move_piece(move)
 
+    def apply_moves(self, moves: Iterable[MoveInput]) -> int:
+        """Play the moves one after the other, each by the player to move.
+        The legal moves of the piece moved are generated once for each position, with the checks and pins
+        found once, and the move is looked up among them. Nothing is printed.
+        :returns: number of moves played
+        :raises IllegalMoveError: for the first move that can't be played. The moves before it stay played"""
+        board = self._board
+        played = 0
+        for ply, move in enumerate(moves, start=1):
+            color = board.get_turn()
+            parts = _parse_move_input(move)
+            if parts is None:
+                raise IllegalMoveError(ply, move, color, "not a move")
+            from_square, to_square, promotion = parts
+            from_index = sq_to_index(from_square)
+            to_index = sq_to_index(to_square)
+            promotion_type = (NAME_TO_CODE[promotion.upper()] if promotion else 0)
+
+            # legal moves by source, destination and promotion
+            legal = {code & LOOKUP_MASK: code for code in gen_legal_move_codes(board, color, from_index)}
+            code = legal.get(pack_move(from_index, to_index, promotion_type))
+            if code is None:
+                if is_empty_square(board, from_index):
+                    reason = "no piece on {}".format(from_square)
+                elif get_color(board, from_index) != color:
+                    reason = "the piece on {} is not {}'s".format(from_square, utils.full_color_name(color))
+                elif (promotion_type == 0 and
+                      legal.get(pack_move(from_index, to_index, NAME_TO_CODE[QUEEN]))):
+                    reason = "promotion piece missing"
+                else:
+                    reason = "illegal move"
+                raise IllegalMoveError(ply, move, color, reason)
+            board.make_move(code)
+            played += 1
+        return played
+
     def is_in_checkmate(self, color: Color) -> bool:
         return is_in_checkmate(self._board, color)
 
@@ -1,12 +1,163 @@
+import sys
 from argparse import ArgumentParser
 
 from chess_engine.game import game_loop
 from chess_engine.core.utils import setup_logging
 
 
+def perft_main(args) -> int:
+    from chess_engine.perft import PERFT_POSITIONS, run_perft, run_suite
+
+    if args.suite:
+        return (0 if run_suite(args.depth) else 1)
+    fen = (args.fen or PERFT_POSITIONS[0].fen)
+    run_perft(fen, args.depth, show_divide=args.divide, table_mb=args.hash_mb,
+              workers=args.workers, split_ply=args.split_ply)
+    return 0
+
+
+def mate_main(args) -> int:
+    from chess_engine.book import OpeningBook
+    from chess_engine.core.board import fen_to_board
+    from chess_engine.engine import find_mate_in_n
+    from chess_engine.parallel import run_speedup
+
+    if args.compare:
+        run_speedup(args.fen, args.n, args.workers, parallel=args.parallel)
+        return 0
+    board = fen_to_board(args.fen)
+    stats = {}  # type: dict
+    book = (None if args.book is None else OpeningBook(args.book))
+    try:
+        score, moves = find_mate_in_n(board, board.get_turn(), args.n, stats_dict=stats, workers=args.workers,
+                                      parallel=args.parallel, search=args.search, checks_only=args.checks_only,
+                                      book=book)
+    finally:
+        if book is not None:
+            book.close()
+    print("score %d: %s" % (score, " ".join(move.show(board) for move in moves)))
+    if "worker_nodes" in stats:
+        print("nodes by worker: %s" % ", ".join(str(nodes) for nodes in stats["worker_nodes"]))
+    return 0
+
+
+def solve_main(args) -> int:
+    from chess_engine.solve import run_solve
+
+    run_solve(args.input, args.output, default_n=args.n, workers=args.workers, time_limit=args.time_limit,
+              node_limit=args.node_limit, tt_size_mb=args.hash_mb, window=args.window, book_path=args.book)
+    return 0
+
+
+def replay_main(args) -> int:
+    from chess_engine.pgn import run_replay
+
+    run_replay(args.paths, throughput=args.throughput)
+    return 0
+
+
+def book_main(args) -> int:
+    from chess_engine.book import run_build_book
+
+    run_build_book(args.paths, args.output, max_ply=args.max_ply, min_games=args.min_games)
+    return 0
+
+
+def batch_eval_main(args) -> int:
+    # NumPy is only needed here, so the other subcommands run without it
+    try:
+        from chess_engine.batch_eval import run_batch_eval
+    except ImportError as e:
+        if e.name != "numpy":
+            raise
+        print("batch-eval needs NumPy: pip install numpy", file=sys.stderr)
+        return 1
+
+    run_batch_eval(args.paths, repeat=args.repeat)
+    return 0
+
+
 if __name__ == "__main__":
     parser = ArgumentParser()
     parser.add_argument("-v", "--verbose", action="store_true")
+    subparsers = parser.add_subparsers(dest="command")
+
+    perft_parser = subparsers.add_parser("perft", help="count the positions reached after a number of moves")
+    perft_parser.add_argument("-d", "--depth", type=int, default=3,
+                              help="number of moves (for --suite, the deepest depth checked)")
+    perft_parser.add_argument("--fen", help="position to count from, the starting position by default")
+    perft_parser.add_argument("--divide", action="store_true", help="show the count for each first move")
+    perft_parser.add_argument("--suite", action="store_true",
+                              help="check the counts of the reference positions")
+    perft_parser.add_argument("--hash-mb", type=float, default=0,
+                              help="size in megabytes of the cache of subtree counts (per process), 0 for none")
+    perft_parser.add_argument("-j", "--workers", type=int, default=1, help="number of processes to count with")
+    perft_parser.add_argument("--split-ply", type=int, choices=[1, 2], default=1,
+                              help="split the work between processes after the first or the second move")
+
+    mate_parser = subparsers.add_parser("mate", help="find a mate in a number of moves")
+    mate_parser.add_argument("fen", help="position to search, the side to move gives mate")
+    mate_parser.add_argument("-n", type=int, default=3, help="number of moves to mate in")
+    mate_parser.add_argument("-j", "--workers", type=int, default=1,
+                             help="number of processes to search with")
+    mate_parser.add_argument("--parallel", choices=["root-split", "lazy-smp"], default="root-split",
+                             help="split the root moves between the processes, or have each search the whole tree "
+                                  "with a shared transposition table")
+    mate_parser.add_argument("--search", choices=["negamax", "minimax", "df-pn"], default="negamax",
+                             help="df-pn proves the mate in n directly with a proof-number search, "
+                                  "which is much faster on long forcing mates but may not find the shortest one")
+    mate_parser.add_argument("--checks-only", action="store_true",
+                             help="first look for a mate where every move of the attacker is a check, "
+                                  "then for any mate if there is none")
+    mate_parser.add_argument("--compare", action="store_true",
+                             help="also run the serial search and show the speedup")
+    mate_parser.add_argument("--book", help="opening book (see the book command) whose move is searched first")
+
+    solve_parser = subparsers.add_parser("solve", help="find the mates in a file of FEN or EPD positions")
+    solve_parser.add_argument("input", help="file with one position per line, - for stdin")
+    solve_parser.add_argument("-o", "--output", help="file to write the JSON lines results to, stdout by default")
+    solve_parser.add_argument("-n", type=int, default=3,
+                              help="number of moves to mate in, for positions without a mate annotation")
+    solve_parser.add_argument("-j", "--workers", type=int, default=1, help="number of processes to solve with")
+    solve_parser.add_argument("--time-limit", type=float, help="seconds allowed for each position")
+    solve_parser.add_argument("--node-limit", type=int, help="nodes allowed for each position")
+    solve_parser.add_argument("--hash-mb", type=float, default=4,
+                              help="size in megabytes of the transposition table of each search")
+    solve_parser.add_argument("--window", type=int,
+                              help="most positions in flight at once, 4 per worker by default")
+    solve_parser.add_argument("--book", help="opening book (see the book command) whose move is searched first")
+
+    replay_parser = subparsers.add_parser("replay", help="replay the games of PGN files")
+    replay_parser.add_argument("paths", nargs="+", help="PGN files, or directories to look for them in")
+    replay_parser.add_argument("--throughput", action="store_true",
+                               help="only show the totals and the games and plies per second")
+
+    book_parser = subparsers.add_parser("book", help="build an opening book from PGN games")
+    book_parser.add_argument("paths", nargs="+", help="PGN files, or directories to look for them in")
+    book_parser.add_argument("-o", "--output", required=True, help="book file to write")
+    book_parser.add_argument("--max-ply", type=int, default=20, help="number of plies of each game to add")
+    book_parser.add_argument("--min-games", type=int, default=1,
+                             help="leave out the moves played in fewer games")
+
+    batch_eval_parser = subparsers.add_parser("batch-eval",
+                                              help="time the NumPy batch evaluation of the positions of PGN games "
+                                                   "against evaluating them one at a time")
+    batch_eval_parser.add_argument("paths", nargs="+", help="PGN files, or directories to look for them in")
+    batch_eval_parser.add_argument("--repeat", type=int, default=1,
+                                   help="number of copies of the positions to evaluate, for bigger batches")
+
     args = parser.parse_args()
     setup_logging(verbose=args.verbose)
+    if args.command == "perft":
+        exit(perft_main(args))
+    elif args.command == "mate":
+        exit(mate_main(args))
+    elif args.command == "solve":
+        exit(solve_main(args))
+    elif args.command == "replay":
+        exit(replay_main(args))
+    elif args.command == "book":
+        exit(book_main(args))
+    elif args.command == "batch-eval":
+        exit(batch_eval_main(args))
     exit(game_loop())
@@ -0,0 +1,297 @@
+"""
+Vectorized evaluation of many positions at once with NumPy.
+
+Positions are packed into an (N, 64) int8 array of piece codes (see board.NAME_TO_CODE), a8 first and h1 last,
+0 for an empty square. Every term is then worked out for all the positions together with array operations,
+mobility on one uint64 bitmap per board and piece type:
+- material and the piece-square bonuses blended by the game phase, the same as engine.evaluate
+- mobility: the squares each knight, bishop, rook and queen can move to, empty or with an enemy piece,
+  ignoring pins and checks
+- pawn structure: doubled, isolated and passed pawns
+
+board_terms and board_evaluate work out the same terms for one Board with plain Python. They are what the batch
+is checked and timed against.
+
+NumPy is optional: nothing else in the engine imports this module.
+"""
+
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .core.board import (BISHOP_CODE, BLACK, BLACK_BIT, BOARD_SIZE, CODE_COLOR, KNIGHT_CODE, NAME_TO_CODE, PAWN_CODE,
+                         QUEEN_CODE, ROOK_CODE, TYPE_MASK, WHITE, Board, Color)
+from .core.evaluation import MATERIAL, MAX_PHASE, PHASE, PST_ENDGAME, PST_MIDDLEGAME
+from .core.piece_movement_rules import (get_bishop_valid_squares, get_knight_valid_squares,
+                                        get_queen_valid_squares, get_rook_valid_squares)
+
+# centipawns for each square a piece can move to
+MOBILITY_WEIGHT = 4
+# centipawns for each pawn past the first on a file, each pawn with no pawns of its color on the files next to it,
+# and each pawn with no enemy pawns in front of it on its file or the files next to it
+DOUBLED_PAWN = -10
+ISOLATED_PAWN = -10
+PASSED_PAWN = 20
+
+# terms of the evaluation, in centipawns for white. Their sum is the score
+TERMS = ("material", "piece_square", "mobility", "pawns")
+
+# positions evaluated together, small enough for the temporary arrays to stay in cache
+CHUNK_SIZE = 4096
+
+# board index of each packed square, a8 first
+_INDEXES = [(row + 2) * 10 + col + 1 for row in range(8) for col in range(8)]
+_SIGN = [(0 if CODE_COLOR[code] is None else (1 if CODE_COLOR[code] == WHITE else -1)) for code in range(16)]
+
+# indexed by [piece code] or [piece code, packed square], negative for black
+_MATERIAL = np.array([100 * MATERIAL[code] * _SIGN[code] for code in range(16)], dtype=np.int64)
+_PST_MIDDLEGAME = np.array([[PST_MIDDLEGAME[code][index] * _SIGN[code] for index in _INDEXES]
+                            for code in range(16)], dtype=np.int64)
+_PST_ENDGAME = np.array([[PST_ENDGAME[code][index] * _SIGN[code] for index in _INDEXES]
+                         for code in range(16)], dtype=np.int64)
+_PHASE = np.array(PHASE, dtype=np.int64)
+_SQUARES = np.arange(64)
+
+# (rows, columns) steps. Rows go down the board, from rank 8 to rank 1
+_KNIGHT_STEPS = ((1, 2), (1, -2), (-1, 2), (-1, -2), (2, 1), (2, -1), (-2, 1), (-2, -1))
+_DIAGONAL_STEPS = ((1, 1), (1, -1), (-1, 1), (-1, -1))
+_STRAIGHT_STEPS = ((0, 1), (0, -1), (1, 0), (-1, 0))
+
+_FEN_CODES = {name: code for name, code in NAME_TO_CODE.items() if len(name) == 1 and name.isalpha()}
+
+
+def pack_boards(boards: Iterable[Board]) -> np.ndarray:
+    """:returns: (N, 64) int8 array of the piece codes of each board, a8 first"""
+    data = b"".join(bytes(board._board) for board in boards)
+    return np.frombuffer(data, dtype=np.int8).reshape(-1, BOARD_SIZE)[:, _INDEXES].copy()
+
+
+def pack_fens(fens: Iterable[str]) -> np.ndarray:
+    """:returns: (N, 64) int8 array of the piece codes of each position, a8 first.
+    Only the piece placement field is read, no Board is made"""
+    rows = []  # type: List[List[int]]
+    for fen in fens:
+        row = []  # type: List[int]
+        for c in fen.split()[0]:
+            if c.isdigit():
+                row.extend([0] * int(c))
+            elif c != "/":
+                row.append(_FEN_CODES[c])
+        if len(row) != 64:
+            raise ValueError("bad piece placement in FEN: %s" % fen)
+        rows.append(row)
+    return np.array(rows, dtype=np.int8).reshape(-1, 64)
+
+
+def _shift(mask: np.ndarray, dy: int, dx: int) -> np.ndarray:
+    """Move every square of the (N, 8, 8) mask by dy rows and dx columns, dropping what goes off the board"""
+    shifted = np.zeros_like(mask)
+    shifted[:, max(dy, 0):8 + min(dy, 0), max(dx, 0):8 + min(dx, 0)] = \
+        mask[:, max(-dy, 0):8 + min(-dy, 0), max(-dx, 0):8 + min(-dx, 0)]
+    return shifted
+
+
+def _bitboards(mask: np.ndarray) -> np.ndarray:
+    """:returns: the (N, 64) mask as N uint64, a8 is bit 0"""
+    return np.packbits(mask.reshape(len(mask), 64), axis=1, bitorder="little").view("<u8").reshape(-1)
+
+
+if hasattr(np, "bitwise_count"):
+    _popcount = np.bitwise_count
+else:
+    # before NumPy 2.0, count the bits of each byte
+    _BYTE_BITS = np.array([bin(byte).count("1") for byte in range(256)], dtype=np.uint8)
+
+    def _popcount(bitboards: np.ndarray) -> np.ndarray:
+        return _BYTE_BITS[bitboards.view(np.uint8).reshape(-1, 8)].sum(axis=1)
+
+
+def _bitboard_step(dy: int, dx: int) -> Tuple[int, np.uint64]:
+    """:returns: (number of bits to shift by, mask of the squares the step can land on without wrapping around)"""
+    landing = sum(1 << (row * 8 + col) for row in range(8) for col in range(8) if 0 <= col - dx < 8)
+    return dy * 8 + dx, np.uint64(landing)
+
+
+_KNIGHT_SHIFTS = [_bitboard_step(dy, dx) for dy, dx in _KNIGHT_STEPS]
+_DIAGONAL_SHIFTS = [_bitboard_step(dy, dx) for dy, dx in _DIAGONAL_STEPS]
+_STRAIGHT_SHIFTS = [_bitboard_step(dy, dx) for dy, dx in _STRAIGHT_STEPS]
+
+
+def _shift_bitboards(bitboards: np.ndarray, shift: int, landing: np.uint64) -> np.ndarray:
+    if shift > 0:
+        return (bitboards << np.uint64(shift)) & landing
+    return (bitboards >> np.uint64(-shift)) & landing
+
+
+def _mobility(squares: np.ndarray, color: Color) -> np.ndarray:
+    """:returns: number of moves of the knights, bishops, rooks and queens of the color on each board"""
+    bit = (0 if color == WHITE else BLACK_BIT)
+    not_own = ~_bitboards((squares != 0) & ((squares & BLACK_BIT) == bit))
+    empty = _bitboards(squares == 0)
+    queens = (squares == QUEEN_CODE | bit)
+    moves = np.zeros(len(squares), dtype=np.int64)
+    # each shift moves every piece by the same step, so no two pieces land on the same square
+    knights = _bitboards(squares == KNIGHT_CODE | bit)
+    for shift, landing in _KNIGHT_SHIFTS:
+        moves += _popcount(_shift_bitboards(knights, shift, landing) & not_own)
+    for shifts, sliders in ((_DIAGONAL_SHIFTS, _bitboards((squares == BISHOP_CODE | bit) | queens)),
+                            (_STRAIGHT_SHIFTS, _bitboards((squares == ROOK_CODE | bit) | queens))):
+        for shift, landing in shifts:
+            # squares reached by the sliders after each step, stopping at the first piece
+            front = sliders
+            for _ in range(7):
+                front = _shift_bitboards(front, shift, landing)
+                moves += _popcount(front & not_own)
+                front &= empty
+    return moves
+
+
+def _pawn_counts(pawns: np.ndarray, enemy_pawns: np.ndarray, color: Color) -> Tuple[np.ndarray, ...]:
+    """:returns: (doubled, isolated, passed) pawns of the (N, 8, 8) mask pawns, for each board"""
+    files = pawns.sum(axis=1)
+    doubled = np.maximum(files - 1, 0).sum(axis=1)
+    occupied = files > 0
+    neighbours = np.zeros_like(occupied)
+    neighbours[:, 1:] |= occupied[:, :-1]
+    neighbours[:, :-1] |= occupied[:, 1:]
+    isolated = (files * ~neighbours).sum(axis=1)
+    # squares with an enemy pawn on them or on the files next to them
+    span = enemy_pawns | _shift(enemy_pawns, 0, 1) | _shift(enemy_pawns, 0, -1)
+    # white pawns move up to row 0 and black pawns down to row 7
+    if color == BLACK:
+        span = span[:, ::-1]
+        pawns = pawns[:, ::-1]
+    # whether there is an enemy pawn in front of each square
+    blocked = np.zeros_like(span)
+    blocked[:, 1:] = np.logical_or.accumulate(span, axis=1)[:, :-1]
+    passed = (pawns & ~blocked).sum(axis=(1, 2))
+    return doubled, isolated, passed
+
+
+def batch_terms(squares: np.ndarray) -> Dict[str, np.ndarray]:
+    """Evaluation terms of every position.
+    :param squares: (N, 64) array from pack_boards or pack_fens
+    :returns: array of N centipawn values for white for each name in TERMS"""
+    squares = np.asarray(squares, dtype=np.int8)
+    material = _MATERIAL[squares].sum(axis=1)
+    middlegame = _PST_MIDDLEGAME[squares, _SQUARES].sum(axis=1)
+    endgame = _PST_ENDGAME[squares, _SQUARES].sum(axis=1)
+    phase = np.minimum(_PHASE[squares].sum(axis=1), MAX_PHASE)
+    piece_square = (middlegame * phase + endgame * (MAX_PHASE - phase)) // MAX_PHASE
+    mobility = MOBILITY_WEIGHT * (_mobility(squares, WHITE) - _mobility(squares, BLACK))
+
+    grid = squares.reshape(-1, 8, 8)
+    white_pawns = (grid == PAWN_CODE)
+    black_pawns = (grid == PAWN_CODE | BLACK_BIT)
+    white = _pawn_counts(white_pawns, black_pawns, WHITE)
+    black = _pawn_counts(black_pawns, white_pawns, BLACK)
+    pawns = sum(weight * (white[i] - black[i]) for i, weight in enumerate((DOUBLED_PAWN, ISOLATED_PAWN, PASSED_PAWN)))
+    return {"material": material, "piece_square": piece_square, "mobility": mobility, "pawns": pawns}
+
+
+def batch_evaluate(squares: np.ndarray, colors: Optional[np.ndarray] = None) -> np.ndarray:
+    """Score of every position in centipawns, the sum of its terms.
+    :param squares: (N, 64) array from pack_boards or pack_fens
+    :param colors: N colors to score each position for, white for all of them by default
+    :returns: int64 array of N scores"""
+    squares = np.asarray(squares, dtype=np.int8)
+    scores = np.empty(len(squares), dtype=np.int64)
+    for start in range(0, len(squares), CHUNK_SIZE):
+        terms = batch_terms(squares[start:start + CHUNK_SIZE])
+        scores[start:start + CHUNK_SIZE] = sum(terms[name] for name in TERMS)
+    if colors is not None:
+        scores = np.where(np.asarray(colors, dtype=bool), scores, -scores)
+    return scores
+
+
+def board_terms(board: Board) -> Dict[str, int]:
+    """The terms of batch_terms for one board, without NumPy"""
+    squares = board._board
+    material, middlegame, endgame, phase = board.get_evaluation()
+    phase = min(phase, MAX_PHASE)
+    terms = {
+        "material": 100 * (material[WHITE] - material[BLACK]),
+        "piece_square": ((middlegame[WHITE] - middlegame[BLACK]) * phase +
+                         (endgame[WHITE] - endgame[BLACK]) * (MAX_PHASE - phase)) // MAX_PHASE,
+        "mobility": 0,
+        "pawns": 0,
+    }
+    pawn_rows = {WHITE: [[] for _ in range(8)], BLACK: [[] for _ in range(8)]}  # type: Dict[Color, List[List[int]]]
+    for index in _INDEXES:
+        code = squares[index]
+        color = CODE_COLOR[code]
+        if color is None:
+            continue
+        sign = (1 if color == WHITE else -1)
+        piece = code & TYPE_MASK
+        if piece == PAWN_CODE:
+            pawn_rows[color][index % 10 - 1].append(index // 10 - 2)
+        elif piece == KNIGHT_CODE:
+            terms["mobility"] += sign * MOBILITY_WEIGHT * sum(1 for _ in get_knight_valid_squares(board, index))
+        elif piece == BISHOP_CODE:
+            terms["mobility"] += sign * MOBILITY_WEIGHT * sum(1 for _ in get_bishop_valid_squares(board, index))
+        elif piece == ROOK_CODE:
+            terms["mobility"] += sign * MOBILITY_WEIGHT * sum(1 for _ in get_rook_valid_squares(board, index))
+        elif piece == QUEEN_CODE:
+            terms["mobility"] += sign * MOBILITY_WEIGHT * sum(1 for _ in get_queen_valid_squares(board, index))
+    for color, sign in ((WHITE, 1), (BLACK, -1)):
+        files = pawn_rows[color]
+        enemy_files = pawn_rows[not color]
+        for col, rows in enumerate(files):
+            neighbours = [files[c] for c in (col - 1, col + 1) if 0 <= c < 8]
+            enemies = [row for c in (col - 1, col, col + 1) if 0 <= c < 8 for row in enemy_files[c]]
+            if len(rows) > 1:
+                terms["pawns"] += sign * DOUBLED_PAWN * (len(rows) - 1)
+            if rows and not any(neighbours):
+                terms["pawns"] += sign * ISOLATED_PAWN * len(rows)
+            for row in rows:
+                # white pawns move to row 0, black pawns to row 7
+                if not any((enemy < row if color == WHITE else enemy > row) for enemy in enemies):
+                    terms["pawns"] += sign * PASSED_PAWN
+    return terms
+
+
+def board_evaluate(board: Board, color: Color) -> int:
+    """Score of the position for the given color in centipawns, the same as batch_evaluate"""
+    score = sum(board_terms(board).values())
+    return (score if color == WHITE else -1 * score)
+
+
+def run_benchmark(boards: List[Board], repeat: int = 1) -> Tuple[float, float]:
+    """Score the boards one at a time and then as a batch, check that the scores are the same and print the speeds.
+    :param repeat: number of copies of the boards to score, to time bigger batches
+    :returns: (seconds for the scalar path, seconds for the batch including packing)"""
+    boards = boards * repeat
+    start = time.perf_counter()
+    expected = [board_evaluate(board, WHITE) for board in boards]
+    scalar_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    squares = pack_boards(boards)
+    pack_time = time.perf_counter() - start
+    scores = batch_evaluate(squares)
+    batch_time = time.perf_counter() - start
+    if scores.tolist() != expected:
+        raise AssertionError("the batch scores are not the same as the scalar scores")
+
+    count = max(len(boards), 1)
+    print("%d positions" % len(boards))
+    print("scalar: %.3fs (%.1f us/position)" % (scalar_time, 1e6 * scalar_time / count))
+    print("batch:  %.3fs (%.1f us/position, %.3fs of it packing)" % (batch_time, 1e6 * batch_time / count,
+                                                                     pack_time))
+    print("speedup: %.1fx" % (scalar_time / max(batch_time, 1e-9)))
+    return scalar_time, batch_time
+
+
+def run_batch_eval(paths: Iterable[str], repeat: int = 1) -> Tuple[float, float]:
+    """Benchmark the batch evaluation on every position of the games in the PGN files"""
+    from .pgn import pgn_paths, read_games, replay, start_board
+
+    boards = []  # type: List[Board]
+    for path in pgn_paths(paths):
+        with open(path) as fp:
+            for game in read_games(fp):
+                boards.append(start_board(game.headers))
+                boards.extend(Board(board) for board, _ in replay(game))
+    return run_benchmark(boards, repeat=repeat)
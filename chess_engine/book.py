@@ -0,0 +1,212 @@
+"""
+Opening book built from PGN games, read with mmap.
+
+The file starts with the 16 bytes of MAGIC, followed by a sorted array of 16-byte entries in the Polyglot layout,
+all big-endian: key (8 bytes), move (2), weight (2), learn (4). Entries are sorted by key and, for the same key,
+by weight from the highest. The key is the engine's own Zobrist hash of the position (Board.get_hash), not the
+Polyglot one, so this is not a Polyglot book even though the entries and the move encoding look the same.
+The header is there so that a Polyglot book from another program is rejected instead of never matching a position.
+- move: to file in bits 0-2, to rank in bits 3-5, from file in bits 6-8, from rank in bits 9-11 and
+  promotion in bits 12-14 (none, knight, bishop, rook, queen). Castling is the king taking its own rook, e.g. e1h1
+- weight: number of games the move was played in
+- learn: games the player of the move won in the upper 16 bits, and lost in the lower 16 bits
+Counts that don't fit in 16 bits are scaled down together.
+
+OpeningBook binary searches the mapped file, so nothing is loaded and any size of book takes the same memory.
+See http://hgm.nubati.net/book_format.html
+"""
+
+import logging
+import mmap
+import random
+import struct
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+from .core.board import (INDEX_TO_SQ64, MOVE_CASTLE, MOVE_DEST_SHIFT, MOVE_PROMOTION_SHIFT, MOVE_SQUARE_MASK,
+                         TYPE_MASK, Board)
+from .core.piece_movement_rules import gen_legal_move_codes
+from .pgn import PgnError, pgn_paths, read_games, replay, start_board
+
+ENTRY = struct.Struct(">QHHI")
+ENTRY_SIZE = ENTRY.size
+_KEY = struct.Struct(">Q")
+# first bytes of every book file, as long as an entry so the entries stay aligned
+MAGIC = b"chessEngine book"
+
+MAX_COUNT = 0xffff
+
+# points scored by white for each result. Games without a result are not added to the book
+_WHITE_POINTS = {"1-0": 1, "1/2-1/2": 0, "0-1": -1}
+
+
+class BookEntry(NamedTuple):
+    # the move in the Polyglot encoding, see encode_book_move
+    move: int
+    weight: int
+    wins: int
+    draws: int
+    losses: int
+
+
+def encode_book_move(code: int) -> int:
+    """The packed move in the Polyglot encoding"""
+    src = INDEX_TO_SQ64[code & MOVE_SQUARE_MASK]
+    dest = INDEX_TO_SQ64[(code >> MOVE_DEST_SHIFT) & MOVE_SQUARE_MASK]
+    if code & MOVE_CASTLE:
+        # the king goes to the square of the rook, on the h-file or the a-file
+        dest = (dest | 7 if dest > src else dest & ~7)
+    promotion = (code >> MOVE_PROMOTION_SHIFT) & TYPE_MASK
+    # the piece types go knight, bishop, rook, queen in both
+    return (src << 6) | dest | ((promotion - 1) << 12 if promotion else 0)
+
+
+def decode_book_move(board: Board, move: int) -> Optional[int]:
+    """:returns: the legal move of the side to move with the Polyglot encoding move, or None if there is none"""
+    for code in gen_legal_move_codes(board, board.get_turn()):
+        if encode_book_move(code) == move:
+            return code
+    return None
+
+
+def _scale(games: int, wins: int, losses: int) -> Tuple[int, int, int]:
+    """Scale the counts down together until they fit in 16 bits"""
+    if games <= MAX_COUNT:
+        return games, wins, losses
+    return MAX_COUNT, wins * MAX_COUNT // games, losses * MAX_COUNT // games
+
+
+def build_book(paths: Iterable[str], output: str, max_ply: int = 20, min_games: int = 1) -> Tuple[int, int]:
+    """Write the book of the moves played in the first plies of the games in the PGN files.
+    :param paths: PGN files, or directories to look for them in
+    :param max_ply: number of plies of each game to add
+    :param min_games: leave out the moves played in fewer games
+    :returns: (number of games added, number of games skipped for a move that can't be played,
+        number of entries written)"""
+    # key -> move -> [games, wins, losses] for the player of the move
+    counts = {}  # type: dict
+    games = 0
+    skipped = 0
+    for path in pgn_paths(paths):
+        with open(path) as fp:
+            for game in read_games(fp):
+                if game.result not in _WHITE_POINTS:
+                    continue
+                board = start_board(game.headers)
+                # (key, move, points for the player of the move), only added once the whole game replays
+                played = []  # type: List[Tuple[int, int, int]]
+                key = board.get_hash()
+                try:
+                    for ply, (board, move) in enumerate(replay(game, board)):
+                        if ply >= max_ply:
+                            break
+                        # the board is after the move, so the player of the move is the one not to move
+                        points = _WHITE_POINTS[game.result] * (-1 if board.get_turn() else 1)
+                        played.append((key, encode_book_move(move.code), points))
+                        key = board.get_hash()
+                except PgnError as e:
+                    logging.warning("Skipping a game of %s: %s", path, str(e))
+                    skipped += 1
+                    continue
+                games += 1
+                for key, move, points in played:
+                    stats = counts.setdefault(key, {}).setdefault(move, [0, 0, 0])
+                    stats[0] += 1
+                    if points > 0:
+                        stats[1] += 1
+                    elif points < 0:
+                        stats[2] += 1
+
+    entries = []  # type: List[Tuple[int, int, int, int]]
+    for key, moves in counts.items():
+        for move, (played, wins, losses) in moves.items():
+            if played >= min_games:
+                weight, wins, losses = _scale(played, wins, losses)
+                entries.append((key, move, weight, (wins << 16) | losses))
+    entries.sort(key=lambda entry: (entry[0], -entry[2], entry[1]))
+    with open(output, "wb") as fp:
+        fp.write(MAGIC)
+        for entry in entries:
+            fp.write(ENTRY.pack(*entry))
+    return games, skipped, len(entries)
+
+
+class OpeningBook:
+    def __init__(self, path: str):
+        """Map the book file. Nothing is read until it is probed
+        :param path: file written by build_book"""
+        self._file = open(path, "rb")
+        if self._file.read(len(MAGIC)) != MAGIC:
+            self._file.close()
+            raise ValueError("%s is not a book written by build_book" % path)
+        size = self._file.seek(0, 2) - len(MAGIC)
+        if size % ENTRY_SIZE:
+            self._file.close()
+            raise ValueError("%s is not a book: %d bytes is not a whole number of entries" % (path, size))
+        self._size = size // ENTRY_SIZE
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self) -> int:
+        """Number of entries"""
+        return self._size
+
+    def __enter__(self) -> "OpeningBook":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def entries(self, key: int) -> List[BookEntry]:
+        """:returns: the entries for the position with the hash key, the highest weight first"""
+        book = self._map
+        # first entry with a key at least key
+        low, high = 0, self._size
+        while low < high:
+            middle = (low + high) // 2
+            if _KEY.unpack_from(book, len(MAGIC) + middle * ENTRY_SIZE)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        found = []  # type: List[BookEntry]
+        for i in range(low, self._size):
+            entry_key, move, weight, learn = ENTRY.unpack_from(book, len(MAGIC) + i * ENTRY_SIZE)
+            if entry_key != key:
+                break
+            wins, losses = learn >> 16, learn & MAX_COUNT
+            found.append(BookEntry(move, weight, wins, max(weight - wins - losses, 0), losses))
+        return found
+
+    def moves(self, board: Board) -> List[Tuple[int, BookEntry]]:
+        """:returns: (packed move, entry) for each book move of the side to move that is legal on the board,
+            the highest weight first"""
+        found = []  # type: List[Tuple[int, BookEntry]]
+        for entry in self.entries(board.get_hash()):
+            code = decode_book_move(board, entry.move)
+            if code is not None:
+                found.append((code, entry))
+        return found
+
+    def choose(self, board: Board, rng: Optional[random.Random] = None) -> Optional[int]:
+        """Pick a book move for the side to move.
+        :param rng: pick at random in proportion to the weights. By default the move with the highest weight
+        :returns: packed move, or None if the position is not in the book"""
+        moves = self.moves(board)
+        if not moves:
+            return None
+        if rng is None:
+            return moves[0][0]
+        return rng.choices([code for code, _ in moves], weights=[entry.weight for _, entry in moves])[0]
+
+
+def run_build_book(paths: Iterable[str], output: str, max_ply: int = 20,
+                   min_games: int = 1) -> Tuple[int, int, int]:
+    """Build the book and print its size and the number of games skipped"""
+    games, skipped, entries = build_book(paths, output, max_ply=max_ply, min_games=min_games)
+    print("%d games (%d skipped), %d entries (%d bytes) written to %s" % (
+        games, skipped, entries, len(MAGIC) + entries * ENTRY_SIZE, output))
+    return games, skipped, entries
@@ -0,0 +1,215 @@
+"""
+Bitboard move generation backend.
+
+The board keeps one 64-bit integer per piece code (see Board.set_square), where bit n
+is set if that piece is on square n (a1 is 0, h8 is 63).
+Knight, king and pawn attacks come from precomputed tables.
+Sliding attacks come from precomputed rays: a ray is cut at the first blocker
+by removing the ray that starts on that blocker.
+
+Squares are converted back to board indexes at the edges, so the functions here
+are drop-in replacements for their mailbox equivalents in piece_movement_rules.
+"""
+
+from typing import Iterator, List
+
+from .board import (BISHOP_CODE, BLACK_BIT, CODE_COLOR, INDEX_BIT, INDEX_TO_SQ64,
+                    KING_CODE, KNIGHT_CODE, PAWN_CODE, QUEEN_CODE, ROOK_CODE,
+                    SQ64_TO_INDEX, TYPE_MASK, WHITE, Board, Color)
+
+Bitboard = int
+
+FULL = (1 << 64) - 1
+RANK_1 = 0xFF
+RANK_8 = 0xFF << 56
+
+
+def _on_board(file: int, rank: int) -> bool:
+    return 0 <= file < 8 and 0 <= rank < 8
+
+
+def _gen_leaper_table(offsets: List[tuple]) -> List[Bitboard]:
+    table = []
+    for sq in range(64):
+        bb = 0
+        for df, dr in offsets:
+            file, rank = sq % 8 + df, sq // 8 + dr
+            if _on_board(file, rank):
+                bb |= 1 << (rank * 8 + file)
+        table.append(bb)
+    return table
+
+
+def _gen_ray_table(df: int, dr: int) -> List[Bitboard]:
+    """All squares from (not including) each square to the edge of the board in direction (df, dr)"""
+    table = []
+    for sq in range(64):
+        bb = 0
+        file, rank = sq % 8 + df, sq // 8 + dr
+        while _on_board(file, rank):
+            bb |= 1 << (rank * 8 + file)
+            file, rank = file + df, rank + dr
+        table.append(bb)
+    return table
+
+
+KNIGHT_ATTACKS = _gen_leaper_table([(1, 2), (1, -2), (-1, 2), (-1, -2), (2, 1), (2, -1), (-2, 1), (-2, -1)])
+KING_ATTACKS = _gen_leaper_table([(1, 1), (1, 0), (1, -1), (0, 1), (0, -1), (-1, 1), (-1, 0), (-1, -1)])
+# squares attacked by a pawn of the given color, indexed by color
+PAWN_ATTACKS = [
+    _gen_leaper_table([(1, -1), (-1, -1)]),
+    _gen_leaper_table([(1, 1), (-1, 1)]),
+]
+
+# rays going towards higher square numbers: the first blocker is the lowest bit
+NORTH = _gen_ray_table(0, 1)
+EAST = _gen_ray_table(1, 0)
+NORTH_EAST = _gen_ray_table(1, 1)
+NORTH_WEST = _gen_ray_table(-1, 1)
+# rays going towards lower square numbers: the first blocker is the highest bit
+SOUTH = _gen_ray_table(0, -1)
+WEST = _gen_ray_table(-1, 0)
+SOUTH_EAST = _gen_ray_table(1, -1)
+SOUTH_WEST = _gen_ray_table(-1, -1)
+
+
+def _positive_ray_attacks(ray: List[Bitboard], sq: int, occupied: Bitboard) -> Bitboard:
+    attacks = ray[sq]
+    blockers = attacks & occupied
+    if blockers:
+        attacks ^= ray[(blockers & -blockers).bit_length() - 1]
+    return attacks
+
+
+def _negative_ray_attacks(ray: List[Bitboard], sq: int, occupied: Bitboard) -> Bitboard:
+    attacks = ray[sq]
+    blockers = attacks & occupied
+    if blockers:
+        attacks ^= ray[blockers.bit_length() - 1]
+    return attacks
+
+
+def rook_attacks(sq: int, occupied: Bitboard) -> Bitboard:
+    return (_positive_ray_attacks(NORTH, sq, occupied) |
+            _positive_ray_attacks(EAST, sq, occupied) |
+            _negative_ray_attacks(SOUTH, sq, occupied) |
+            _negative_ray_attacks(WEST, sq, occupied))
+
+
+def bishop_attacks(sq: int, occupied: Bitboard) -> Bitboard:
+    return (_positive_ray_attacks(NORTH_EAST, sq, occupied) |
+            _positive_ray_attacks(NORTH_WEST, sq, occupied) |
+            _negative_ray_attacks(SOUTH_EAST, sq, occupied) |
+            _negative_ray_attacks(SOUTH_WEST, sq, occupied))
+
+
+def iter_squares(bb: Bitboard) -> Iterator[int]:
+    """Return a generator over the board indexes of all set bits"""
+    while bb:
+        low = bb & -bb
+        yield SQ64_TO_INDEX[low.bit_length() - 1]
+        bb ^= low
+
+
+def _pawn_targets(board: Board, sq: int, color: Color) -> Bitboard:
+    occupied = board._occupied[0] | board._occupied[1]
+    bit = 1 << sq
+    if color == WHITE:
+        push = (bit << 8) & ~occupied
+        # only pawns on the second rank can go two up
+        double_push = ((push & 0xFF0000) << 8) & ~occupied
+    else:
+        push = (bit >> 8) & ~occupied
+        double_push = ((push & 0xFF0000000000) >> 8) & ~occupied
+    captures = PAWN_ATTACKS[color][sq] & board._occupied[not color]
+    if board.is_en_passant_possible():
+        captures |= PAWN_ATTACKS[color][sq] & INDEX_BIT[board.get_ep_capture_index()]
+    return push | double_push | captures
+
+
+def get_piece_valid_squares(board: Board, from_index: int) -> Iterator[int]:
+    """Same as piece_movement_rules.get_piece_valid_squares"""
+    code = board._board[from_index]
+    color = CODE_COLOR[code]
+    sq = INDEX_TO_SQ64[from_index]
+    piece = code & TYPE_MASK
+    not_own = ~board._occupied[color] & FULL
+    if piece == PAWN_CODE:
+        targets = _pawn_targets(board, sq, color)
+    elif piece == KNIGHT_CODE:
+        targets = KNIGHT_ATTACKS[sq] & not_own
+    elif piece == KING_CODE:
+        targets = KING_ATTACKS[sq] & not_own
+    else:
+        occupied = board._occupied[0] | board._occupied[1]
+        if piece == BISHOP_CODE:
+            targets = bishop_attacks(sq, occupied) & not_own
+        elif piece == ROOK_CODE:
+            targets = rook_attacks(sq, occupied) & not_own
+        elif piece == QUEEN_CODE:
+            targets = (bishop_attacks(sq, occupied) | rook_attacks(sq, occupied)) & not_own
+        else:
+            raise Exception("bad piece at index %d: %s" % (from_index, board[from_index]))
+    return iter_squares(targets)
+
+
+def get_piece_capture_squares(board: Board, from_index: int) -> Iterator[int]:
+    """Same as piece_movement_rules.get_piece_capture_squares"""
+    code = board._board[from_index]
+    color = CODE_COLOR[code]
+    sq = INDEX_TO_SQ64[from_index]
+    piece = code & TYPE_MASK
+    enemy = board._occupied[not color]
+    if piece == PAWN_CODE:
+        targets = PAWN_ATTACKS[color][sq] & enemy
+        if board.is_en_passant_possible():
+            targets |= PAWN_ATTACKS[color][sq] & INDEX_BIT[board.get_ep_capture_index()]
+        # moving forward onto the last rank promotes
+        occupied = board._occupied[0] | board._occupied[1]
+        if color == WHITE:
+            targets |= ((1 << sq) << 8) & ~occupied & RANK_8
+        else:
+            targets |= ((1 << sq) >> 8) & ~occupied & RANK_1
+    elif piece == KNIGHT_CODE:
+        targets = KNIGHT_ATTACKS[sq] & enemy
+    elif piece == KING_CODE:
+        targets = KING_ATTACKS[sq] & enemy
+    else:
+        occupied = board._occupied[0] | board._occupied[1]
+        if piece == BISHOP_CODE:
+            targets = bishop_attacks(sq, occupied) & enemy
+        elif piece == ROOK_CODE:
+            targets = rook_attacks(sq, occupied) & enemy
+        elif piece == QUEEN_CODE:
+            targets = (bishop_attacks(sq, occupied) | rook_attacks(sq, occupied)) & enemy
+        else:
+            raise Exception("bad piece at index %d: %s" % (from_index, board[from_index]))
+    return iter_squares(targets)
+
+
+def is_attacked(board: Board, sq: int, by_color: Color) -> bool:
+    """Return True iff any piece of by_color attacks the square sq (0-63)"""
+    bbs = board._bitboards
+    color_bit = (0 if by_color == WHITE else BLACK_BIT)
+    if KNIGHT_ATTACKS[sq] & bbs[KNIGHT_CODE | color_bit]:
+        return True
+    if KING_ATTACKS[sq] & bbs[KING_CODE | color_bit]:
+        return True
+    # a pawn attacks this square if a pawn of the other color on this square would attack the pawn
+    if PAWN_ATTACKS[not by_color][sq] & bbs[PAWN_CODE | color_bit]:
+        return True
+    occupied = board._occupied[0] | board._occupied[1]
+    queens = bbs[QUEEN_CODE | color_bit]
+    if bishop_attacks(sq, occupied) & (bbs[BISHOP_CODE | color_bit] | queens):
+        return True
+    if rook_attacks(sq, occupied) & (bbs[ROOK_CODE | color_bit] | queens):
+        return True
+    return False
+
+
+def is_in_check(board: Board, color: Color) -> bool:
+    """Does not use or fill the check cache on the board"""
+    king = board._bitboards[KING_CODE | (0 if color == WHITE else BLACK_BIT)]
+    if not king:
+        raise Exception("King not found")
+    return is_attacked(board, king.bit_length() - 1, not color)
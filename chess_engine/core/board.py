@@ -1,7 +1,14 @@
+import os
 import sys
-from typing import List, Tuple, Optional, Iterator
+from array import array
+from typing import List, Tuple, Optional, Iterator, Set
+
+from .evaluation import MATERIAL, PHASE, PST_ENDGAME, PST_MIDDLEGAME
+from .zobrist import BLACK_TO_MOVE_KEY, CASTLING_KEYS, EP_FILE_KEYS, PIECE_KEYS
 
 PieceName = str
+# integer-coded piece, see the piece codes below
+PieceCode = int
 Color = bool
 # Board = List[str]
 
@@ -21,6 +28,43 @@ KING = "K"
 
 PIECES = frozenset([PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING])
 
+# piece codes
+# every square of the board is stored as a small integer:
+# the low 3 bits are the piece type and bit 3 is set for black pieces.
+# Empty squares are 0 and guard squares use the otherwise unused type 7,
+# so every square fits into 4 bits
+EMPTY_CODE = 0
+PAWN_CODE = 1
+KNIGHT_CODE = 2
+BISHOP_CODE = 3
+ROOK_CODE = 4
+QUEEN_CODE = 5
+KING_CODE = 6
+GUARD_CODE = 7
+TYPE_MASK = 0b0111
+BLACK_BIT = 0b1000
+
+# piece name -> piece code
+NAME_TO_CODE = {
+    E: EMPTY_CODE,
+    G: GUARD_CODE,
+}
+for _code, _name in enumerate([PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING], start=PAWN_CODE):
+    NAME_TO_CODE[_name] = _code
+    NAME_TO_CODE[_name.lower()] = _code | BLACK_BIT
+
+# piece code -> piece name (unused codes map to guard)
+CODE_TO_NAME = tuple(
+    {code: name for name, code in NAME_TO_CODE.items()}.get(i, G)
+    for i in range(16)
+)
+
+# piece code -> color of that piece (None for empty and guard squares)
+CODE_COLOR = tuple(
+    (None if (i & TYPE_MASK) in (EMPTY_CODE, GUARD_CODE) else not (i & BLACK_BIT))
+    for i in range(16)
+)
+
 
 # the default board, with guard regions
 starter_board = [
@@ -42,108 +86,359 @@ BOARD_SIZE = len(starter_board)
 MIN_PIECE_INDEX = 21
 MAX_PIECE_INDEX = 98
 
+# starter board as piece codes
+starter_codes = array("b", [NAME_TO_CODE[piece] for piece in starter_board])
+
+# board index <-> square number (0-63, a1 is 0 and h8 is 63) used by bitboards
+# guard squares map to -1 and have no bit
+INDEX_TO_SQ64 = [-1] * BOARD_SIZE
+SQ64_TO_INDEX = [0] * 64
+for _index in range(BOARD_SIZE):
+    if starter_codes[_index] != GUARD_CODE:
+        _sq64 = (7 - (_index // 10 - 2)) * 8 + (_index % 10 - 1)
+        INDEX_TO_SQ64[_index] = _sq64
+        SQ64_TO_INDEX[_sq64] = _index
+INDEX_BIT = tuple((1 << sq64 if sq64 >= 0 else 0) for sq64 in INDEX_TO_SQ64)
+
+
+# castling rights, as bits of Board._castling
+WHITE_KINGSIDE = 1
+WHITE_QUEENSIDE = 2
+BLACK_KINGSIDE = 4
+BLACK_QUEENSIDE = 8
+ALL_CASTLING = 15
+
+# castling rights which survive a move from or to the given index
+CASTLING_MASK = [ALL_CASTLING] * BOARD_SIZE
+CASTLING_MASK[95] = ALL_CASTLING & ~(WHITE_KINGSIDE | WHITE_QUEENSIDE)
+CASTLING_MASK[98] = ALL_CASTLING & ~WHITE_KINGSIDE
+CASTLING_MASK[91] = ALL_CASTLING & ~WHITE_QUEENSIDE
+CASTLING_MASK[25] = ALL_CASTLING & ~(BLACK_KINGSIDE | BLACK_QUEENSIDE)
+CASTLING_MASK[28] = ALL_CASTLING & ~BLACK_KINGSIDE
+CASTLING_MASK[21] = ALL_CASTLING & ~BLACK_QUEENSIDE
+
+# layout of a move packed into an int, see core/move.py:
+# bits 0-6 are the source index, bits 7-13 the destination index, bits 14-16 the promotion piece type
+# and then one bit for each flag
+MOVE_SQUARE_MASK = 0x7f
+MOVE_DEST_SHIFT = 7
+MOVE_PROMOTION_SHIFT = 14
+MOVE_CAPTURE = 1 << 17
+MOVE_CASTLE = 1 << 18
+MOVE_EN_PASSANT = 1 << 19
+
+# when set, every make_move and unmake_move checks the incremental hash against compute_hash
+DEBUG_HASH = os.environ.get("CHESS_ENGINE_DEBUG_HASH", "") not in ("", "0")
+
 
 class Board:
-    def __init__(self, board: Optional[list] = None):
+    def __init__(self, board=None):
         """
-        Make a copy of the given board array
+        Make a copy of the given board.
+        This can be another Board, an array of piece codes or a list of piece names.
         """
-        if board:
+        if isinstance(board, Board):
+            self._board = board._board[:]
+        elif isinstance(board, array):
             self._board = board[:]
+        elif board:
+            self._board = array("b", [NAME_TO_CODE[piece] for piece in board])
+        else:
+            self._board = starter_codes[:]
+
+        # one bitboard per piece code, and one per color with all of its pieces
+        # the indexes of the pieces of each color, and the index of each king (-1 if there is none)
+        # the material and piece-square sums of each color and the game phase (see core/evaluation.py)
+        # these are kept in sync with self._board by set_square
+        if isinstance(board, Board):
+            self._bitboards = board._bitboards[:]
+            self._occupied = board._occupied[:]
+            self._pieces = [set(board._pieces[0]), set(board._pieces[1])]
+            self._king_index = board._king_index[:]
+            self._material = board._material[:]
+            self._pst_middlegame = board._pst_middlegame[:]
+            self._pst_endgame = board._pst_endgame[:]
+            self._phase = board._phase
         else:
-            self._board = starter_board[:]
+            self._init_piece_tables()
         # Move (but no typing for circular imports)
         self._moves = []  # type: list
 
-        # computed properties
-        self._ep_possible = False
-        # index of the pawn that just moved, the one that will be captured
-        self._ep_pawn_index = -1
-        # index of the place where the capturing pawn will move to
-        self._ep_capture_index = -1
-        self._ep_computed = False
-
-        self._check_computed = {
-            WHITE: False,
-            BLACK: False,
-        }
-        self._is_in_check = {
-            WHITE: False,
-            BLACK: False
-        }
+        if isinstance(board, Board):
+            self._turn = board._turn
+            self._castling = board._castling
+            # index of the pawn that just moved, the one that will be captured
+            self._ep_pawn_index = board._ep_pawn_index
+            # index of the place where the capturing pawn will move to
+            self._ep_capture_index = board._ep_capture_index
+            self._hash = board._hash
+        else:
+            self._turn = WHITE
+            self._castling = infer_castling_rights(self._board)
+            self._ep_pawn_index = -1
+            self._ep_capture_index = -1
+            # Zobrist hash of the position, kept up to date by set_square and make_move
+            self._hash = compute_hash(self)
+
+        # cached result of is_in_check, indexed by color. None if not computed
+        self._in_check = [None, None]  # type: List[Optional[bool]]
+
+    def __eq__(self, other) -> bool:
+        """Same position: same pieces, side to move, castling rights and en-passant file.
+        The hashes are compared first, the squares only to rule out collisions.
+        A board changes with every move, so it has no __hash__: key sets and dicts on get_hash() instead"""
+        if not isinstance(other, Board):
+            return NotImplemented
+        return self._hash == other._hash and self._board == other._board
 
     def __getitem__(self, index: int) -> PieceName:
-        return self._board[index]
+        return CODE_TO_NAME[self._board[index]]
 
     def __setitem__(self, index: int, piece: PieceName) -> None:
-        self._board[index] = piece
+        self.set_square(index, NAME_TO_CODE[piece])
 
     def __iter__(self) -> Iterator[PieceName]:
-        return iter(self._board)
+        return (CODE_TO_NAME[code] for code in self._board)
+
+    def _init_piece_tables(self) -> None:
+        self._bitboards = [0] * 16
+        # indexed by color
+        self._occupied = [0, 0]
+        self._pieces: List[Set[int]] = [set(), set()]
+        self._king_index = [-1, -1]
+        for index in range(MIN_PIECE_INDEX, MAX_PIECE_INDEX + 1):
+            code = self._board[index]
+            color = CODE_COLOR[code]
+            if color is not None:
+                self._bitboards[code] |= INDEX_BIT[index]
+                self._occupied[color] |= INDEX_BIT[index]
+                self._pieces[color].add(index)
+                if code & TYPE_MASK == KING_CODE:
+                    self._king_index[color] = index
+        self._material, self._pst_middlegame, self._pst_endgame, self._phase = compute_evaluation(self)
+
+    def set_square(self, index: int, code: PieceCode) -> None:
+        """Put the piece code on the square at index (EMPTY_CODE to clear it).
+        All writes to the board should go through here so the other representations stay in sync"""
+        bit = INDEX_BIT[index]
+        old = self._board[index]
+        self._hash ^= PIECE_KEYS[old][index] ^ PIECE_KEYS[code][index]
+        if old != EMPTY_CODE:
+            color = CODE_COLOR[old]
+            self._bitboards[old] ^= bit
+            self._occupied[color] ^= bit
+            self._pieces[color].discard(index)
+            if old & TYPE_MASK == KING_CODE and self._king_index[color] == index:
+                self._king_index[color] = -1
+            self._material[color] -= MATERIAL[old]
+            self._pst_middlegame[color] -= PST_MIDDLEGAME[old][index]
+            self._pst_endgame[color] -= PST_ENDGAME[old][index]
+            self._phase -= PHASE[old]
+        if code != EMPTY_CODE:
+            color = CODE_COLOR[code]
+            self._bitboards[code] |= bit
+            self._occupied[color] |= bit
+            self._pieces[color].add(index)
+            if code & TYPE_MASK == KING_CODE:
+                self._king_index[color] = index
+            self._material[color] += MATERIAL[code]
+            self._pst_middlegame[color] += PST_MIDDLEGAME[code][index]
+            self._pst_endgame[color] += PST_ENDGAME[code][index]
+            self._phase += PHASE[code]
+        self._board[index] = code
 
     def add_move(self, move):
         self._moves.append(move)
 
     def set_check(self, color: Color, in_check: bool):
-        self._is_in_check[color] = in_check
-        self._check_computed[color] = True
+        self._in_check[color] = in_check
 
     def get_check(self, color: Color) -> bool:
-        assert self._check_computed[color]
-        return self._is_in_check[color]
+        in_check = self._in_check[color]
+        assert in_check is not None
+        return in_check
 
-    def compute_ep_index(self) -> None:
-        """if en-passant is valid, there is precisely one index where capture is possible
-        Fill up the self._ep* variables
-        Additionally set self._ep_computed to true regardless
-        """
-        if self._moves == []:
-            # no previous moves
-            self._ep_possible = False
-            self._ep_computed = True
-            return
-        last_move = self._moves[-1]
-        if (get_raw_piece(last_move.piece) != PAWN or \
-                abs(index_to_row(last_move.src) - index_to_row(last_move.dest)) != 2):
-            # last move was not a 2-space pawn move
-            self._ep_possible = False
-            self._ep_computed = True
-            return
-        self._ep_possible = True
-        self._ep_computed = True
-        color = get_piece_color(last_move.piece)
-        dy = (1 if color == WHITE else -1)
-        self._ep_pawn_index = last_move.dest
-        self._ep_capture_index = slide_index(last_move.src, 0, dy)
+    def can_castle(self, rights: int) -> bool:
+        """Return True iff none of the pieces needed for the given castling rights have moved"""
+        return bool(self._castling & rights)
 
     def is_en_passant_possible(self) -> bool:
-        if not self._ep_computed:
-            self.compute_ep_index()
-        return self._ep_possible
+        """if en-passant is valid, there is precisely one index where capture is possible"""
+        return self._ep_capture_index != -1
 
     def get_ep_capture_index(self) -> int:
-        if not self._ep_computed:
-            self.compute_ep_index()
         return self._ep_capture_index
 
     def get_ep_pawn_index(self) -> int:
-        if not self._ep_computed:
-            self.compute_ep_index()
-        return self._ep_capture_index
+        return self._ep_pawn_index
+
+    def get_turn(self) -> Color:
+        """Color to move. This is only tracked by make_move, the search does its own bookkeeping"""
+        return self._turn
+
+    def get_hash(self) -> int:
+        return self._hash
+
+    def get_material(self, color: Color) -> int:
+        """Material of the given color in pawns, see evaluation.PIECE_VALUES"""
+        return self._material[color]
+
+    def get_phase(self) -> int:
+        """Game phase, from evaluation.MAX_PHASE at the start down to 0 with only kings and pawns.
+        Promotions can take it past MAX_PHASE"""
+        return self._phase
+
+    def get_evaluation(self) -> Tuple[List[int], List[int], List[int], int]:
+        """:returns: (material, middlegame piece-square sum, endgame piece-square sum) each indexed by color,
+            and the game phase"""
+        return self._material, self._pst_middlegame, self._pst_endgame, self._phase
+
+    def _ep_key(self) -> int:
+        """Hash key for the en-passant state.
+        This is only non-zero if a pawn is actually in place to capture en-passant,
+        so that transpositions through a double pawn push hash the same"""
+        pawn_index = self._ep_pawn_index
+        if pawn_index == -1:
+            return 0
+        enemy_pawn = self._board[pawn_index] ^ BLACK_BIT
+        if self._board[pawn_index - 1] == enemy_pawn or self._board[pawn_index + 1] == enemy_pawn:
+            return EP_FILE_KEYS[pawn_index % 10 - 1]
+        return 0
+
+    def make_move(self, move) -> tuple:
+        """Make the move in place. No check on this.
+        Castling and en-passant are taken from the move flags, like in move_piece.
+        :param move: Move, or a move packed into an int
+        :returns: undo record, to be given to unmake_move to take the move back
+        """
+        code = (move if move.__class__ is int else move.code)
+        squares = self._board
+        src = code & MOVE_SQUARE_MASK
+        dest = (code >> MOVE_DEST_SHIFT) & MOVE_SQUARE_MASK
+        piece = squares[src]
+
+        if code & MOVE_EN_PASSANT:
+            captured_index = self._ep_pawn_index
+        else:
+            captured_index = dest
+        # (packed move, captured piece, index of captured piece, ep state, castling rights, check cache, hash)
+        undo = (code, squares[captured_index], captured_index,
+                self._ep_pawn_index, self._ep_capture_index, self._castling,
+                self._in_check[0], self._in_check[1], self._hash)
+        castling = self._castling
+        self._hash ^= self._ep_key()
+
+        if code & MOVE_CASTLE:
+            move_piece_castle(self, src, dest)
+        else:
+            if captured_index != dest:
+                self.set_square(captured_index, EMPTY_CODE)
+            self.set_square(src, EMPTY_CODE)
+            promotion = (code >> MOVE_PROMOTION_SHIFT) & TYPE_MASK
+            if promotion:
+                self.set_square(dest, promotion | (piece & BLACK_BIT))
+            else:
+                self.set_square(dest, piece)
+
+        self._castling = castling & CASTLING_MASK[src] & CASTLING_MASK[dest]
+        if piece & TYPE_MASK == PAWN_CODE and (dest - src == 20 or src - dest == 20):
+            self._ep_pawn_index = dest
+            self._ep_capture_index = (src + dest) // 2
+            self._hash ^= self._ep_key()
+        else:
+            self._ep_pawn_index = -1
+            self._ep_capture_index = -1
+        self._hash ^= CASTLING_KEYS[castling] ^ CASTLING_KEYS[self._castling] ^ BLACK_TO_MOVE_KEY
+        self._turn = not self._turn
+
+        self._in_check[0] = None
+        self._in_check[1] = None
+        self._moves.append(move)
+        if DEBUG_HASH:
+            assert self._hash == compute_hash(self), \
+                "incremental hash is out of sync after %s%s" % (index_to_sq(src), index_to_sq(dest))
+            assert self.get_evaluation() == compute_evaluation(self), \
+                "incremental evaluation is out of sync after %s%s" % (index_to_sq(src), index_to_sq(dest))
+        return undo
+
+    def unmake_move(self, undo: tuple) -> None:
+        """Take back the move made by make_move, which returned the given undo record.
+        Moves must be taken back in reverse order"""
+        (code, captured, captured_index,
+         self._ep_pawn_index, self._ep_capture_index, self._castling,
+         self._in_check[0], self._in_check[1], hash_before) = undo
+        src = code & MOVE_SQUARE_MASK
+        dest = (code >> MOVE_DEST_SHIFT) & MOVE_SQUARE_MASK
+        piece = self._board[dest]
+
+        if code & MOVE_CASTLE:
+            self.set_square(dest, EMPTY_CODE)
+            self.set_square(src, piece)
+            rook_from_index, rook_to_index = get_castle_rook_index(self, src, dest)
+            self.set_square(rook_from_index, self._board[rook_to_index])
+            self.set_square(rook_to_index, EMPTY_CODE)
+        else:
+            if (code >> MOVE_PROMOTION_SHIFT) & TYPE_MASK:
+                piece = PAWN_CODE | (piece & BLACK_BIT)
+            self.set_square(dest, EMPTY_CODE)
+            self.set_square(src, piece)
+            if captured != EMPTY_CODE:
+                self.set_square(captured_index, captured)
+        self._turn = not self._turn
+        self._moves.pop()
+        self._hash = hash_before
+        if DEBUG_HASH:
+            assert self._hash == compute_hash(self), \
+                "hash is out of sync after taking back %s%s" % (index_to_sq(src), index_to_sq(dest))
+            assert self.get_evaluation() == compute_evaluation(self), \
+                "evaluation is out of sync after taking back %s%s" % (index_to_sq(src), index_to_sq(dest))
 
     def move_piece(self, move) -> None:
         """Convenient way to add the given move"""
-        move_piece(self, move.src, move.dest,
-                   promotion_piece=move.promotion,
-                   is_castle=move.is_castle,
-                   is_en_passant=move.is_en_passant)
-        self.add_move(move)
-        # after a move has been registered, reset ep calculation
-        self._ep_computed = False
-        self._check_computed = {
-            WHITE: False,
-            BLACK: False,
-        }
+        self.make_move(move)
+
+
+def compute_hash(board: Board) -> int:
+    """Compute the Zobrist hash of the board from scratch"""
+    h = 0
+    for index in range(MIN_PIECE_INDEX, MAX_PIECE_INDEX + 1):
+        h ^= PIECE_KEYS[board._board[index]][index]
+    h ^= CASTLING_KEYS[board._castling] ^ board._ep_key()
+    if board._turn != WHITE:
+        h ^= BLACK_TO_MOVE_KEY
+    return h
+
+
+def compute_evaluation(board: Board) -> Tuple[List[int], List[int], List[int], int]:
+    """Compute the sums kept by set_square from scratch, see Board.get_evaluation"""
+    material = [0, 0]
+    middlegame = [0, 0]
+    endgame = [0, 0]
+    phase = 0
+    for index in range(MIN_PIECE_INDEX, MAX_PIECE_INDEX + 1):
+        code = board._board[index]
+        color = CODE_COLOR[code]
+        if color is not None:
+            material[color] += MATERIAL[code]
+            middlegame[color] += PST_MIDDLEGAME[code][index]
+            endgame[color] += PST_ENDGAME[code][index]
+            phase += PHASE[code]
+    return material, middlegame, endgame, phase
+
+
+def infer_castling_rights(squares) -> int:
+    """Castling rights for a position without history:
+    allow castling wherever the king and rook are still on their starting squares"""
+    rights = 0
+    for king_index, rook_index, king, rook, right in [
+        (95, 98, "K", "R", WHITE_KINGSIDE),
+        (95, 91, "K", "R", WHITE_QUEENSIDE),
+        (25, 28, "k", "r", BLACK_KINGSIDE),
+        (25, 21, "k", "r", BLACK_QUEENSIDE),
+    ]:
+        if squares[king_index] == NAME_TO_CODE[king] and squares[rook_index] == NAME_TO_CODE[rook]:
+            rights |= right
+    return rights
 
 
 def get_piece_list(board: Board, color: Color) -> Iterator[Tuple[int, PieceName]]:
@@ -151,10 +446,19 @@ def get_piece_list(board: Board, color: Color) -> Iterator[Tuple[int, PieceName]
     Return the list of pieces for this color
     :returns: (index, piece name)
     """
-    for index in range(MIN_PIECE_INDEX, MAX_PIECE_INDEX + 1):
-        piece = board._board[index]
-        if get_piece_color(piece) == color:
-            yield index, piece
+    for index, code in get_piece_code_list(board, color):
+        yield index, CODE_TO_NAME[code]
+
+
+def get_piece_code_list(board: Board, color: Color) -> Iterator[Tuple[int, PieceCode]]:
+    """
+    Same as get_piece_list, but for piece codes.
+    Pieces come in board order, and the board may be changed while going through them
+    :returns: (index, piece code)
+    """
+    squares = board._board
+    for index in sorted(board._pieces[color]):
+        yield index, squares[index]
 
 
 def index_to_sq(index: int) -> str:
@@ -197,15 +501,15 @@ def sq_to_index(sq: str) -> int:
 
 
 def is_valid_square(index: int) -> bool:
-    return starter_board[index] != G
+    return starter_codes[index] != GUARD_CODE
 
 
 def is_empty_square(board: Board, index: int) -> bool:
-    return board._board[index] == E
+    return board._board[index] == EMPTY_CODE
 
 
 def get_color(board: Board, index: int) -> Optional[Color]:
-    return get_piece_color(board._board[index])
+    return CODE_COLOR[board._board[index]]
 
 
 def slide_index(index: int, dx: int, dy: int) -> int:
@@ -228,24 +532,23 @@ def get_castle_rook_index(board: Board, from_index: int, to_index: int) -> Tuple
 
 
 def find_king_index(board: Board, color: Color) -> int:
-    target_piece = get_piece_of_color(KING, color)
-    for i in range(MIN_PIECE_INDEX, MAX_PIECE_INDEX + 1):
-        if board._board[i] == target_piece:
-            return i
-    raise Exception("King not found")
+    index = board._king_index[color]
+    if index == -1:
+        raise Exception("King not found")
+    return index
 
 
 def move_piece_castle(board: Board, from_index: int, to_index: int) -> None:
     # this should refer to the king only
     piece = board._board[from_index]
-    assert get_raw_piece(piece) == KING
-    board._board[from_index] = E
-    board._board[to_index] = piece
+    assert piece & TYPE_MASK == KING_CODE
+    board.set_square(from_index, EMPTY_CODE)
+    board.set_square(to_index, piece)
     # find the rook and move it
     rook_from_index, rook_to_index = get_castle_rook_index(board, from_index, to_index)
     piece = board._board[rook_from_index]
-    board._board[rook_from_index] = E
-    board._board[rook_to_index] = piece
+    board.set_square(rook_from_index, EMPTY_CODE)
+    board.set_square(rook_to_index, piece)
 
 
 def move_piece_en_passant(board: Board, from_index: int, to_index: int) -> None:
@@ -253,17 +556,17 @@ def move_piece_en_passant(board: Board, from_index: int, to_index: int) -> None:
     Must be called with a pawn move
     """
     piece = board._board[from_index]
-    color = get_piece_color(piece)
-    assert get_raw_piece(piece) == PAWN
-    board._board[from_index] = E
+    color = CODE_COLOR[piece]
+    assert piece & TYPE_MASK == PAWN_CODE
+    board.set_square(from_index, EMPTY_CODE)
 
     # location of the target pawn
     if color == WHITE:
         en_passant_capture_index = slide_index(to_index, 0, -1)
     else:
         en_passant_capture_index = slide_index(to_index, 0, 1)
-    board._board[en_passant_capture_index] = E
-    board._board[to_index] = piece
+    board.set_square(en_passant_capture_index, EMPTY_CODE)
+    board.set_square(to_index, piece)
 
 
 def move_piece(board: Board, from_index: int, to_index: int,
@@ -280,22 +583,27 @@ def move_piece(board: Board, from_index: int, to_index: int,
         promotion_piece = promotion_piece.upper()
         assert promotion_piece in PIECES
         piece = board._board[from_index]
-        color = get_piece_color(piece)
-        assert get_raw_piece(piece) == PAWN
+        color = CODE_COLOR[piece]
+        assert piece & TYPE_MASK == PAWN_CODE
         assert color is not None
         assert index_to_row(to_index) in [1, 8]
-        board._board[from_index] = E
-        board._board[to_index] = get_piece_of_color(promotion_piece, color)
+        board.set_square(from_index, EMPTY_CODE)
+        board.set_square(to_index, get_code_of_color(NAME_TO_CODE[promotion_piece], color))
     else:
         piece = board._board[from_index]
-        board._board[from_index] = E
-        board._board[to_index] = piece
+        board.set_square(from_index, EMPTY_CODE)
+        board.set_square(to_index, piece)
 
 
 def get_piece_of_color(piece_name: PieceName, color: Color) -> PieceName:
     return (piece_name.upper() if color == WHITE else piece_name.lower())
 
 
+def get_code_of_color(code: PieceCode, color: Color) -> PieceCode:
+    """Return the code of the given piece type for the given color"""
+    return (code & TYPE_MASK if color == WHITE else (code & TYPE_MASK) | BLACK_BIT)
+
+
 def get_piece_color(piece: PieceName) -> Optional[Color]:
     if piece == E or piece == G:
         return None
@@ -308,24 +616,40 @@ def get_raw_piece(piece: PieceName) -> PieceName:
 
 
 def fen_to_board(fen: str) -> Board:
-    """Convert FEN to a row-array"""
+    """Convert FEN to a row-array.
+    The side to move, castling rights and en-passant square are read if present.
+    If castling rights are missing, they are inferred from the position"""
     flat_arr = [G]
+    fields = fen.split()
 
-    for c in fen:
+    for c in fields[0]:
         if c.isdigit():
             for i in range(int(c)):
                 flat_arr.append(E)
         elif c.isalpha():
             flat_arr.append(c)
-        elif c == " ":
-            # ignore the other info
-            break
         elif c == "/":
             flat_arr.extend([G, G])
 
     flat_arr.append(G)
     assert len(flat_arr) == 80
-    return Board(([G] * 20) + flat_arr + ([G] * 20))
+    board = Board(([G] * 20) + flat_arr + ([G] * 20))
+
+    if len(fields) > 1:
+        board._turn = (fields[1] != "b")
+    if len(fields) > 2:
+        board._castling = 0
+        for c, right in [("K", WHITE_KINGSIDE), ("Q", WHITE_QUEENSIDE),
+                         ("k", BLACK_KINGSIDE), ("q", BLACK_QUEENSIDE)]:
+            if c in fields[2]:
+                board._castling |= right
+    if len(fields) > 3 and fields[3] != "-":
+        board._ep_capture_index = sq_to_index(fields[3])
+        # the pawn that just moved is one row past the capture square
+        dy = (1 if index_to_row(board._ep_capture_index) == 3 else -1)
+        board._ep_pawn_index = slide_index(board._ep_capture_index, 0, dy)
+    board._hash = compute_hash(board)
+    return board
 
 
 def load_board(arr) -> Board:
@@ -378,7 +702,8 @@ def print_board(board: Board) -> None:
     print("*" * 18)
 
 
-def is_capture(board: Board, dest_index: int, piece: PieceName) -> bool:
+def is_capture(board: Board, dest_index: int, piece: PieceCode) -> bool:
     """Return True iff the move is a capture.
-    :param piece: the piece that is moving"""
-    return get_color(board, dest_index) is not None and get_color(board, dest_index) != get_piece_color(piece)
+    :param piece: code of the piece that is moving"""
+    dest_color = CODE_COLOR[board._board[dest_index]]
+    return dest_color is not None and dest_color is not CODE_COLOR[piece]
@@ -0,0 +1,131 @@
+"""
+Tables for the evaluation kept up to date by the board.
+Each (piece, square) pair is worth some material and a piece-square bonus, for the middlegame and the endgame,
+and each piece adds to the game phase. Like the Zobrist keys, these are sums over the pieces on the board,
+so Board.set_square updates them in O(1) whenever a piece is placed or removed,
+and a move (capture, promotion, castling, en-passant) costs the same few table lookups as it does for the hash.
+The piece-square tables are those of Tomasz Michniewski's "Simplified Evaluation Function",
+with endgame tables for pawns and the king.
+"""
+
+# piece values in pawns, indexed by piece type, the same as engine.piece_scores
+PIECE_VALUES = (0, 1, 3, 3, 5, 9, 1000, 0)
+# contribution of each piece type to the game phase. The phase is MAX_PHASE with all the pieces on the board
+# and goes down to 0 as knights, bishops, rooks and queens come off
+PHASE_WEIGHTS = (0, 0, 1, 1, 2, 4, 0, 0)
+MAX_PHASE = 24
+
+# piece-square bonuses in centipawns for white, a8 first and h1 last. Black uses them mirrored
+_PAWN = [
+    0, 0, 0, 0, 0, 0, 0, 0,
+    50, 50, 50, 50, 50, 50, 50, 50,
+    10, 10, 20, 30, 30, 20, 10, 10,
+    5, 5, 10, 25, 25, 10, 5, 5,
+    0, 0, 0, 20, 20, 0, 0, 0,
+    5, -5, -10, 0, 0, -10, -5, 5,
+    5, 10, 10, -20, -20, 10, 10, 5,
+    0, 0, 0, 0, 0, 0, 0, 0,
+]
+_PAWN_ENDGAME = [
+    0, 0, 0, 0, 0, 0, 0, 0,
+    80, 80, 80, 80, 80, 80, 80, 80,
+    50, 50, 50, 50, 50, 50, 50, 50,
+    30, 30, 30, 30, 30, 30, 30, 30,
+    20, 20, 20, 20, 20, 20, 20, 20,
+    10, 10, 10, 10, 10, 10, 10, 10,
+    0, 0, 0, 0, 0, 0, 0, 0,
+    0, 0, 0, 0, 0, 0, 0, 0,
+]
+_KNIGHT = [
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20, 0, 0, 0, 0, -20, -40,
+    -30, 0, 10, 15, 15, 10, 0, -30,
+    -30, 5, 15, 20, 20, 15, 5, -30,
+    -30, 0, 15, 20, 20, 15, 0, -30,
+    -30, 5, 10, 15, 15, 10, 5, -30,
+    -40, -20, 0, 5, 5, 0, -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50,
+]
+_BISHOP = [
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10, 0, 0, 0, 0, 0, 0, -10,
+    -10, 0, 5, 10, 10, 5, 0, -10,
+    -10, 5, 5, 10, 10, 5, 5, -10,
+    -10, 0, 10, 10, 10, 10, 0, -10,
+    -10, 10, 10, 10, 10, 10, 10, -10,
+    -10, 5, 0, 0, 0, 0, 5, -10,
+    -20, -10, -10, -10, -10, -10, -10, -20,
+]
+_ROOK = [
+    0, 0, 0, 0, 0, 0, 0, 0,
+    5, 10, 10, 10, 10, 10, 10, 5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    0, 0, 0, 5, 5, 0, 0, 0,
+]
+_QUEEN = [
+    -20, -10, -10, -5, -5, -10, -10, -20,
+    -10, 0, 0, 0, 0, 0, 0, -10,
+    -10, 0, 5, 5, 5, 5, 0, -10,
+    -5, 0, 5, 5, 5, 5, 0, -5,
+    0, 0, 5, 5, 5, 5, 0, -5,
+    -10, 5, 5, 5, 5, 5, 0, -10,
+    -10, 0, 5, 0, 0, 0, 0, -10,
+    -20, -10, -10, -5, -5, -10, -10, -20,
+]
+_KING = [
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+    20, 20, 0, 0, 0, 0, 20, 20,
+    20, 30, 10, 0, 0, 10, 30, 20,
+]
+_KING_ENDGAME = [
+    -50, -40, -30, -20, -20, -30, -40, -50,
+    -30, -20, -10, 0, 0, -10, -20, -30,
+    -30, -10, 20, 30, 30, 20, -10, -30,
+    -30, -10, 30, 40, 40, 30, -10, -30,
+    -30, -10, 30, 40, 40, 30, -10, -30,
+    -30, -10, 20, 30, 30, 20, -10, -30,
+    -30, -30, 0, 0, 0, 0, -30, -30,
+    -50, -30, -30, -30, -30, -30, -30, -50,
+]
+
+# indexed by piece type, then square from a8
+_MIDDLEGAME = (None, _PAWN, _KNIGHT, _BISHOP, _ROOK, _QUEEN, _KING, None)
+_ENDGAME = (None, _PAWN_ENDGAME, _KNIGHT, _BISHOP, _ROOK, _QUEEN, _KING_ENDGAME, None)
+
+# the board is 10x12 with 2 rows and 1 column of guard squares around the 8x8 squares, a8 is index 21.
+# piece codes are the piece type, plus 8 for black (see board.BLACK_BIT)
+_BOARD_SIZE = 120
+_BLACK_BIT = 8
+
+
+def _gen_table(tables) -> list:
+    """:returns: the bonus of each piece code on each board index, 0 for guard squares"""
+    table = [[0] * _BOARD_SIZE for _ in range(16)]
+    for code in range(16):
+        piece_table = tables[code & 7]
+        if piece_table is None:
+            continue
+        for row in range(8):
+            for col in range(8):
+                index = (row + 2) * 10 + col + 1
+                # black pieces see the board upside down
+                table_row = (7 - row if code & _BLACK_BIT else row)
+                table[code][index] = piece_table[table_row * 8 + col]
+    return table
+
+
+# indexed by [piece code][board index]
+PST_MIDDLEGAME = _gen_table(_MIDDLEGAME)
+PST_ENDGAME = _gen_table(_ENDGAME)
+# indexed by piece code
+MATERIAL = [PIECE_VALUES[code & 7] for code in range(16)]
+PHASE = [PHASE_WEIGHTS[code & 7] for code in range(16)]
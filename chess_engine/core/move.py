@@ -1,10 +1,21 @@
 from typing import Optional
 
-from .board import (PAWN, Board, PieceName, get_raw_piece, index_to_sq,
-                    move_piece)
+from .board import (BLACK_BIT, CODE_TO_NAME, KING_CODE, MOVE_CAPTURE,
+                    MOVE_CASTLE, MOVE_DEST_SHIFT, MOVE_EN_PASSANT,
+                    MOVE_PROMOTION_SHIFT, MOVE_SQUARE_MASK, NAME_TO_CODE, PAWN,
+                    PAWN_CODE, TYPE_MASK, Board, PieceName, get_raw_piece,
+                    index_to_sq, is_capture, move_piece)
+
+# the source and destination of a packed move, e.g. to index history tables
+MOVE_SQUARES_MASK = (1 << MOVE_PROMOTION_SHIFT) - 1
 
 
 class Move(object):
+    """A move with its metadata, for the public API.
+    The move generator and the search use the same move packed into an int (Move.code), see pack_move"""
+
+    __slots__ = ("piece", "src", "dest", "promotion", "is_capture", "is_castle", "is_en_passant", "code")
+
     def __init__(self, piece: PieceName, src: int, dest: int,
                  promotion: Optional[PieceName] = None,
                  is_capture: bool = False,
@@ -21,6 +32,15 @@ class Move(object):
         self.is_castle = is_castle
         self.is_capture = is_capture
         self.is_en_passant = is_en_passant
+        self.code = pack_move(src, dest,
+                              (NAME_TO_CODE[promotion] & TYPE_MASK if promotion else 0),
+                              ((MOVE_CAPTURE if is_capture else 0) |
+                               (MOVE_CASTLE if is_castle else 0) |
+                               (MOVE_EN_PASSANT if is_en_passant else 0)))
+
+    def uci(self) -> str:
+        """The move in UCI notation, e.g. e2e4 or e7e8q"""
+        return index_to_sq(self.src) + index_to_sq(self.dest) + (self.promotion.lower() if self.promotion else "")
 
     def show(self, board: Board) -> str:
         sym = ("x" if self.is_capture else "-")
@@ -45,16 +65,75 @@ def gen_successor(board_init: Board, src: int, dest: int) -> Board:
     Don't bother updating other data structures in board_init
     """
     # create a copy of the board quickly
-    board = Board(board_init._board)
+    board = Board(board_init)
     move_piece(board, src, dest)
     return board
 
 
 def gen_successor_from_move(board_init: Board, move: Move) -> Board:
-    board = gen_successor(board_init, move.src, move.dest)
-    board._moves = board_init._moves
-    board.add_move(move)
-    if move.promotion:
-        # change the piece at dest into the correct piece
-        board._board[move.dest] = move.promotion
+    """Return a new board with the move made. Prefer Board.make_move where possible"""
+    board = Board(board_init)
+    board._moves = board_init._moves[:]
+    board.make_move(move)
     return board
+
+
+def pack_move(src: int, dest: int, promotion: int = 0, flags: int = 0) -> int:
+    """Pack a move into an int of 20 bits, see MOVE_SQUARE_MASK in core/board.py for the layout.
+    Never 0, so 0 can stand for no move.
+    :param promotion: piece type promoted to, 0 for none
+    :param flags: MOVE_CAPTURE, MOVE_CASTLE and MOVE_EN_PASSANT"""
+    return src | (dest << MOVE_DEST_SHIFT) | (promotion << MOVE_PROMOTION_SHIFT) | flags
+
+
+def move_src(code: int) -> int:
+    return code & MOVE_SQUARE_MASK
+
+
+def move_dest(code: int) -> int:
+    return (code >> MOVE_DEST_SHIFT) & MOVE_SQUARE_MASK
+
+
+def move_promotion(code: int) -> int:
+    """:returns: piece type promoted to, 0 for none"""
+    return (code >> MOVE_PROMOTION_SHIFT) & TYPE_MASK
+
+
+def build_move_code(board: Board, src: int, dest: int, promotion: int = 0) -> int:
+    """Pack the move of the piece at src to dest, with the capture, castle and en-passant flags.
+    Does not check whether the move is valid
+    :param promotion: piece type promoted to, 0 for none"""
+    code = board._board[src]
+    piece_type = code & TYPE_MASK
+    flags = 0
+    if piece_type == PAWN_CODE and dest == board._ep_capture_index:
+        flags = MOVE_CAPTURE | MOVE_EN_PASSANT
+    elif is_capture(board, dest, code):
+        flags = MOVE_CAPTURE
+    elif piece_type == KING_CODE and (dest - src == 2 or src - dest == 2):
+        flags = MOVE_CASTLE
+    return src | (dest << MOVE_DEST_SHIFT) | (promotion << MOVE_PROMOTION_SHIFT) | flags
+
+
+def decode_move(board: Board, code: int) -> Move:
+    """Unpack a move of the piece on the board at its source"""
+    src = code & MOVE_SQUARE_MASK
+    piece = board._board[src]
+    promotion = (code >> MOVE_PROMOTION_SHIFT) & TYPE_MASK
+    return Move(CODE_TO_NAME[piece], src, (code >> MOVE_DEST_SHIFT) & MOVE_SQUARE_MASK,
+                promotion=(CODE_TO_NAME[promotion | (piece & BLACK_BIT)] if promotion else None),
+                is_capture=bool(code & MOVE_CAPTURE),
+                is_castle=bool(code & MOVE_CASTLE),
+                is_en_passant=bool(code & MOVE_EN_PASSANT))
+
+
+def build_move(board: Board, src: int, dest: int, promotion: Optional[PieceName] = None) -> Move:
+    """Create the move of the piece at src to dest, filling in the capture, castle and en-passant flags.
+    Does not check whether the move is valid"""
+    return decode_move(board, build_move_code(board, src, dest,
+                                              (NAME_TO_CODE[promotion] & TYPE_MASK if promotion else 0)))
+
+
+def encode_move(move) -> int:
+    """The move packed into an int, for move lists and move tables. Packed moves are returned as they are"""
+    return (move if move.__class__ is int else move.code)
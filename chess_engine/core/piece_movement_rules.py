@@ -1,20 +1,79 @@
 import itertools
-from typing import Iterator, List, Any
-
-from .board import (BISHOP, BLACK, KING, KNIGHT, PAWN, QUEEN, ROOK, WHITE,
-                    Board, Color, E, PieceName, find_king_index, get_color,
-                    get_piece_color, get_piece_list, get_raw_piece,
-                    index_to_row, is_capture, is_empty_square,
-                    is_valid_square, slide_index, sq_to_index)
-from .move import gen_successor
+import os
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from .board import (BISHOP_CODE, BLACK, BLACK_BIT, BLACK_KINGSIDE, BLACK_QUEENSIDE,
+                    CODE_COLOR, EMPTY_CODE, GUARD_CODE, INDEX_TO_SQ64,
+                    KING_CODE, KNIGHT_CODE, PAWN_CODE, QUEEN_CODE, ROOK_CODE,
+                    TYPE_MASK, WHITE, WHITE_KINGSIDE, WHITE_QUEENSIDE, Board,
+                    MOVE_CASTLE, MOVE_DEST_SHIFT, MOVE_EN_PASSANT,
+                    MOVE_PROMOTION_SHIFT, MOVE_SQUARE_MASK,
+                    Color, PieceCode, PieceName, find_king_index, get_color,
+                    get_piece_code_list, index_to_row, is_capture,
+                    is_empty_square, is_valid_square, slide_index,
+                    sq_to_index)
+from . import bitboard
+from .move import Move, build_move_code, decode_move, encode_move
 from .utils import get_opposite_color
 
+# move generation backends
+# the mailbox backend walks the 10x12 board, the bitboard backend uses attack tables
+MAILBOX = "mailbox"
+BITBOARD = "bitboard"
+BACKENDS = (MAILBOX, BITBOARD)
+
+_backend = os.environ.get("CHESS_ENGINE_BACKEND", MAILBOX)
+
+
+def set_backend(backend: str) -> None:
+    """Select the backend used by get_piece_valid_squares and is_in_check"""
+    global _backend
+    if backend not in BACKENDS:
+        raise ValueError("Unknown backend %s, expected one of %s" % (backend, ", ".join(BACKENDS)))
+    _backend = backend
+
+
+def get_backend() -> str:
+    return _backend
+
+
+# offsets from a square to the squares a piece could attack it from
+KNIGHT_STEPS = tuple(slide_index(0, dx, dy) for dx, dy in
+                     [(1, 2), (1, -2), (-1, 2), (-1, -2), (2, 1), (2, -1), (-2, 1), (-2, -1)])
+KING_STEPS = tuple(slide_index(0, dx, dy) for dx, dy in
+                   [(1, 1), (1, 0), (1, -1), (0, 1), (0, -1), (-1, 1), (-1, 0), (-1, -1)])
+ROOK_STEPS = tuple(slide_index(0, dx, dy) for dx, dy in [(0, 1), (0, -1), (1, 0), (-1, 0)])
+BISHOP_STEPS = tuple(slide_index(0, dx, dy) for dx, dy in [(1, 1), (1, -1), (-1, 1), (-1, -1)])
+# pawns attack diagonally forwards, so they attack a square from behind it. Indexed by color
+PAWN_STEPS = (
+    (slide_index(0, 1, 1), slide_index(0, -1, 1)),
+    (slide_index(0, 1, -1), slide_index(0, -1, -1)),
+)
+
+
+def _gen_line_steps() -> List[int]:
+    """For each pair of squares (a, b) on the same rank, file or diagonal, the step going from a towards b.
+    0 for squares which are not on a line. Indexed by a * 120 + b"""
+    line_steps = [0] * (120 * 120)
+    for a in range(120):
+        if not is_valid_square(a):
+            continue
+        for step in ROOK_STEPS + BISHOP_STEPS:
+            b = a + step
+            while is_valid_square(b):
+                line_steps[a * 120 + b] = step
+                b += step
+    return line_steps
+
+
+LINE_STEPS = _gen_line_steps()
+
 
 def is_valid_and_empty(board: Board, index: int) -> bool:
     return is_valid_square(index) and is_empty_square(board, index)
 
 
-def is_empty_or_capture(board: Board, index: int, piece: PieceName) -> bool:
+def is_empty_or_capture(board: Board, index: int, piece: PieceCode) -> bool:
     return is_valid_square(index) and (
         is_empty_square(board, index) or is_capture(board, index, piece))
 
@@ -23,7 +82,7 @@ def is_valid_en_passant(board: Board, from_index: int, to_index: int) -> bool:
     """Does not check whether the person will be in check after the move"""
     return board.is_en_passant_possible() and board.get_ep_capture_index() == to_index
 
-def is_valid_capture(board: Board, to_index: int, piece: PieceName) -> bool:
+def is_valid_capture(board: Board, to_index: int, piece: PieceCode) -> bool:
     """
     This method does not handle en-passant
     That is handled by its own method
@@ -36,25 +95,27 @@ def slide_and_check(board: Board, index: int, piece_color: Color, dy: int, dx: i
     Return a generator over all the squares that the piece could visit, including captures, in that direction
     Extend squares array with valid squares.
     TODO, in the future, write this to be easily parallelisable"""
+    squares = board._board
+    step = slide_index(0, dx, dy)
     while True:
-        index = slide_index(index, dx, dy)
+        index += step
+        code = squares[index]
 
-        if not is_valid_square(index):
-            return
-        if is_empty_square(board, index):
+        if code == EMPTY_CODE:
             yield index
+        elif code == GUARD_CODE:
+            return
         else:
             # logging.debug("square occupied by %s" % board[index])
             # logging.debug("attacking piece is %s" % piece)
-            if piece_color != get_color(board, index):
+            if piece_color is not CODE_COLOR[code]:
                 # this is a capture
                 yield index
             return
 
 
 def get_rook_valid_squares(board: Board, index: int) -> Iterator[int]:
-    piece = board._board[index]
-    color: Any = get_piece_color(piece)
+    color: Any = CODE_COLOR[board._board[index]]
     return itertools.chain(
         slide_and_check(board, index, color, 0, 1),
         slide_and_check(board, index, color, 0, -1),
@@ -64,8 +125,7 @@ def get_rook_valid_squares(board: Board, index: int) -> Iterator[int]:
 
 
 def get_bishop_valid_squares(board: Board, index: int) -> Iterator[int]:
-    piece = board._board[index]
-    color: Any = get_piece_color(piece)
+    color: Any = CODE_COLOR[board._board[index]]
     return itertools.chain(
         slide_and_check(board, index, color, 1, 1),
         slide_and_check(board, index, color, 1, -1),
@@ -104,7 +164,8 @@ def get_king_valid_squares(board: Board, index: int) -> Iterator[int]:
 
 def get_pawn_valid_squares(board: Board, from_index: int) -> Iterator[int]:
     piece = board._board[from_index]
-    dy = (1 if get_piece_color(piece) == WHITE else -1)
+    color = CODE_COLOR[piece]
+    dy = (1 if color == WHITE else -1)
     row = index_to_row(from_index)
 
     # regular moves
@@ -116,7 +177,6 @@ def get_pawn_valid_squares(board: Board, from_index: int) -> Iterator[int]:
     if is_empty_square(board, one_up_move):
         yield one_up_move
 
-        color = get_piece_color(piece)
         if (row == 7 and color == BLACK) or (row == 2 and color == WHITE):
             two_up_move = slide_index(from_index, 0, 2 * dy)
             # always on the board, based on this check
@@ -151,25 +211,82 @@ def get_knight_valid_squares(board: Board, index: int) -> Iterator[int]:
 
 
 def get_piece_valid_squares(board: Board, from_index: int) -> Iterator[int]:
-    piece = get_raw_piece(board._board[from_index])
-    if piece == KNIGHT:
+    if _backend == BITBOARD:
+        return bitboard.get_piece_valid_squares(board, from_index)
+    piece = board._board[from_index] & TYPE_MASK
+    if piece == KNIGHT_CODE:
         return get_knight_valid_squares(board, from_index)
-    elif piece == ROOK:
+    elif piece == ROOK_CODE:
         return get_rook_valid_squares(board, from_index)
-    elif piece == QUEEN:
+    elif piece == QUEEN_CODE:
         return get_queen_valid_squares(board, from_index)
-    elif piece == KING:
+    elif piece == KING_CODE:
         return get_king_valid_squares(board, from_index)
-    elif piece == PAWN:
+    elif piece == PAWN_CODE:
         return get_pawn_valid_squares(board, from_index)
-    elif piece == BISHOP:
+    elif piece == BISHOP_CODE:
         return get_bishop_valid_squares(board, from_index)
     else:
-        raise Exception("bad piece at index %d: %s" % (from_index, piece))
+        raise Exception("bad piece at index %d: %s" % (from_index, board[from_index]))
+
+
+def _get_pawn_capture_squares(board: Board, from_index: int) -> Iterator[int]:
+    squares = board._board
+    color = CODE_COLOR[squares[from_index]]
+    dy = (1 if color == WHITE else -1)
+    for to_index in (slide_index(from_index, 1, dy), slide_index(from_index, -1, dy)):
+        if CODE_COLOR[squares[to_index]] is (not color) or board.get_ep_capture_index() == to_index:
+            yield to_index
+    # moving forward onto the last row promotes
+    to_index = slide_index(from_index, 0, dy)
+    if squares[to_index] == EMPTY_CODE and index_to_row(to_index) == (8 if color == WHITE else 1):
+        yield to_index
+
+
+def _get_step_capture_squares(board: Board, from_index: int, steps: Tuple[int, ...]) -> Iterator[int]:
+    squares = board._board
+    enemy = not CODE_COLOR[squares[from_index]]
+    for step in steps:
+        if CODE_COLOR[squares[from_index + step]] is enemy:
+            yield from_index + step
+
+
+def _get_slide_capture_squares(board: Board, from_index: int, steps: Tuple[int, ...]) -> Iterator[int]:
+    squares = board._board
+    enemy = not CODE_COLOR[squares[from_index]]
+    for step in steps:
+        index = from_index + step
+        while squares[index] == EMPTY_CODE:
+            index += step
+        if CODE_COLOR[squares[index]] is enemy:
+            yield index
+
+
+def get_piece_capture_squares(board: Board, from_index: int) -> Iterator[int]:
+    """The squares among get_piece_valid_squares where the piece captures, including en-passant,
+    and for pawns the square where they promote by moving forward.
+    The quiet moves are never generated"""
+    if _backend == BITBOARD:
+        return bitboard.get_piece_capture_squares(board, from_index)
+    piece = board._board[from_index] & TYPE_MASK
+    if piece == PAWN_CODE:
+        return _get_pawn_capture_squares(board, from_index)
+    elif piece == KNIGHT_CODE:
+        return _get_step_capture_squares(board, from_index, KNIGHT_STEPS)
+    elif piece == KING_CODE:
+        return _get_step_capture_squares(board, from_index, KING_STEPS)
+    elif piece == BISHOP_CODE:
+        return _get_slide_capture_squares(board, from_index, BISHOP_STEPS)
+    elif piece == ROOK_CODE:
+        return _get_slide_capture_squares(board, from_index, ROOK_STEPS)
+    elif piece == QUEEN_CODE:
+        return _get_slide_capture_squares(board, from_index, ROOK_STEPS + BISHOP_STEPS)
+    else:
+        raise Exception("bad piece at index %d: %s" % (from_index, board[from_index]))
 
 
 def is_castle_move(board: Board, from_index: int, to_index: int) -> bool:
-    if (get_raw_piece(board._board[from_index]) != KING):
+    if (board._board[from_index] & TYPE_MASK != KING_CODE):
         return False
     potential_castle_squares = [
         slide_index(from_index, -2, 0),
@@ -180,14 +297,12 @@ def is_castle_move(board: Board, from_index: int, to_index: int) -> bool:
 
 def can_castle(board: Board, from_index: int, to_index: int) -> bool:
     """
-    Castling is quite complicated and I have not implemented all the rules
-    1. The king must have never moved. Using the current arguments, there is no way to verify this
-    2. The rook must have never moved. Using the current arguments, there is no way to verify this
-
+    Castling is quite complicated.
     Note that the rook may pass through attacking squares. That's fine.
     Additionally the rook can move if it is under attack.
 
     Implement the following rules:
+    0. The king and the rook have never moved (castling rights on the board)
     1. Rook is on one of the two possible castle spots
     2. King is on the correct square
     3. Rook is the correct color
@@ -222,7 +337,7 @@ def can_castle(board: Board, from_index: int, to_index: int) -> bool:
     for square in check_squares:
         if not is_empty_square(board, square):
             return False
-    if get_raw_piece(board._board[rook_square]) != ROOK:
+    if board._board[rook_square] & TYPE_MASK != ROOK_CODE:
         return False
     color = get_color(board, from_index)
     assert color is not None
@@ -230,6 +345,13 @@ def can_castle(board: Board, from_index: int, to_index: int) -> bool:
     if get_color(board, rook_square) != color:
         return False
 
+    if from_index < to_index:
+        rights = (WHITE_KINGSIDE if color == WHITE else BLACK_KINGSIDE)
+    else:
+        rights = (WHITE_QUEENSIDE if color == WHITE else BLACK_QUEENSIDE)
+    if not board.can_castle(rights):
+        return False
+
     if color == WHITE:
         if sq_to_index("e1") != from_index:
             return False
@@ -240,12 +362,11 @@ def can_castle(board: Board, from_index: int, to_index: int) -> bool:
     if is_in_check(board, color):
         return False
 
+    # the king can be left where it is: it could only block an attack on these squares
+    # along the back rank, and then it would be in check already
+    opp_color = get_opposite_color(color)
     for idx in king_passes_squares:
-        b2 = Board(board._board)
-        piece = b2._board[from_index]
-        b2._board[from_index] = E
-        b2._board[idx] = piece
-        if is_in_check(b2, color):
+        if is_square_attacked(board, idx, opp_color):
             return False
     return True
 
@@ -270,39 +391,389 @@ def is_legal_move(board: Board, from_index: int, to_index: int) -> bool:
         if to_index not in get_piece_valid_squares(board, from_index):
             return False
 
-    return not is_in_check(gen_successor(board, from_index, to_index), color)
+    undo = board.make_move(build_move_code(board, from_index, to_index))
+    in_check = is_in_check(board, color)
+    board.unmake_move(undo)
+    return not in_check
+
+
+def is_square_attacked(board: Board, square: int, by_color: Color) -> bool:
+    """Return True iff any piece of by_color attacks the square.
+    Looks outward from the square along knight, king and pawn offsets and the sliding rays,
+    rather than generating the moves of every piece of by_color"""
+    if _backend == BITBOARD:
+        return bitboard.is_attacked(board, INDEX_TO_SQ64[square], by_color)
+    squares = board._board
+    color_bit = (0 if by_color == WHITE else BLACK_BIT)
+
+    code = KNIGHT_CODE | color_bit
+    for step in KNIGHT_STEPS:
+        if squares[square + step] == code:
+            return True
+    code = PAWN_CODE | color_bit
+    for step in PAWN_STEPS[by_color]:
+        if squares[square + step] == code:
+            return True
+    code = KING_CODE | color_bit
+    for step in KING_STEPS:
+        if squares[square + step] == code:
+            return True
+
+    queen = QUEEN_CODE | color_bit
+    rook = ROOK_CODE | color_bit
+    for step in ROOK_STEPS:
+        index = square + step
+        code = squares[index]
+        while code == EMPTY_CODE:
+            index += step
+            code = squares[index]
+        if code == rook or code == queen:
+            return True
+    bishop = BISHOP_CODE | color_bit
+    for step in BISHOP_STEPS:
+        index = square + step
+        code = squares[index]
+        while code == EMPTY_CODE:
+            index += step
+            code = squares[index]
+        if code == bishop or code == queen:
+            return True
+    return False
 
 
 def is_in_check(board: Board, color: Color) -> bool:
     """
-    Note that this function is expensive to compute
-    Avoid calling it too many times
+    The result is cached on the board until the next move
     """
-    if board._check_computed[color]:
-        return board.get_check(color)
-    # find the king
-    king_pos = find_king_index(board, color)
+    in_check = board._in_check[color]
+    if in_check is None:
+        if _backend == BITBOARD:
+            in_check = bitboard.is_in_check(board, color)
+        else:
+            in_check = is_square_attacked(board, find_king_index(board, color), get_opposite_color(color))
+        board.set_check(color, in_check)
+    return in_check
 
+
+def _find_checks_and_pins(board: Board, color: Color, king: int) -> Tuple[Optional[Set[int]], Dict[int, Set[int]]]:
+    """Look outward from the king of the given color for pieces giving check and for pinned pieces.
+    :returns: (evasions, pins)
+        evasions is None if the king is not in check. Otherwise it is the set of squares which stop the check
+        when another piece moves there (capture the checker or block it), empty for a double check.
+        pins maps the index of each pinned piece to the squares it can move to (its pin ray, including the pinner)
+    """
+    squares = board._board
+    enemy_bit = (BLACK_BIT if color == WHITE else 0)
+    queen = QUEEN_CODE | enemy_bit
+    checks = 0
+    evasions = set()  # type: Set[int]
+    pins = {}  # type: Dict[int, Set[int]]
+
+    for steps, slider in ((ROOK_STEPS, ROOK_CODE | enemy_bit), (BISHOP_STEPS, BISHOP_CODE | enemy_bit)):
+        for step in steps:
+            ray = []
+            pinned = -1
+            index = king + step
+            code = squares[index]
+            while code != GUARD_CODE:
+                if code == EMPTY_CODE:
+                    ray.append(index)
+                elif CODE_COLOR[code] is color:
+                    if pinned != -1:
+                        break
+                    pinned = index
+                else:
+                    if code == slider or code == queen:
+                        ray.append(index)
+                        if pinned == -1:
+                            checks += 1
+                            evasions.update(ray)
+                        else:
+                            pins[pinned] = set(ray)
+                    break
+                index += step
+                code = squares[index]
+
+    code = KNIGHT_CODE | enemy_bit
+    for step in KNIGHT_STEPS:
+        if squares[king + step] == code:
+            checks += 1
+            evasions.add(king + step)
+    code = PAWN_CODE | enemy_bit
+    for step in PAWN_STEPS[not color]:
+        if squares[king + step] == code:
+            checks += 1
+            evasions.add(king + step)
+
+    if checks == 0:
+        return None, pins
+    elif checks > 1:
+        # only the king can get out of a double check
+        return set(), pins
+    return evasions, pins
+
+
+def _safe_king_squares(board: Board, color: Color, king: int, dests: List[int]) -> List[int]:
+    """:returns: the squares among dests which the king can move to without being in check"""
+    if not dests:
+        return dests
     opp_color = get_opposite_color(color)
-    # get everything for that color
-    for index, _ in get_piece_list(board, opp_color):
-        for sq in get_piece_valid_squares(board, index):
-            if sq == king_pos:
-                board.set_check(color, True)
-                return True
-    board.set_check(color, False)
+    code = board._board[king]
+    # take the king off the board, so it can't hide behind itself along the line it is attacked on
+    board.set_square(king, EMPTY_CODE)
+    try:
+        return [dest for dest in dests if not is_square_attacked(board, dest, opp_color)]
+    finally:
+        board.set_square(king, code)
+
+
+def _gen_king_moves(board: Board, color: Color, king: int, in_check: bool) -> Iterator[int]:
+    for dest in _safe_king_squares(board, color, king, list(get_piece_valid_squares(board, king))):
+        yield build_move_code(board, king, dest)
+
+    if not in_check and board.can_castle(
+            (WHITE_KINGSIDE | WHITE_QUEENSIDE) if color == WHITE else (BLACK_KINGSIDE | BLACK_QUEENSIDE)):
+        for dest in (king + 2, king - 2):
+            if can_castle(board, king, dest):
+                yield build_move_code(board, king, dest)
+
+
+class CheckInfo(NamedTuple):
+    """Where the pieces of one color can move to give check, see get_check_info"""
+    color: Color
+    # index of the king that would be in check
+    king: int
+    # squares from which a piece gives check, indexed by piece type
+    squares: List[Set[int]]
+    # pieces of color that are the first piece on a line from the king, and the step from the king to them
+    blockers: Dict[int, int]
+    # blockers with a rook, bishop or queen of color behind them, which give check by moving off the line
+    discoverers: Dict[int, int]
+
+
+def get_check_info(board: Board, color: Color) -> CheckInfo:
+    """Find the squares from which the pieces of color would give check, by looking outward from the other king.
+    Computed once per position, so gives_check doesn't have to make each move"""
+    squares = board._board
+    king = find_king_index(board, get_opposite_color(color))
+    own_bit = (0 if color == WHITE else BLACK_BIT)
+    queen = QUEEN_CODE | own_bit
+    check_squares = [set() for _ in range(8)]  # type: List[Set[int]]
+    check_squares[PAWN_CODE] = {king + step for step in PAWN_STEPS[color]}
+    check_squares[KNIGHT_CODE] = {king + step for step in KNIGHT_STEPS}
+    blockers = {}  # type: Dict[int, int]
+    discoverers = {}  # type: Dict[int, int]
+
+    for steps, piece in ((ROOK_STEPS, ROOK_CODE), (BISHOP_STEPS, BISHOP_CODE)):
+        slider = piece | own_bit
+        for step in steps:
+            index = king + step
+            code = squares[index]
+            while code == EMPTY_CODE:
+                check_squares[piece].add(index)
+                index += step
+                code = squares[index]
+            if code == GUARD_CODE:
+                continue
+            # a slider can also capture the first piece on the line
+            check_squares[piece].add(index)
+            if CODE_COLOR[code] is color:
+                blockers[index] = step
+                behind = index + step
+                while squares[behind] == EMPTY_CODE:
+                    behind += step
+                if squares[behind] == slider or squares[behind] == queen:
+                    discoverers[index] = step
+    check_squares[QUEEN_CODE] = check_squares[ROOK_CODE] | check_squares[BISHOP_CODE]
+    return CheckInfo(color, king, check_squares, blockers, discoverers)
+
+
+def gives_check(board: Board, move, check_info: Optional[CheckInfo] = None) -> bool:
+    """Return True iff the move puts the other king in check.
+    :param move: Move, or a move packed into an int
+    :param check_info: from get_check_info for the moving color, computed if not given"""
+    code = encode_move(move)
+    src = code & MOVE_SQUARE_MASK
+    if check_info is None:
+        check_info = get_check_info(board, get_color(board, src))
+    if code & (MOVE_CASTLE | MOVE_EN_PASSANT | (TYPE_MASK << MOVE_PROMOTION_SHIFT)):
+        # rare enough to just make the move
+        undo = board.make_move(code)
+        in_check = is_in_check(board, get_opposite_color(check_info.color))
+        board.unmake_move(undo)
+        return in_check
+
+    dest = (code >> MOVE_DEST_SHIFT) & MOVE_SQUARE_MASK
+    piece = board._board[src] & TYPE_MASK
+    if dest in check_info.squares[piece]:
+        return True
+    step = check_info.blockers.get(src)
+    if step is not None:
+        line = LINE_STEPS[check_info.king * 120 + dest]
+        if line != step:
+            # moving off the line opens it
+            return src in check_info.discoverers
+        # moving along the line away from the king, it attacks back through the square it left
+        if piece == QUEEN_CODE:
+            return True
+        elif piece == ROOK_CODE:
+            return step in ROOK_STEPS
+        elif piece == BISHOP_CODE:
+            return step in BISHOP_STEPS
     return False
 
 
+def gen_legal_move_codes(board: Board, color: Color, src: Optional[int] = None) -> Iterator[int]:
+    """Generate all legal moves by the given color packed into ints (see move.pack_move),
+    including castling and promotions.
+    :param src: only generate the moves of the piece of the given color on this square
+    Checks and pins are found once for the position, so most moves need no test:
+    - in check, pieces other than the king may only move to squares which capture or block the checker
+    - pinned pieces may only move along their pin ray
+    Only king moves and en-passant captures are tested for the squares they leave open"""
+    king = find_king_index(board, color)
+    evasions, pins = _find_checks_and_pins(board, color, king)
+    board.set_check(color, evasions is not None)
+    ep_capture = board.get_ep_capture_index()
+    # pawns promote on moving to this row
+    last_row = (8 if color == WHITE else 1)
+
+    pieces = (get_piece_code_list(board, color) if src is None else
+              [(src, board._board[src])] if get_color(board, src) == color else [])
+    for src, code in pieces:
+        if src == king:
+            yield from _gen_king_moves(board, color, king, evasions is not None)
+            continue
+        if evasions is not None and not evasions:
+            continue
+        pin = pins.get(src)
+        is_pawn = code & TYPE_MASK == PAWN_CODE
+        for dest in get_piece_valid_squares(board, src):
+            is_ep = is_pawn and dest == ep_capture
+            if not is_ep and ((evasions is not None and dest not in evasions) or
+                              (pin is not None and dest not in pin)):
+                continue
+            move = build_move_code(board, src, dest)
+            if is_ep:
+                # the captured pawn also leaves its square, which may open a line to the king
+                undo = board.make_move(move)
+                in_check = is_in_check(board, color)
+                board.unmake_move(undo)
+                if in_check:
+                    continue
+            elif is_pawn and index_to_row(dest) == last_row:
+                for promotion in PROMOTION_TYPES:
+                    yield move | (promotion << MOVE_PROMOTION_SHIFT)
+                continue
+            yield move
+
+
+def gen_capture_move_codes(board: Board, color: Color) -> Iterator[int]:
+    """Generate the legal captures (including en-passant) and promotions by the given color, packed into ints.
+    Quiet moves are not generated at all, see get_piece_capture_squares.
+    When the king is in check every legal move is generated instead, since all of them are evasions"""
+    king = find_king_index(board, color)
+    evasions, pins = _find_checks_and_pins(board, color, king)
+    board.set_check(color, evasions is not None)
+    if evasions is not None:
+        yield from gen_legal_move_codes(board, color)
+        return
+    ep_capture = board.get_ep_capture_index()
+    last_row = (8 if color == WHITE else 1)
+
+    for src, code in get_piece_code_list(board, color):
+        if src == king:
+            for dest in _safe_king_squares(board, color, king, list(get_piece_capture_squares(board, king))):
+                yield build_move_code(board, king, dest)
+            continue
+        pin = pins.get(src)
+        is_pawn = code & TYPE_MASK == PAWN_CODE
+        for dest in get_piece_capture_squares(board, src):
+            is_ep = is_pawn and dest == ep_capture
+            if not is_ep and pin is not None and dest not in pin:
+                continue
+            move = build_move_code(board, src, dest)
+            if is_ep:
+                # the captured pawn also leaves its square, which may open a line to the king
+                undo = board.make_move(move)
+                in_check = is_in_check(board, color)
+                board.unmake_move(undo)
+                if in_check:
+                    continue
+            elif is_pawn and index_to_row(dest) == last_row:
+                for promotion in PROMOTION_TYPES:
+                    yield move | (promotion << MOVE_PROMOTION_SHIFT)
+                continue
+            yield move
+
+
+def gen_check_move_codes(board: Board, color: Color, check_info: Optional[CheckInfo] = None) -> Iterator[int]:
+    """Generate the legal moves by the given color which give check, packed into ints.
+    Most pieces only move to the squares they give check from (see get_check_info), without testing the move.
+    The pieces which block a line to the other king (and the king itself, for castling) are tested
+    with gives_check, which finds the discovered checks. So are promotions and en-passant captures
+    :param check_info: from get_check_info for color, computed if not given"""
+    if check_info is None:
+        check_info = get_check_info(board, color)
+    king = find_king_index(board, color)
+    evasions, pins = _find_checks_and_pins(board, color, king)
+    board.set_check(color, evasions is not None)
+    ep_capture = board.get_ep_capture_index()
+    last_row = (8 if color == WHITE else 1)
+    check_squares = check_info.squares
+    blockers = check_info.blockers
+
+    for src, code in get_piece_code_list(board, color):
+        if src == king:
+            if src in blockers or board.can_castle(
+                    (WHITE_KINGSIDE | WHITE_QUEENSIDE) if color == WHITE else (BLACK_KINGSIDE | BLACK_QUEENSIDE)):
+                for move in _gen_king_moves(board, color, king, evasions is not None):
+                    if gives_check(board, move, check_info):
+                        yield move
+            continue
+        if evasions is not None and not evasions:
+            continue
+        pin = pins.get(src)
+        piece = code & TYPE_MASK
+        is_pawn = piece == PAWN_CODE
+        # None when every move of the piece has to be tested
+        targets = (None if src in blockers else check_squares[piece])
+        for dest in get_piece_valid_squares(board, src):
+            is_ep = is_pawn and dest == ep_capture
+            promotes = is_pawn and index_to_row(dest) == last_row
+            if targets is not None and dest not in targets and not is_ep and not promotes:
+                continue
+            if not is_ep and ((evasions is not None and dest not in evasions) or
+                              (pin is not None and dest not in pin)):
+                continue
+            move = build_move_code(board, src, dest)
+            if is_ep:
+                # the captured pawn also leaves its square, which may open a line to the king
+                undo = board.make_move(move)
+                in_check = is_in_check(board, color)
+                board.unmake_move(undo)
+                if in_check or not gives_check(board, move, check_info):
+                    continue
+            elif promotes:
+                for promotion in PROMOTION_TYPES:
+                    if gives_check(board, move | (promotion << MOVE_PROMOTION_SHIFT), check_info):
+                        yield move | (promotion << MOVE_PROMOTION_SHIFT)
+                continue
+            elif targets is None and not gives_check(board, move, check_info):
+                continue
+            yield move
+
+
+def gen_legal_moves(board: Board, color: Color) -> Iterator[Move]:
+    """Generate all legal moves by the given color, including castling and promotions.
+    See gen_legal_move_codes"""
+    for code in gen_legal_move_codes(board, color):
+        yield decode_move(board, code)
+
+
 def _has_no_legal_moves(board: Board, color: Color) -> bool:
-    """
-    NOTE: this method is slow
-    """
-    for src_index, _ in get_piece_list(board, color):
-        for dest_index in get_piece_valid_squares(board, src_index):
-            next_board = gen_successor(board, src_index, dest_index)
-            if not is_in_check(next_board, color):
-                return False
+    for _ in gen_legal_move_codes(board, color):
+        return False
     return True
 
 
@@ -326,14 +797,19 @@ def get_promotions(board: Board, src: int, dest: int) -> List[PieceName]:
         return _get_promotions(board._board[src], src, dest)
 
 
-def _get_promotions(piece: PieceName, src: int, dest: int) -> List[PieceName]:
-    """Does not check if the move is valid."""
-    if get_raw_piece(piece) != PAWN:
+# piece types a pawn can promote to, in the order they are generated
+PROMOTION_TYPES = (QUEEN_CODE, BISHOP_CODE, ROOK_CODE, KNIGHT_CODE)
+
+
+def _get_promotions(piece: PieceCode, src: int, dest: int) -> List[PieceName]:
+    """Does not check if the move is valid.
+    :param piece: code of the moving piece"""
+    if piece & TYPE_MASK != PAWN_CODE:
         return []
 
-    if get_piece_color(piece) == WHITE and index_to_row(dest) == 8:
+    if CODE_COLOR[piece] == WHITE and index_to_row(dest) == 8:
         return ["Q", "B", "R", "N"]
-    elif get_piece_color(piece) == BLACK and index_to_row(dest) == 1:
+    elif CODE_COLOR[piece] == BLACK and index_to_row(dest) == 1:
         return ["q", "b", "r", "n"]
     else:
         return []
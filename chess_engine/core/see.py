@@ -0,0 +1,104 @@
+"""
+Static exchange evaluation (SEE).
+
+Works out the material won or lost by a capture, assuming both sides then keep capturing
+on the same square with their least valuable piece, and either side may stop when
+continuing would lose material. Only the pieces are moved, on a scratch copy of the squares,
+so pieces behind a capturing slider (x-rays) join in as the pieces in front of them leave.
+"""
+
+from .board import (BISHOP_CODE, BLACK, BLACK_BIT, EMPTY_CODE, KING_CODE,
+                    KNIGHT_CODE, MOVE_DEST_SHIFT, MOVE_EN_PASSANT,
+                    MOVE_PROMOTION_SHIFT, MOVE_SQUARE_MASK, PAWN_CODE,
+                    QUEEN_CODE, ROOK_CODE, TYPE_MASK, WHITE, Board, Color)
+from .evaluation import PIECE_VALUES
+from .move import encode_move
+from .piece_movement_rules import (BISHOP_STEPS, KING_STEPS, KNIGHT_STEPS,
+                                   PAWN_STEPS, ROOK_STEPS)
+
+
+def _least_valuable_attacker(squares, target: int, color: Color) -> int:
+    """:returns: index of the least valuable piece of the given color attacking the target, or -1"""
+    color_bit = (0 if color == WHITE else BLACK_BIT)
+    code = PAWN_CODE | color_bit
+    for step in PAWN_STEPS[color]:
+        if squares[target + step] == code:
+            return target + step
+    code = KNIGHT_CODE | color_bit
+    for step in KNIGHT_STEPS:
+        if squares[target + step] == code:
+            return target + step
+
+    queen = -1
+    code = BISHOP_CODE | color_bit
+    for step in BISHOP_STEPS:
+        index = target + step
+        while squares[index] == EMPTY_CODE:
+            index += step
+        if squares[index] == code:
+            return index
+        elif squares[index] == QUEEN_CODE | color_bit:
+            queen = index
+    code = ROOK_CODE | color_bit
+    for step in ROOK_STEPS:
+        index = target + step
+        while squares[index] == EMPTY_CODE:
+            index += step
+        if squares[index] == code:
+            return index
+        elif squares[index] == QUEEN_CODE | color_bit:
+            queen = index
+    if queen != -1:
+        return queen
+
+    code = KING_CODE | color_bit
+    for step in KING_STEPS:
+        if squares[target + step] == code:
+            return target + step
+    return -1
+
+
+def static_exchange(board: Board, move) -> int:
+    """Material (in pawns) won by the side making the capture, once the exchange on the target square is over.
+    Negative if the capture loses material. Pins are not taken into account
+    :param move: Move, or a move packed into an int"""
+    code = encode_move(move)
+    src = code & MOVE_SQUARE_MASK
+    target = (code >> MOVE_DEST_SHIFT) & MOVE_SQUARE_MASK
+    promotion = (code >> MOVE_PROMOTION_SHIFT) & TYPE_MASK
+    squares = board._board[:]
+    mover = squares[src]
+    if code & MOVE_EN_PASSANT:
+        squares[board.get_ep_pawn_index()] = EMPTY_CODE
+        captured_value = PIECE_VALUES[PAWN_CODE]
+    else:
+        captured_value = PIECE_VALUES[squares[target] & TYPE_MASK]
+    on_square_value = PIECE_VALUES[mover & TYPE_MASK]
+    if promotion:
+        promoted_value = PIECE_VALUES[promotion]
+        captured_value += promoted_value - PIECE_VALUES[PAWN_CODE]
+        on_square_value = promoted_value
+    squares[src] = EMPTY_CODE
+    squares[target] = mover
+
+    # gains[i] is the material won by the side making capture i, if the exchange stopped after it
+    gains = [captured_value]
+    color = (WHITE if mover & BLACK_BIT else BLACK)
+    while True:
+        attacker = _least_valuable_attacker(squares, target, color)
+        if attacker == -1:
+            break
+        code = squares[attacker]
+        squares[attacker] = EMPTY_CODE
+        if code & TYPE_MASK == KING_CODE and _least_valuable_attacker(squares, target, not color) != -1:
+            # the king can't capture a defended piece
+            break
+        gains.append(on_square_value - gains[-1])
+        on_square_value = PIECE_VALUES[code & TYPE_MASK]
+        squares[target] = code
+        color = not color
+
+    # each side only continues the exchange if that is better than stopping
+    for i in range(len(gains) - 1, 0, -1):
+        gains[i - 1] = -max(-gains[i - 1], gains[i])
+    return gains[0]
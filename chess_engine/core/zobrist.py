@@ -0,0 +1,26 @@
+"""
+Random keys for Zobrist hashing of positions.
+The hash of a position is the XOR of the keys of every (piece, square) pair,
+the castling rights, the en-passant file and the side to move.
+Since XOR is its own inverse, the hash can be updated in O(1) when a move is made.
+See Board.set_square and Board.make_move
+"""
+
+import random
+
+# seeded so that hashes are stable between runs
+_rng = random.Random(20190901)
+
+
+def _gen_key() -> int:
+    return _rng.getrandbits(64)
+
+
+# indexed by [piece code][board index]
+# the empty square has no key, so that placing and removing pieces is a single XOR
+PIECE_KEYS = [[0] * 120] + [[_gen_key() for _ in range(120)] for _ in range(1, 16)]
+# indexed by the castling rights bitmask
+CASTLING_KEYS = [0] + [_gen_key() for _ in range(1, 16)]
+# indexed by file (0-7)
+EP_FILE_KEYS = [_gen_key() for _ in range(8)]
+BLACK_TO_MOVE_KEY = _gen_key()
@@ -0,0 +1,325 @@
+"""
+Depth-first proof-number search (df-pn) for forced mates.
+
+Every node of the tree has a proof number (how many leaves still have to be shown to be mates to prove that the
+attacker mates from here) and a disproof number (the same for showing there is no mate). The search always expands
+the most proving node: at attacker nodes the child with the smallest proof number, at defender nodes the child with
+the smallest disproof number. So when one attacking line clearly works, the defender replies that are already
+refuted by it are never looked at twice, unlike alpha-beta which searches every reply at full width.
+
+Numbers are kept from the point of view of the player to move (phi, delta):
+at attacker nodes phi is the proof number and delta the disproof number, at defender nodes the other way around.
+df-pn explores depth-first with thresholds on both numbers, and keeps the numbers of the nodes it leaves
+in a ProofTable, a memory-bounded transposition table.
+
+Nodes are keyed on the position and the number of attacker moves left, so a position reached with fewer moves
+to go is a different node, and a mate in n moves can't run into a cycle.
+"""
+
+import logging
+from typing import List, Optional, Tuple
+
+from .core.board import Board, Color
+from .core.move import Move, decode_move
+from .core.piece_movement_rules import (_has_no_legal_moves, gen_check_move_codes, gen_legal_move_codes,
+                                        get_check_info, gives_check, is_in_check)
+from .engine import CHECKMATE, SearchAborted, SearchLimits, _capture_order
+from .transposition import BucketTable
+
+# proof and disproof numbers of solved nodes
+INFINITY = 1 << 30
+
+# initial proof number of the attacker's quiet moves, checks start at 1. Most mates are forced with checks,
+# so quiet moves are only looked at once the checks are not going anywhere
+QUIET_PROOF = 16
+# a child is searched until its delta goes beyond the second best child's times this, rather than just beyond it,
+# so the search doesn't keep switching between children with close numbers
+EPSILON = 3
+
+# bytes used by one entry of a ProofTable: key (8), phi (4), delta (4), work (4), move (4)
+PROOF_ENTRY_SIZE = 24
+
+ProofEntry = Tuple[int, int, int, int]
+
+# mixes the number of attacker moves left into the position's hash
+_DEPTH_KEY = 0x9E3779B97F4A7C15
+_KEY_MASK = (1 << 64) - 1
+
+
+class ProofTable(BucketTable):
+    """Proof and disproof numbers by node, in the buckets of a BucketTable.
+    The first slot of a bucket keeps the entry whose subtree took the most work to search,
+    the second is always replaced. Losing an entry only means its subtree may be searched again"""
+
+    FIELDS = (("_phis", "I"), ("_deltas", "I"), ("_works", "I"), ("_moves", "I"))
+    ENTRY_SIZE = PROOF_ENTRY_SIZE
+
+    def probe(self, key: int) -> Optional[ProofEntry]:
+        """
+        :returns: (phi, delta, move, work) stored for the key, or None
+        """
+        slot = self._probe_slot(key)
+        if slot < 0:
+            return None
+        return self._phis[slot], self._deltas[slot], self._moves[slot], self._works[slot]
+
+    def store(self, key: int, phi: int, delta: int, work: int, move: int) -> None:
+        """
+        :param work: number of nodes searched below this one, bigger subtrees are kept over smaller ones
+        :param move: the child searched last, the mating move once the attacker's node is proven
+        """
+        work = min(work, 0xffffffff)
+        slot = self._store_slot(key, work, self._works)
+        if self._keys[slot] == key:
+            work = max(work, self._works[slot])
+        self._keys[slot] = key
+        self._phis[slot] = phi
+        self._deltas[slot] = delta
+        self._works[slot] = work
+        self._moves[slot] = move
+
+
+def _is_mated(board: Board, color: Color) -> bool:
+    """:returns: True iff color (to move) is checkmated"""
+    return is_in_check(board, color) and _has_no_legal_moves(board, color)
+
+
+def node_key(board: Board, depth: int) -> int:
+    """Key of the node for the position on the board with depth attacker moves left"""
+    return (board._hash ^ (depth * _DEPTH_KEY)) & _KEY_MASK or 1
+
+
+class ProofNumberSearch:
+    """df-pn search for a mate in at most a given number of moves.
+    The table is kept from one search to the next, so a later search reuses the nodes an earlier one solved"""
+
+    def __init__(self, stats_dict: Optional[dict] = None, table: Optional[ProofTable] = None,
+                 limits: Optional[SearchLimits] = None, checks_only: bool = False):
+        """
+        :param limits: raise SearchAborted once these are reached
+        :param checks_only: the attacker only plays checks (see gen_check_move_codes), the defender every legal move.
+            A node disproven this way may still be a mate, so don't keep the table for a search with every move
+        """
+        self.stats_dict = stats_dict
+        self.table = (ProofTable() if table is None else table)
+        self.limits = limits
+        self.checks_only = checks_only
+        self.nodes = 0
+
+    def prove(self, board: Board, color: Color, depth: int) -> bool:
+        """:returns: True iff color (to move) mates in at most depth moves"""
+        return self._solve(board, color, True, depth)
+
+    def mating_line(self, board: Board, color: Color, depth: int) -> List[Move]:
+        """The moves of a proven mate in at most depth moves.
+        Proving that the defender can't hold out longer than some number of moves would take a search of every
+        shorter mate, so the defender picks the reply that can't be mated at once and whose proof took the most work,
+        which is the one holding out the longest in practice. The attacker mates at once when it can"""
+        moves = []  # type: List[Move]
+        undos = []
+        attacker = True
+        try:
+            while True:
+                if attacker:
+                    code = self._mating_move(board, color, depth)
+                    depth -= 1
+                else:
+                    replies = list(gen_legal_move_codes(board, color))
+                    if not replies:
+                        break
+                    code = max(replies, key=lambda reply: self._resistance(board, reply, color, depth))
+                moves.append(decode_move(board, code))
+                undos.append(board.make_move(code))
+                color = not color
+                attacker = not attacker
+        finally:
+            for undo in reversed(undos):
+                board.unmake_move(undo)
+        return moves
+
+    def _mating_move(self, board: Board, color: Color, depth: int) -> int:
+        """A move of the attacker which mates in at most depth moves, from a proven node"""
+        if depth > 1 and self._solve(board, color, True, 1):
+            depth = 1
+        entry = self.table.probe(node_key(board, depth))
+        moves, _ = self._gen_moves(board, color, True, depth)
+        if entry is not None and entry[2] in moves:
+            # the table has the move that proved this node, unless the entry was replaced
+            moves.remove(entry[2])
+            moves.insert(0, entry[2])
+        for code in moves:
+            undo = board.make_move(code)
+            try:
+                if self._solve(board, not color, False, depth - 1):
+                    return code
+            finally:
+                board.unmake_move(undo)
+        raise ValueError("no mate in %d from this position" % depth)
+
+    def _resistance(self, board: Board, reply: int, color: Color, depth: int) -> Tuple[bool, int]:
+        """:returns: whether the defender's reply avoids a mate in 1, and the work it took to prove the mate after it"""
+        undo = board.make_move(reply)
+        try:
+            if depth > 1 and self._solve(board, not color, True, 1):
+                return (False, 0)
+            self._solve(board, not color, True, depth)
+            entry = self.table.probe(node_key(board, depth))
+            return (True, 0 if entry is None else entry[3])
+        finally:
+            board.unmake_move(undo)
+
+    def _solve(self, board: Board, color: Color, attacker: bool, depth: int) -> bool:
+        """Search the node until it is proven or disproven.
+        :returns: True iff the attacker mates"""
+        phi, delta = self._mid(board, color, attacker, depth, INFINITY, INFINITY)
+        # the player to move wins when phi is 0, and loses when delta is
+        return (phi == 0 if attacker else delta == 0)
+
+    def _gen_moves(self, board: Board, color: Color, attacker: bool, depth: int) -> Tuple[List[int], List[bool]]:
+        """:returns: the moves searched from the node, checks first and then captures by _capture_order,
+        and whether each of them gives check"""
+        check_info = get_check_info(board, color)
+        if attacker and (self.checks_only or depth == 1):
+            # on the attacker's last move only a check can mate
+            codes = list(gen_check_move_codes(board, color, check_info))
+            codes.sort(key=lambda code: _capture_order(board, code), reverse=True)
+            return codes, [True] * len(codes)
+        ordered = sorted(((gives_check(board, code, check_info), _capture_order(board, code), code)
+                          for code in gen_legal_move_codes(board, color)), reverse=True)
+        return [code for _, _, code in ordered], [check for check, _, _ in ordered]
+
+    def _mid(self, board: Board, color: Color, attacker: bool, depth: int,
+             th_phi: int, th_delta: int) -> Tuple[int, int]:
+        """Expand the node until its phi reaches th_phi or its delta reaches th_delta.
+        :param color: player to move
+        :param attacker: whether the player to move is the one giving mate
+        :param depth: number of moves the attacker has left, including this one
+        :returns: (phi, delta) of the node, which is also stored in the table"""
+        key = node_key(board, depth)
+        entry = self.table.probe(key)
+        if entry is not None and (entry[0] >= th_phi or entry[1] >= th_delta):
+            return entry[0], entry[1]
+        if self.limits is not None:
+            self.limits.check()
+        if self.stats_dict:
+            self.stats_dict["nodes_explored"] += 1
+        self.nodes += 1
+        nodes_before = self.nodes
+
+        if not attacker and depth == 0:
+            # the attacker has no moves left, so this is a mate or nothing
+            phi, delta = ((INFINITY, 0) if _is_mated(board, color) else (0, INFINITY))
+            self.table.store(key, phi, delta, 1, 0)
+            return phi, delta
+        if attacker and depth == 1:
+            # the children are all mates or not, so solve the node at once rather than expanding them one by one
+            for code in list(gen_check_move_codes(board, color)):
+                undo = board.make_move(code)
+                mated = _is_mated(board, not color)
+                board.unmake_move(undo)
+                if mated:
+                    self.table.store(key, 0, INFINITY, 1, code)
+                    return 0, INFINITY
+            self.table.store(key, INFINITY, 0, 1, 0)
+            return INFINITY, 0
+
+        moves, checks = self._gen_moves(board, color, attacker, depth)
+        if not moves:
+            if attacker or is_in_check(board, color):
+                # the attacker can't mate, or the defender is mated
+                phi, delta = INFINITY, 0
+            else:
+                # stalemate
+                phi, delta = 0, INFINITY
+            self.table.store(key, phi, delta, 1, 0)
+            return phi, delta
+
+        child_depth = (depth - 1 if attacker else depth)
+        opponent = not color
+        # (phi, delta) of each child. Rather than making every move to look its child up in the table,
+        # children start from an estimate, and the table is only read when the search goes into one of them.
+        # A quiet move of the attacker leaves the defender more replies to disprove it with than a check
+        children = [([1, 1] if check or not attacker else [1, QUIET_PROOF]) for check in checks]
+        if depth > 1:
+            # the move searched last in the same position with one move less to go goes first: it proved
+            # or refuted the shallower node, and often does the same here
+            shallower = self.table.probe(node_key(board, depth - 1))
+            if shallower is not None and shallower[2] in moves:
+                i = moves.index(shallower[2])
+                moves.insert(0, moves.pop(i))
+                children.insert(0, children.pop(i))
+
+        best = 0
+        while True:
+            # a node's phi is the smallest delta of its children, and its delta is the sum of their phis
+            phi = INFINITY
+            delta = 0
+            second_delta = INFINITY
+            for i, (child_phi, child_delta) in enumerate(children):
+                delta += child_phi
+                if child_delta < phi:
+                    second_delta = phi
+                    phi = child_delta
+                    best = i
+                elif child_delta < second_delta:
+                    second_delta = child_delta
+            delta = min(delta, INFINITY)
+            if phi >= th_phi or delta >= th_delta:
+                break
+            child = children[best]
+            child_th_phi = min(th_delta - delta + child[0], INFINITY)
+            child_th_delta = min(th_phi, int(second_delta * EPSILON) + 1)
+            undo = board.make_move(moves[best])
+            try:
+                child[0], child[1] = self._mid(board, opponent, not attacker, child_depth,
+                                               child_th_phi, child_th_delta)
+            finally:
+                board.unmake_move(undo)
+
+        self.table.store(key, phi, delta, self.nodes - nodes_before + 1, moves[best])
+        return phi, delta
+
+
+def proof_number_search(board: Board, color: Color, n: int, stats_dict: Optional[dict] = None,
+                        table_size_mb: float = 16, time_limit: Optional[float] = None,
+                        node_limit: Optional[int] = None, cancel=None,
+                        checks_only: bool = False) -> Tuple[int, List[Move], int]:
+    """Prove or disprove a mate in at most n moves with a df-pn search.
+    Unlike engine.iterative_deepening this doesn't look for a mate in 1, then in 2 and so on: showing that there is
+    no shorter mate is a full width search, while proving the mate in n often only takes its forcing line.
+    So the mate found is not always the shortest one. See engine.iterative_deepening for the other parameters
+    :param table_size_mb: size of the ProofTable in megabytes
+    :returns: (CHECKMATE and the mating line, or 0 and the first move searched, n or 0 if the search was stopped)"""
+    if stats_dict is None:
+        stats_dict = {}
+    stats_dict.setdefault("nodes_explored", 0)
+    table = ProofTable(table_size_mb)
+    limits = SearchLimits(time_limit, node_limit, cancel)
+    # an aborted search leaves its moves on the board, so search a copy
+    search_board = Board(board)
+    for checks_phase in ([True, False] if checks_only else [False]):
+        if not checks_phase and checks_only:
+            logging.info("No mate with checks only in %d moves, searching every move", n)
+            table.clear()
+        search = ProofNumberSearch(stats_dict, table, limits, checks_only=checks_phase)
+        score, moves = 0, []  # type: Tuple[int, List[Move]]
+        depth_completed = 0
+        try:
+            if search.prove(search_board, color, n):
+                score, depth_completed = CHECKMATE, n
+                # the mate is proven, so the line is built even if a limit is reached on the way
+                search.limits = None
+                moves = search.mating_line(search_board, color, n)
+            else:
+                codes, _ = search._gen_moves(search_board, color, True, n)
+                moves = [decode_move(search_board, code) for code in codes[:1]]
+                depth_completed = n
+        except SearchAborted as e:
+            logging.info("Proof-number search for mate in %d stopped: %s", n, str(e))
+        if depth_completed < n or score == CHECKMATE:
+            break
+    if checks_only:
+        stats_dict["checks_only"] = checks_phase
+    table.update_stats(stats_dict)
+    stats_dict["depth_completed"] = depth_completed
+    return (score, moves, depth_completed)
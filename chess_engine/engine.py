@@ -1,13 +1,26 @@
 import logging
-from typing import Iterator, List, Optional, Tuple
-
-from .core.board import (BISHOP, BLACK, KING, KNIGHT, PAWN, QUEEN, ROOK, WHITE,
-                         Board, Color, PieceName, dump_board, get_color,
-                         get_piece_list, get_raw_piece, is_capture)
-from .core.move import Move, gen_successor, gen_successor_from_move
-from .core.piece_movement_rules import (_get_promotions, _has_no_legal_moves,
-                                        get_piece_valid_squares, is_in_check)
+import random
+import time
+from typing import Any, Iterator, List, Optional, Tuple
+
+from .core.board import (BISHOP, BLACK, KING, KNIGHT, MOVE_CAPTURE,
+                         MOVE_DEST_SHIFT, MOVE_EN_PASSANT,
+                         MOVE_PROMOTION_SHIFT, MOVE_SQUARE_MASK, PAWN,
+                         PAWN_CODE, QUEEN, ROOK, TYPE_MASK, WHITE, Board,
+                         Color, PieceName, dump_board, get_color,
+                         get_raw_piece)
+from .core.evaluation import MAX_PHASE
+from .core.move import MOVE_SQUARES_MASK, Move, decode_move, encode_move
+from .core.piece_movement_rules import (CheckInfo, _has_no_legal_moves,
+                                        gen_capture_move_codes,
+                                        gen_check_move_codes,
+                                        gen_legal_move_codes, gen_legal_moves,
+                                        get_check_info, gives_check,
+                                        is_in_check)
+from .core.see import PIECE_VALUES, static_exchange
 from .core.utils import get_opposite_color
+from .transposition import (EXACT, LOWER, NO_MOVE, UPPER, TranspositionTable,
+                            score_from_tt, score_to_tt)
 
 piece_scores = {
     KNIGHT: 3,
@@ -18,51 +31,650 @@ piece_scores = {
     KING: 1000
 }
 CHECKMATE = 10000
-CHECK = 5
+# scores beyond this are mates, see dls_minimax
+MATE_THRESHOLD = CHECKMATE - 1000
+# depth stored in the transposition table for positions that are already decided
+MAX_DEPTH = 127
+# move ordering bonuses, see score_move
+CHECK = 100000
+PROMOTION = 10000
+WINNING_CAPTURE = 10000
+LOSING_CAPTURE = -10000
+# delta pruning margin of the quiescence search, in centipawns: a capture is skipped when even winning
+# the captured piece and this much more can't bring the score up to alpha
+DELTA_MARGIN = 200
 MAX = True
 MIN = False
 
+# search algorithms which can be used by find_mate_in_n
+NEGAMAX = "negamax"
+MINIMAX = "minimax"
+# proof-number search, see dfpn.py
+DFPN = "df-pn"
+
+# ways find_mate_in_n can use several processes, see parallel.py
+ROOT_SPLIT = "root-split"
+LAZY_SMP = "lazy-smp"
+# how a search scores the positions at its depth limit:
+# 0 so that only mates count, the evaluation, or the evaluation once the captures are played out
+MATE_ONLY = "mate-only"
+STATIC = "static"
+QUIESCENCE = "quiescence"
+HORIZONS = (MATE_ONLY, STATIC, QUIESCENCE)
+
 
 def gen_all_moves(board: Board, color: Color) -> Iterator[Move]:
     """Generate all valid moves by given color.
     Do not generate moves where that color will be in check after the move"""
-    for location, piece in get_piece_list(board, color):
-        for dest in get_piece_valid_squares(board, location):
-            next_board = gen_successor(board, location, dest)
-            if not is_in_check(next_board, color):
-                prs = _get_promotions(piece, location, dest)
-                is_capture_move = is_capture(board, dest, piece)
-                if prs != []:
-                    for p in prs:
-                        yield Move(piece, location, dest, promotion=p, is_capture=is_capture_move)
-                else:
-                    # the destination here is chess notation, rather than index
-                    yield Move(piece, location, dest, is_capture=is_capture_move)
-
-
-def find_mate_in_n(board: Board, color: Color, n: int, stats_dict: Optional[dict] = None):
+    return gen_legal_moves(board, color)
+
+
+class SearchAborted(Exception):
+    """Raised inside the search when one of its limits is reached"""
+
+
+class SearchLimits:
+    """Time, node and cancellation limits for a search, checked once per node"""
+
+    # the clock and the cancel flag are only looked at every this many nodes
+    CHECK_INTERVAL = 64
+
+    def __init__(self, time_limit: Optional[float] = None, node_limit: Optional[int] = None,
+                 cancel=None):
+        """
+        :param time_limit: seconds the search may run for
+        :param node_limit: number of nodes the search may explore
+        :param cancel: anything with an is_set method, e.g. threading.Event. The search stops once it is set
+        """
+        self.deadline = (None if time_limit is None else time.monotonic() + time_limit)
+        self.node_limit = node_limit
+        self.cancel = cancel
+        self.nodes = 0
+
+    def is_exceeded(self) -> bool:
+        if self.node_limit is not None and self.nodes >= self.node_limit:
+            return True
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return True
+        return self.cancel is not None and self.cancel.is_set()
+
+    def check(self) -> None:
+        """Count a node, raise SearchAborted if the search has to stop"""
+        self.nodes += 1
+        if self.node_limit is not None and self.nodes > self.node_limit:
+            raise SearchAborted("node limit of %d reached" % self.node_limit)
+        if self.nodes % self.CHECK_INTERVAL == 0:
+            if self.deadline is not None and time.monotonic() >= self.deadline:
+                raise SearchAborted("time limit reached")
+            if self.cancel is not None and self.cancel.is_set():
+                raise SearchAborted("search cancelled")
+
+
+def find_mate_in_n(board: Board, color: Color, n: int, stats_dict: Optional[dict] = None,
+                   tt_size_mb: float = 16, time_limit: Optional[float] = None,
+                   node_limit: Optional[int] = None, cancel=None, search: str = NEGAMAX,
+                   workers: Optional[int] = 1, parallel: str = ROOT_SPLIT, checks_only: bool = False, book=None):
     """Find a mate in at most n moves. If no such mate exist, will return a
-    non-CHECKMATE value in the first slot."""
+    non-CHECKMATE value in the first slot.
+    If a limit is reached, returns the result of the deepest search that finished.
+    See iterative_deepening for the parameters.
+    The depth that was completed is in stats_dict["depth_completed"]
+    :param workers: number of processes to search with (None for one per CPU)
+    :param parallel: how the processes share the work when there is more than one:
+        ROOT_SPLIT to split the root moves between them (see parallel.parallel_iterative_deepening,
+        only for the NEGAMAX search), or LAZY_SMP for all of them to search the whole tree with one
+        shared transposition table (see parallel.lazy_smp_iterative_deepening)
+    :param search: NEGAMAX, MINIMAX, or DFPN for the proof-number search
+        (see dfpn.proof_number_search, which uses tt_size_mb for its proof table)
+    :param checks_only: first look for a mate where the attacker only gives check, then if there is none
+        for any mate. With NEGAMAX or DFPN, in a single process
+    :param book: book.OpeningBook whose move is searched first at the root, see iterative_deepening.
+        With NEGAMAX or MINIMAX, in a single process"""
     if stats_dict is None:
         stats_dict = {}
-    stats_dict.setdefault("nodes_explored", 0)
-    results = dls_minimax(board, (n - 1) * 2 + 1, MAX, stats_dict=stats_dict)
+    if parallel not in (ROOT_SPLIT, LAZY_SMP):
+        raise ValueError("unknown parallel search: %s" % parallel)
+    if checks_only and workers != 1:
+        raise ValueError("a search of the checks first runs in a single process")
+    if book is not None and (workers != 1 or search == DFPN):
+        raise ValueError("only the %s and %s searches in a single process use a book" % (NEGAMAX, MINIMAX))
+    if search == DFPN:
+        if workers != 1:
+            raise ValueError("the %s search runs in a single process" % DFPN)
+        from .dfpn import proof_number_search
+        score, moves, _ = proof_number_search(board, color, n, stats_dict, tt_size_mb,
+                                              time_limit=time_limit, node_limit=node_limit, cancel=cancel,
+                                              checks_only=checks_only)
+    elif workers != 1 and parallel == LAZY_SMP:
+        from .parallel import lazy_smp_iterative_deepening
+        score, moves, _ = lazy_smp_iterative_deepening(board, color, n, workers, stats_dict, tt_size_mb,
+                                                       time_limit=time_limit, node_limit=node_limit, cancel=cancel,
+                                                       search=search)
+    elif workers != 1:
+        if search != NEGAMAX:
+            raise ValueError("only the %s search can split its root moves between processes" % NEGAMAX)
+        from .parallel import parallel_iterative_deepening
+        score, moves, _ = parallel_iterative_deepening(board, color, n, workers, stats_dict, tt_size_mb,
+                                                       time_limit=time_limit, node_limit=node_limit, cancel=cancel)
+    else:
+        score, moves, _ = iterative_deepening(board, color, n, stats_dict, TranspositionTable(tt_size_mb),
+                                              time_limit=time_limit, node_limit=node_limit, cancel=cancel,
+                                              search=search, checks_only=checks_only, book=book)
     print("nodes explored=%d" % stats_dict['nodes_explored'])
-    return results
+    return (score, moves)
+
+
+def iterative_deepening(board: Board, color: Color, n: int, stats_dict: Optional[dict] = None,
+                        tt: Optional[TranspositionTable] = None, time_limit: Optional[float] = None,
+                        node_limit: Optional[int] = None, cancel=None,
+                        search: str = NEGAMAX, seed: Optional[int] = None,
+                        checks_only: bool = False, book=None) -> Tuple[int, list, int]:
+    """Search for a mate in 1, then in 2, and so on up to n moves, stopping at the first mate found.
+    Each search orders its moves using the best moves the previous ones left in the transposition table.
+    :param color: color of the player giving mate
+    :param search: NEGAMAX or MINIMAX. MINIMAX always searches for a mate by white
+    :param tt: transposition table shared by all iterations
+    :param time_limit: seconds the whole search may run for
+    :param node_limit: number of nodes the whole search may explore
+    :param cancel: anything with an is_set method, e.g. threading.Event. Set it to stop the search
+    :param seed: varies the order of quiet moves in the NEGAMAX search, see NegamaxSearch
+    :param checks_only: first look for a mate where the attacker only plays checks (NEGAMAX only, see NegamaxSearch),
+        and only if there is none search again with every move. The table is cleared in between, since the scores
+        of the checks-only search are not those of the full search.
+        stats_dict["checks_only"] tells whether the result is from the checks-only search
+    :param book: book.OpeningBook to look the position up in when color is to move. The book move is searched
+        first at the root of every depth, which only changes the order, so the mate found is the same.
+        stats_dict["book"] tells whether there was one
+    :returns: (score, moves, depth completed) where score and moves come from the deepest search that finished.
+        Depth completed is 0 if no search finished"""
+    if stats_dict is None:
+        stats_dict = {}
+    stats_dict.setdefault("nodes_explored", 0)
+    if tt is None:
+        tt = TranspositionTable()
+    if search not in (NEGAMAX, MINIMAX):
+        raise ValueError("unknown search: %s" % search)
+    if checks_only and search != NEGAMAX:
+        raise ValueError("only the %s search can search just the checks" % NEGAMAX)
+    limits = SearchLimits(time_limit, node_limit, cancel)
+    # an aborted search leaves its moves on the board, so search a copy
+    search_board = Board(board)
+    book_move = None
+    if book is not None and color == board.get_turn():
+        book_move = book.choose(board)
+        stats_dict["book"] = book_move is not None
+    for checks_phase in ([True, False] if checks_only else [False]):
+        if not checks_phase and checks_only:
+            logging.info("No mate with checks only in %d moves, searching every move", n)
+            tt.clear()
+        negamax = NegamaxSearch((n - 1) * 2 + 1, stats_dict, tt, limits, seed, checks_only=checks_phase)
+        score, moves = 0, []  # type: Tuple[int, list]
+        depth_completed = 0
+        for depth in range(1, n + 1):
+            if limits.is_exceeded():
+                break
+            if book_move is not None:
+                # the search puts the table move first at the root, and the root entry is never used to cut
+                # the search off, so this only changes the order. It replaces the best move of the last depth
+                tt.store(board.get_hash(), 0, 0, UPPER, book_move)
+            try:
+                if search == NEGAMAX:
+                    score, moves = negamax.search(search_board, color, (depth - 1) * 2 + 1)
+                else:
+                    score, moves = dls_minimax(search_board, (depth - 1) * 2 + 1, MAX,
+                                               stats_dict=stats_dict, tt=tt, limits=limits)
+            except SearchAborted as e:
+                logging.info("Search for mate in %d stopped: %s", depth, str(e))
+                break
+            depth_completed = depth
+            if score >= MATE_THRESHOLD or score <= -MATE_THRESHOLD:
+                break
+        if depth_completed < n or score >= MATE_THRESHOLD or score <= -MATE_THRESHOLD:
+            break
+    if checks_only:
+        stats_dict["checks_only"] = checks_phase
+    tt.update_stats(stats_dict)
+    stats_dict["depth_completed"] = depth_completed
+    return (to_mate_result(score), moves, depth_completed)
+
+
+def find_best_move(board: Board, color: Color, depth: int, stats_dict: Optional[dict] = None,
+                   tt_size_mb: float = 16, time_limit: Optional[float] = None,
+                   node_limit: Optional[int] = None, cancel=None, search: str = NEGAMAX,
+                   horizon: str = QUIESCENCE, book=None) -> Tuple[int, List[Move]]:
+    """Search for the best move by evaluation rather than only for a mate: 1 ply deep, then 2, up to depth plies.
+    See iterative_deepening for the other parameters
+    :param color: player to move
+    :param depth: number of plies to search
+    :param horizon: STATIC to score the positions at the depth limit with evaluate, QUIESCENCE to play out
+        the captures and promotions first with quiescence_search, so pieces left hanging are not counted
+    :param book: book.OpeningBook to play from without searching while the position is in it
+    :returns: (score for color, in centipawns or +/-CHECKMATE for a mate, principal variation)
+        from the deepest search that finished. The depth it reached is in stats_dict["depth_completed"].
+        A book move has a score of 0, stats_dict["book"] is True and the depth is 0"""
+    if stats_dict is None:
+        stats_dict = {}
+    stats_dict.setdefault("nodes_explored", 0)
+    if search not in (NEGAMAX, MINIMAX):
+        raise ValueError("unknown search: %s" % search)
+    if horizon not in HORIZONS:
+        raise ValueError("unknown horizon: %s" % horizon)
+    if book is not None and color == board.get_turn():
+        code = book.choose(board)
+        stats_dict["book"] = code is not None
+        if code is not None:
+            stats_dict["depth_completed"] = 0
+            return (0, [decode_move(board, code)])
+    tt = TranspositionTable(tt_size_mb)
+    limits = SearchLimits(time_limit, node_limit, cancel)
+    negamax = NegamaxSearch(depth, stats_dict, tt, limits, horizon=horizon)
+    search_board = Board(board)
+    score, moves = 0, []  # type: Tuple[int, list]
+    depth_completed = 0
+    for d in range(1, depth + 1):
+        if limits.is_exceeded():
+            break
+        try:
+            if search == NEGAMAX:
+                score, moves = negamax.search(search_board, color, d)
+            else:
+                # dls_minimax scores from white's point of view
+                score, moves = dls_minimax(search_board, d, (MAX if color == WHITE else MIN), stats_dict=stats_dict,
+                                           tt=tt, limits=limits, horizon=horizon)
+                if color != WHITE:
+                    score = -1 * score
+        except SearchAborted as e:
+            logging.info("Search to depth %d stopped: %s", d, str(e))
+            break
+        depth_completed = d
+        if score >= MATE_THRESHOLD or score <= -MATE_THRESHOLD:
+            break
+    tt.update_stats(stats_dict)
+    stats_dict["depth_completed"] = depth_completed
+    return (to_mate_result(score), moves)
+
+
+def _capture_order(board: Board, code: int) -> int:
+    """Most valuable victim first, then least valuable attacker, with promotions counted as captures"""
+    squares = board._board
+    if code & MOVE_EN_PASSANT:
+        victim = PIECE_VALUES[PAWN_CODE]
+    else:
+        victim = PIECE_VALUES[squares[(code >> MOVE_DEST_SHIFT) & MOVE_SQUARE_MASK] & TYPE_MASK]
+    victim += PIECE_VALUES[(code >> MOVE_PROMOTION_SHIFT) & TYPE_MASK]
+    return 10 * victim - PIECE_VALUES[squares[code & MOVE_SQUARE_MASK] & TYPE_MASK]
+
+
+def quiescence_search(board: Board, color: Color, alpha: int, beta: int, ply: int = 0,
+                      stats_dict: Optional[dict] = None, limits: Optional[SearchLimits] = None) -> int:
+    """Search only captures and promotions (every move when in check) until the position is quiet,
+    so that the evaluation at the horizon of a search doesn't miss a piece that can be taken.
+    Out of check the player to move may stand pat on the static evaluation instead of capturing,
+    and captures which can't raise the score to alpha even with DELTA_MARGIN to spare are skipped (delta pruning).
+    :param color: player to move
+    :param ply: number of moves made since the root of the search, for mate scores
+    :returns: score for color in centipawns, like evaluate"""
+    if limits is not None:
+        limits.check()
+    if stats_dict:
+        stats_dict['nodes_explored'] += 1
+
+    in_check = is_in_check(board, color)
+    if in_check:
+        # mated unless some evasion is found
+        best = -1 * (CHECKMATE - ply)
+        stand_pat = 0
+    else:
+        stand_pat = evaluate(board, color)
+        if stand_pat >= beta:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+        best = stand_pat
+
+    squares = board._board
+    opponent = get_opposite_color(color)
+    for code in sorted(gen_capture_move_codes(board, color), key=lambda code: _capture_order(board, code),
+                       reverse=True):
+        if not in_check:
+            if code & MOVE_EN_PASSANT:
+                gain = PIECE_VALUES[PAWN_CODE]
+            else:
+                gain = PIECE_VALUES[squares[(code >> MOVE_DEST_SHIFT) & MOVE_SQUARE_MASK] & TYPE_MASK]
+            promotion = (code >> MOVE_PROMOTION_SHIFT) & TYPE_MASK
+            if promotion:
+                gain += PIECE_VALUES[promotion] - PIECE_VALUES[PAWN_CODE]
+            if stand_pat + 100 * gain + DELTA_MARGIN <= alpha:
+                continue
+        undo = board.make_move(code)
+        score = -1 * quiescence_search(board, opponent, -1 * beta, -1 * alpha, ply + 1, stats_dict, limits)
+        board.unmake_move(undo)
+        if score > best:
+            best = score
+            if score > alpha:
+                alpha = score
+                if alpha >= beta:
+                    break
+    return best
+
+
+def to_mate_result(score: int) -> int:
+    """Mates found by the search score higher the faster they are.
+    Report all of them as CHECKMATE"""
+    if score >= MATE_THRESHOLD:
+        return CHECKMATE
+    elif score <= -MATE_THRESHOLD:
+        return -1 * CHECKMATE
+    return score
+
+
+def _mate_distance(score: int, ply: int) -> int:
+    """Number of moves from the current position until the mate in score, 0 if score is not a mate"""
+    if score >= MATE_THRESHOLD or score <= -MATE_THRESHOLD:
+        return CHECKMATE - abs(score) - ply
+    return 0
+
+
+def _order_moves(board: Board, color: Color, moves: Iterator[Move], tt_move: int) -> List[Move]:
+    """The best move from the transposition table goes first, then moves ordered by score_move"""
+    check_info = get_check_info(board, color)
+    if tt_move == NO_MOVE:
+        def _score_move(move):
+            return score_move(board, move, check_info)
+    else:
+        def _score_move(move):
+            return (encode_move(move) == tt_move, score_move(board, move, check_info))
+
+    return sorted(moves, key=_score_move, reverse=True)
+
+
+def _split_checks(board: Board, color: Color, moves: Iterator) -> Tuple[list, Optional[Any]]:
+    """Split moves into the ones which give check, and any one of the others (None if all moves give check)
+    :param moves: Moves or packed moves"""
+    check_info = get_check_info(board, color)
+    checks = []
+    quiet_move = None
+    for move in moves:
+        if gives_check(board, move, check_info):
+            checks.append(move)
+        elif quiet_move is None:
+            quiet_move = move
+    return checks, quiet_move
+
+
+def _decode_line(board: Board, line: List[int]) -> List[Move]:
+    """Unpack a line of packed moves starting from this position"""
+    moves = []  # type: List[Move]
+    undos = []
+    for code in line:
+        moves.append(decode_move(board, code))
+        undos.append(board.make_move(code))
+    for undo in reversed(undos):
+        board.unmake_move(undo)
+    return moves
+
+
+def _tt_line(board: Board, tt: TranspositionTable, color: Color, distance: int) -> Optional[List[int]]:
+    """Rebuild the mating line from this position by following the best moves stored in the table.
+    :param distance: number of moves until mate
+    :returns: the packed moves, None if the line does not end in mate after distance moves,
+        e.g. because entries were overwritten"""
+    line = []  # type: List[int]
+    undos = []
+    try:
+        for _ in range(distance):
+            entry = tt.probe(board._hash)
+            if entry is None:
+                return None
+            if entry[3] not in gen_legal_move_codes(board, color):
+                return None
+            line.append(entry[3])
+            undos.append(board.make_move(entry[3]))
+            color = get_opposite_color(color)
+        if not (is_in_check(board, color) and _has_no_legal_moves(board, color)):
+            return None
+        return line
+    finally:
+        for undo in reversed(undos):
+            board.unmake_move(undo)
+
+
+class NegamaxSearch:
+    """Alpha-beta search where scores are always from the point of view of the player to move,
+    so both players share one code path.
+
+    Finds the same mates as dls_minimax: a player stops at the first mate it finds for itself,
+    and a player being mated prefers the slowest mate.
+    Besides the transposition table, moves are ordered by two tables kept across searches:
+    - killer moves: the last two quiet moves which caused a cutoff at each ply
+    - history: how often each (from, to) pair caused a cutoff, weighted by depth
+    The principal variation is kept in a triangular table, where row `ply` holds the best line
+    from that ply onwards and is built by copying row `ply + 1` behind the best move."""
+
+    KILLER_SLOTS = 2
+
+    def __init__(self, max_depth: int, stats_dict: Optional[dict] = None,
+                 tt: Optional[TranspositionTable] = None, limits: Optional[SearchLimits] = None,
+                 seed: Optional[int] = None, horizon: str = MATE_ONLY, checks_only: bool = False):
+        """
+        :param max_depth: deepest search (in plies) that will be asked for
+        :param seed: if given, the history table starts with small random values from this seed,
+            so that searches with different seeds order otherwise equal quiet moves differently
+        :param horizon: how positions at the depth limit are scored, see MATE_ONLY, STATIC and QUIESCENCE.
+            Only MATE_ONLY searches just the checks on the last move
+        :param checks_only: with MATE_ONLY, the player to move at the root only plays checks
+            (see gen_check_move_codes), and a line where it stops checking scores 0 like the depth limit.
+            Its opponent still plays every legal move
+        """
+        self.max_ply = max_depth + 1
+        self.horizon = horizon
+        self.checks_only = checks_only and horizon == MATE_ONLY
+        self.stats_dict = stats_dict
+        self.tt = tt
+        self.limits = limits
+        self.killers = [[NO_MOVE] * self.KILLER_SLOTS for _ in range(self.max_ply)]
+        # indexed by the source and destination of the packed move
+        self.history = [0] * (MOVE_SQUARES_MASK + 1)
+        if seed is not None:
+            rng = random.Random(seed)
+            self.history = [rng.randrange(4) for _ in self.history]
+        # packed moves
+        self.pv = [[NO_MOVE] * self.max_ply for _ in range(self.max_ply)]  # type: List[List[int]]
+        self.pv_length = [0] * self.max_ply
+
+    def search(self, board: Board, color: Color, depth: int) -> Tuple[int, List[Move]]:
+        """
+        :param color: player to move on the board
+        :param depth: number of plies to search
+        :returns: (score for color, principal variation)"""
+        if depth >= self.max_ply:
+            raise ValueError("depth %d is deeper than the %d plies this search was set up for" %
+                             (depth, self.max_ply - 1))
+        score = self.negamax(board, color, depth, 0, -1 * CHECKMATE - 1, CHECKMATE + 1)
+        return (score, _decode_line(board, self.pv[0][:self.pv_length[0]]))
+
+    def _order_moves(self, board: Board, color: Color, moves: Iterator[int], ply: int,
+                     tt_move: int) -> List[int]:
+        """Transposition table move, then by score_move, then killer moves and finally by history"""
+        killers = self.killers[ply]
+        history = self.history
+        check_info = get_check_info(board, color)
+
+        def _score_move(code):
+            if code == tt_move:
+                return (1, 0, 0, 0)
+            killer = (self.KILLER_SLOTS - killers.index(code) if code in killers else 0)
+            return (0, score_move(board, code, check_info), killer, history[code & MOVE_SQUARES_MASK])
+
+        return sorted(moves, key=_score_move, reverse=True)
+
+    def _record_cutoff(self, code: int, ply: int, depth_remaining: int) -> None:
+        if code & MOVE_CAPTURE:
+            return
+        killers = self.killers[ply]
+        if killers[0] != code:
+            killers[1] = killers[0]
+            killers[0] = code
+        self.history[code & MOVE_SQUARES_MASK] += depth_remaining * depth_remaining
+
+    def _update_pv(self, move: int, ply: int) -> None:
+        row = self.pv[ply]
+        row[ply] = move
+        length = self.pv_length[ply + 1]
+        row[ply + 1:length] = self.pv[ply + 1][ply + 1:length]
+        self.pv_length[ply] = length
+
+    def _set_pv_line(self, line: List[int], ply: int) -> None:
+        self.pv[ply][ply:ply + len(line)] = line
+        self.pv_length[ply] = ply + len(line)
+
+    def _score_horizon(self, board: Board, color: Color, ply: int, alpha: int, beta: int) -> int:
+        if self.horizon == QUIESCENCE:
+            return quiescence_search(board, color, alpha, beta, ply, self.stats_dict, self.limits)
+        elif self.horizon == STATIC:
+            return evaluate(board, color)
+        return 0
+
+    def negamax(self, board: Board, color: Color, depth_remaining: int, ply: int, alpha: int, beta: int) -> int:
+        """
+        :param color: player to move
+        :returns: score for color. The line is left in self.pv[ply]"""
+        if self.limits is not None:
+            self.limits.check()
+        if self.stats_dict:
+            self.stats_dict['nodes_explored'] += 1
+        self.pv_length[ply] = ply
+        tt = self.tt
+
+        tt_move = NO_MOVE
+        if tt is not None:
+            entry = tt.probe(board._hash)
+            if entry is not None:
+                tt_depth, tt_score, tt_bound, tt_move = entry
+                score = score_from_tt(tt_score, ply, MATE_THRESHOLD)
+                distance = _mate_distance(score, ply)
+                # mates found by a deeper search may be too far away for this one
+                if ply > 0 and tt_depth >= depth_remaining and distance <= depth_remaining:
+                    if tt_bound != UPPER and score >= beta:
+                        return score
+                    if tt_bound != LOWER and score <= alpha:
+                        return score
+                    # stop at the first mate found for the player to move
+                    if tt_bound == EXACT or (tt_bound == LOWER and score >= MATE_THRESHOLD):
+                        if distance == 0:
+                            return score
+                        line = _tt_line(board, tt, color, distance)
+                        if line is not None:
+                            self._set_pv_line(line, ply)
+                            return score
+
+        if _has_no_legal_moves(board, color):
+            if is_in_check(board, color):
+                score = -1 * (CHECKMATE - ply)
+            else:
+                score = 0
+            if tt is not None:
+                # terminal positions have the same score at any depth
+                tt.store(board._hash, MAX_DEPTH, score_to_tt(score, ply, MATE_THRESHOLD), EXACT)
+            return score
+        elif depth_remaining == 0:
+            return self._score_horizon(board, color, ply, alpha, beta)
+
+        alpha_orig = alpha
+        best_code = NO_MOVE
+        # the attacker moves at even plies
+        checks_only = self.checks_only and ply % 2 == 0
+        if checks_only:
+            g_moves = self._order_moves(board, color, gen_check_move_codes(board, color), ply, tt_move)
+            quiet_move = None
+        elif depth_remaining == 1 and self.horizon == MATE_ONLY:
+            # on the last move only a check can mate, every other move scores 0 like the depth limit
+            checks, quiet_move = _split_checks(board, color, gen_legal_move_codes(board, color))
+            g_moves = self._order_moves(board, color, checks, ply, tt_move)
+        else:
+            g_moves = self._order_moves(board, color, gen_legal_move_codes(board, color), ply, tt_move)
+            quiet_move = None
+
+        opponent = get_opposite_color(color)
+        for g_move in g_moves:
+            undo = board.make_move(g_move)
+            score = -1 * self.negamax(board, opponent, depth_remaining - 1, ply + 1, -1 * beta, -1 * alpha)
+            board.unmake_move(undo)
+            if score > alpha:
+                alpha = score
+                best_code = g_move
+                self._update_pv(g_move, ply)
+            if alpha >= beta or alpha >= MATE_THRESHOLD:
+                self._record_cutoff(g_move, ply, depth_remaining)
+                break
+        else:
+            if quiet_move is not None and 0 > alpha:
+                alpha = 0
+                best_code = quiet_move
+                self.pv[ply][ply] = quiet_move
+                self.pv_length[ply] = ply + 1
+            elif checks_only and 0 > alpha:
+                # the moves which don't check were not generated, so there is no move to show for it
+                alpha = 0
+                self.pv_length[ply] = ply
+
+        if tt is not None:
+            if alpha <= alpha_orig:
+                bound = UPPER
+            elif alpha >= beta or alpha >= MATE_THRESHOLD:
+                # faster mates may have been skipped
+                bound = LOWER
+            else:
+                bound = EXACT
+            tt.store(board._hash, depth_remaining, score_to_tt(alpha, ply, MATE_THRESHOLD), bound, best_code)
+        return alpha
 
 
 def dls_minimax(board: Board, depth_remaining: int, turn: bool, last_move: Optional[Move] = None,
                 alpha: int =(-1 * CHECKMATE - 1), beta=(CHECKMATE + 1),
-                stats_dict: Optional[dict] = None) -> Tuple[int, list]:
+                stats_dict: Optional[dict] = None,
+                tt: Optional[TranspositionTable] = None, ply: int = 0,
+                limits: Optional[SearchLimits] = None, horizon: str = MATE_ONLY) -> Tuple[int, list]:
     """Return whether or not there exists a winning combination of moves.
     Return this combination.
-    TODO: alpha-beta this"""
+    A mate found `ply` moves from the root scores CHECKMATE - ply, so the defender prefers slower mates.
+    The attacker still stops at the first mate it finds.
+    :param tt: transposition table shared by the whole search
+    :param ply: number of moves made since the root of the search
+    :param limits: raise SearchAborted once these are reached
+    :param horizon: how positions at the depth limit are scored, see MATE_ONLY, STATIC and QUIESCENCE.
+        Scores other than mates are from white's point of view"""
 
     # color is the color of the player being mated
     color = (BLACK if turn == MIN else WHITE)
+    if limits is not None:
+        limits.check()
     if stats_dict:
         stats_dict['nodes_explored'] += 1
 
+    tt_move = NO_MOVE
+    if tt is not None:
+        entry = tt.probe(board._hash)
+        if entry is not None:
+            tt_depth, tt_score, tt_bound, tt_move = entry
+            score = score_from_tt(tt_score, ply, MATE_THRESHOLD)
+            distance = _mate_distance(score, ply)
+            # mates found by a deeper search may be too far away for this one
+            if ply > 0 and tt_depth >= depth_remaining and distance <= depth_remaining:
+                if tt_bound != UPPER and score >= beta:
+                    return (score, [last_move])
+                if tt_bound != LOWER and score <= alpha:
+                    return (score, [last_move])
+                # like below, stop at the first mate found for the side to move
+                if (tt_bound == EXACT or
+                        (tt_bound == LOWER and turn == MAX and score >= MATE_THRESHOLD) or
+                        (tt_bound == UPPER and turn == MIN and score <= -MATE_THRESHOLD)):
+                    if distance == 0:
+                        return (score, [last_move])
+                    line = _tt_line(board, tt, color, distance)
+                    if line is not None:
+                        return (score, [last_move] + _decode_line(board, line))
+
     if _has_no_legal_moves(board, color):
         if is_in_check(board, color):
             logging.info("[%d depth remaining] Reached terminal condition: %s is in checkmate", depth_remaining, color)
@@ -71,12 +683,24 @@ def dls_minimax(board: Board, depth_remaining: int, turn: bool, last_move: Optio
             for row in dump_board(board):
                 logging.info(row)
             if turn == MIN:
-                return (CHECKMATE, [last_move])
+                score = CHECKMATE - ply
             else:
-                return (-1 * CHECKMATE, [last_move])
+                score = -1 * (CHECKMATE - ply)
         else:
             logging.debug("Reached terminal condition: %s is in stalemate", color)
-            return (0, [last_move])
+            score = 0
+        if tt is not None:
+            # terminal positions have the same score at any depth
+            tt.store(board._hash, MAX_DEPTH, score_to_tt(score, ply, MATE_THRESHOLD), EXACT)
+        return (score, [last_move])
+    elif depth_remaining == 0 and horizon != MATE_ONLY:
+        if horizon == STATIC:
+            score = evaluate(board, WHITE)
+        elif turn == MAX:
+            score = quiescence_search(board, color, alpha, beta, ply, stats_dict, limits)
+        else:
+            score = -1 * quiescence_search(board, color, -1 * beta, -1 * alpha, ply, stats_dict, limits)
+        return (score, [last_move])
     elif depth_remaining == 0:
         # once we reach the max depth, just return 0 for the score
         logging.debug("Max depth reached, exit 0")
@@ -85,25 +709,33 @@ def dls_minimax(board: Board, depth_remaining: int, turn: bool, last_move: Optio
         logging.debug("[%d] Finding best move for player %s", depth_remaining, color)
         best_move = []  # type: List[Move]
         move_gen_flag = False
+        alpha_orig = alpha
 
-        def _score_move(move):
-            return score_move(board, move)
+        if depth_remaining == 1 and horizon == MATE_ONLY:
+            # on the last move only a check can mate, every other move scores 0 like the depth limit
+            g_moves, quiet_move = _split_checks(board, color, gen_all_moves(board, color))
+            move_gen_flag = quiet_move is not None
+        else:
+            # score each potential move
+            # order in order of score
+            g_moves = _order_moves(board, color, gen_all_moves(board, color), tt_move)
+            quiet_move = None
 
-        # score each potential move
-        # order in order of score
-        for g_move in sorted(gen_all_moves(board, color), key=_score_move, reverse=True):
+        for g_move in g_moves:
             move_gen_flag = True
             logging.debug("[%d] Looking at move %s",
                           depth_remaining, g_move.show(board))
-            b_new = gen_successor_from_move(board, g_move)
-            a, move = dls_minimax(b_new, depth_remaining - 1, MIN, g_move, alpha, beta, stats_dict)
+            undo = board.make_move(g_move)
+            a, move = dls_minimax(board, depth_remaining - 1, MIN, g_move, alpha, beta, stats_dict, tt, ply + 1,
+                                  limits, horizon)
+            board.unmake_move(undo)
             if a > alpha:
                 best_move = move
                 alpha = a
 
             # TODO there should be some sort of theory on why this is good
             # but for now, the idea seems solid
-            if alpha >= CHECKMATE:
+            if alpha >= MATE_THRESHOLD:
                 logging.info("[%d depth remaining] Checkmate found as MAX, not checking any more nodes", depth_remaining)
                 break
 
@@ -112,11 +744,26 @@ def dls_minimax(board: Board, depth_remaining: int, turn: bool, last_move: Optio
                 logging.debug("exceeded beta value %d with alpha %d",
                               beta, alpha)
                 break
+        else:
+            if quiet_move is not None and 0 > alpha:
+                best_move = [quiet_move]
+                alpha = 0
 
         if not move_gen_flag:
             # this should be caught by first if statement
             raise Exception("No moves generated, returning empty set")
 
+        if tt is not None:
+            if alpha <= alpha_orig:
+                bound = UPPER
+            elif alpha >= beta or alpha >= MATE_THRESHOLD:
+                # faster mates may have been skipped
+                bound = LOWER
+            else:
+                bound = EXACT
+            tt.store(board._hash, depth_remaining, score_to_tt(alpha, ply, MATE_THRESHOLD), bound,
+                     (encode_move(best_move[0]) if best_move else NO_MOVE))
+
         if last_move is not None:
             best_move.insert(0, last_move)
 
@@ -126,26 +773,25 @@ def dls_minimax(board: Board, depth_remaining: int, turn: bool, last_move: Optio
         logging.debug("[%d depth remaining] Finding best move for player %s", depth_remaining, color)
         best_move = []
         move_gen_flag = False
-
-        def _score_move(move):
-            return score_move(board, move)
+        beta_orig = beta
 
         # score each potential move
         # order in order of score
-        for g_move in sorted(gen_all_moves(board, color), key=_score_move, reverse=True):
+        for g_move in _order_moves(board, color, gen_all_moves(board, color), tt_move):
             move_gen_flag = True
             logging.debug("[%d] Looking at move %s",
                           depth_remaining, g_move.show(board))
-            b_new = gen_successor_from_move(board, g_move)
-            b, move = dls_minimax(b_new, depth_remaining - 1, MAX, g_move, alpha, beta, stats_dict)
-            if b < beta or (b == beta and len(move) > len(best_move)):
+            undo = board.make_move(g_move)
+            b, move = dls_minimax(board, depth_remaining - 1, MAX, g_move, alpha, beta, stats_dict, tt, ply + 1,
+                                  limits, horizon)
+            board.unmake_move(undo)
+            if b < beta:
                 beta = b
                 best_move = move
 
-            if beta <= -1 * CHECKMATE:
+            if beta <= -1 * MATE_THRESHOLD:
                 logging.info("[%d depth remaining] Checkmate found as MIN, not checking any more nodes", depth_remaining)
                 break
-
             if alpha >= beta:
                 logging.debug("alpha cutoff")
                 break
@@ -154,6 +800,16 @@ def dls_minimax(board: Board, depth_remaining: int, turn: bool, last_move: Optio
             # this should be caught by first if statement
             raise Exception("No moves generated, returning empty set")
 
+        if tt is not None:
+            if beta >= beta_orig:
+                bound = LOWER
+            elif beta <= alpha or beta <= -1 * MATE_THRESHOLD:
+                bound = UPPER
+            else:
+                bound = EXACT
+            tt.store(board._hash, depth_remaining, score_to_tt(beta, ply, MATE_THRESHOLD), bound,
+                     (encode_move(best_move[0]) if best_move else NO_MOVE))
+
         if last_move is not None:
             best_move.insert(0, last_move)
 
@@ -162,14 +818,36 @@ def dls_minimax(board: Board, depth_remaining: int, turn: bool, last_move: Optio
     raise Exception("should never get here - missing return statement")
 
 
-def score_move(board: Board, move: Move):
-    """Score moves which give a check higher than those which do not."""
-    moving_color = get_color(board, move.src)
-    new_board = gen_successor_from_move(board, move)
-    if is_in_check(new_board, get_opposite_color(moving_color)):
-        return CHECK
-    else:
-        return 0
+def score_move(board: Board, move, check_info: Optional[CheckInfo] = None) -> int:
+    """Key to order moves by, higher goes first. The move is not made.
+    Moves which give check go first. Then captures which don't lose material, by most valuable victim and then
+    least valuable attacker, and promotions. Then the other moves, and last captures which lose material.
+    :param move: Move, or a move packed into an int
+    :param check_info: from get_check_info for the moving color, computed if not given"""
+    code = encode_move(move)
+    squares = board._board
+    src = code & MOVE_SQUARE_MASK
+    if check_info is None:
+        check_info = get_check_info(board, get_color(board, src))
+    score = 0
+    if gives_check(board, code, check_info):
+        score += CHECK
+    promotion = (code >> MOVE_PROMOTION_SHIFT) & TYPE_MASK
+    if promotion:
+        score += PROMOTION + PIECE_VALUES[promotion]
+    if code & MOVE_CAPTURE:
+        attacker = PIECE_VALUES[squares[src] & TYPE_MASK]
+        if code & MOVE_EN_PASSANT:
+            victim = PIECE_VALUES[PAWN_CODE]
+        else:
+            victim = PIECE_VALUES[squares[(code >> MOVE_DEST_SHIFT) & MOVE_SQUARE_MASK] & TYPE_MASK]
+        # capturing a piece worth at least as much as the attacker can't lose material
+        if victim >= attacker or static_exchange(board, code) >= 0:
+            score += WINNING_CAPTURE
+        else:
+            score += LOSING_CAPTURE
+        score += 10 * victim - attacker
+    return score
 
 
 def score_piece(piece: PieceName, location):
@@ -177,12 +855,19 @@ def score_piece(piece: PieceName, location):
 
 
 def score_board(board):
-    """My heuristic for determining value of a position."""
-
-    white_pts = sum([score_piece(piece, location)
-                     for location, piece in get_piece_list(board, WHITE)])
-
-    black_pts = sum([score_piece(piece, location)
-                     for location, piece in get_piece_list(board, "B")])
-
-    return white_pts - black_pts
+    """My heuristic for determining value of a position: white's material minus black's, in pawns.
+    The board keeps the material up to date as pieces move, so this costs nothing"""
+    return board.get_material(WHITE) - board.get_material(BLACK)
+
+
+def evaluate(board: Board, color: Color) -> int:
+    """Score of the position for the given color in centipawns: material and piece-square bonuses,
+    blended from the middlegame to the endgame values by the game phase.
+    Every term is kept up to date by the board, see core/evaluation.py"""
+    material, middlegame, endgame, phase = board.get_evaluation()
+    phase = min(phase, MAX_PHASE)
+    # worked out for white and negated for black, so that rounding is the same for both
+    score = (100 * (material[WHITE] - material[BLACK]) +
+             ((middlegame[WHITE] - middlegame[BLACK]) * phase +
+              (endgame[WHITE] - endgame[BLACK]) * (MAX_PHASE - phase)) // MAX_PHASE)
+    return (score if color == WHITE else -1 * score)
@@ -0,0 +1,302 @@
+"""
+Parallel mate search.
+
+parallel_iterative_deepening splits the moves at the root across a pool of processes.
+Each depth of the iterative deepening searches the first root move (the eldest brother) on its own,
+so the others start with its score as their bound, and then the remaining root moves in parallel.
+The best root score so far is shared between the workers, and all of them stop as soon as one proves a mate.
+
+lazy_smp_iterative_deepening runs the whole search in each process, with one transposition table
+in shared memory.
+"""
+
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import List, Optional, Tuple
+
+from .core.board import Board, Color
+from .core.piece_movement_rules import gen_legal_move_codes, get_check_info, gives_check, is_in_check
+from .core.utils import get_opposite_color
+from .engine import (CHECKMATE, LAZY_SMP, MATE_THRESHOLD, NEGAMAX, ROOT_SPLIT, NegamaxSearch, SearchAborted,
+                     SearchLimits, _decode_line, iterative_deepening, score_move, to_mate_result)
+from .transposition import SharedTranspositionTable, TranspositionTable
+
+# how often (in seconds) the main process looks at the time limit and the cancel flag while waiting
+POLL_INTERVAL = 0.05
+
+# state of a worker process, see _init_worker
+_worker_search = None  # type: Optional[NegamaxSearch]
+_worker_alpha = None
+_worker_stop = None
+
+
+def _init_worker(max_depth: int, tt_size_mb: float, node_limit: Optional[int], alpha, stop) -> None:
+    global _worker_search, _worker_alpha, _worker_stop
+    # the transposition table, killers and history are kept from one root move to the next
+    _worker_search = NegamaxSearch(max_depth, {"nodes_explored": 0}, TranspositionTable(tt_size_mb),
+                                   SearchLimits(node_limit=node_limit, cancel=stop))
+    _worker_alpha = alpha
+    _worker_stop = stop
+
+
+def _search_root_move(board: Board, color: Color, move: int, depth: int) -> Tuple[Optional[int], List[int], int, int]:
+    """Search the position after the root move.
+    :returns: (score for color or None if the search stopped, line starting with the move, nodes, worker pid)"""
+    search = _worker_search
+    stats = {"nodes_explored": 0}
+    if _worker_stop.is_set():
+        return (None, [], 0, os.getpid())
+    search.stats_dict = stats
+    alpha = _worker_alpha.value
+    board.make_move(move)
+    try:
+        score = -1 * search.negamax(board, get_opposite_color(color), depth - 1, 1, -1 * CHECKMATE - 1, -1 * alpha)
+    except SearchAborted:
+        return (None, [], stats["nodes_explored"], os.getpid())
+    if score >= MATE_THRESHOLD:
+        _worker_stop.set()
+    with _worker_alpha.get_lock():
+        if score > _worker_alpha.value:
+            _worker_alpha.value = score
+    line = [move] + search.pv[1][1:search.pv_length[1]]
+    return (score, line, stats["nodes_explored"], os.getpid())
+
+
+class _RootSplit:
+    """Searches the root moves of one position at increasing depths on a pool of processes"""
+
+    def __init__(self, executor: ProcessPoolExecutor, alpha, stop, deadline: Optional[float], cancel):
+        self.executor = executor
+        self.alpha = alpha
+        self.stop = stop
+        self.deadline = deadline
+        self.cancel = cancel
+        # nodes explored by each worker, by pid
+        self.worker_nodes = {}  # type: dict
+
+    def _limit_reached(self) -> bool:
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return True
+        return self.cancel is not None and self.cancel.is_set()
+
+    def _collect(self, futures: List[Future]) -> Tuple[List[Tuple[int, List[int]]], bool]:
+        """Wait for the searches, stopping them once a mate is found or a limit is reached.
+        :returns: ((score, line) of each finished search, whether all of them finished)"""
+        results = []
+        complete = True
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.cancelled():
+                    complete = False
+                    continue
+                score, line, nodes, pid = future.result()
+                self.worker_nodes[pid] = self.worker_nodes.get(pid, 0) + nodes
+                if score is None:
+                    complete = False
+                    continue
+                results.append((score, line))
+                if score >= MATE_THRESHOLD:
+                    self.stop.set()
+            if not self.stop.is_set() and self._limit_reached():
+                self.stop.set()
+            if self.stop.is_set():
+                for future in pending:
+                    future.cancel()
+        return results, complete
+
+    def search(self, board: Board, color: Color, moves: List[int], depth: int) -> Tuple[Optional[int], List[int]]:
+        """Search the root moves, the first one on its own and then the others in parallel.
+        :returns: (best score for color, its line), score is None if the search was stopped without a mate"""
+        self.stop.clear()
+        self.alpha.value = -1 * CHECKMATE - 1
+        results, complete = self._collect([self.executor.submit(_search_root_move, board, color, moves[0], depth)])
+        if complete and results[0][0] < MATE_THRESHOLD:
+            more, complete = self._collect([self.executor.submit(_search_root_move, board, color, move, depth)
+                                            for move in moves[1:]])
+            results.extend(more)
+        mate = [result for result in results if result[0] >= MATE_THRESHOLD]
+        if mate:
+            return mate[0]
+        if not complete:
+            return (None, [])
+        return max(results, key=lambda result: result[0])
+
+
+def parallel_iterative_deepening(board: Board, color: Color, n: int, workers: Optional[int] = None,
+                                 stats_dict: Optional[dict] = None, tt_size_mb: float = 16,
+                                 time_limit: Optional[float] = None, node_limit: Optional[int] = None,
+                                 cancel=None) -> Tuple[int, list, int]:
+    """Same as engine.iterative_deepening with the negamax search, with the root moves split across processes.
+    :param workers: number of processes, by default one per CPU
+    :param tt_size_mb: size of the transposition table of each process
+    :param node_limit: number of nodes each process may explore
+    :returns: (score, moves, depth completed). Besides the usual statistics, stats_dict gets the nodes explored
+        by each worker ("worker_nodes") and the time taken ("search_time")"""
+    if stats_dict is None:
+        stats_dict = {}
+    stats_dict.setdefault("nodes_explored", 0)
+    start = time.monotonic()
+    score, moves = 0, []  # type: Tuple[int, list]
+    depth_completed = 0
+    root_moves = list(gen_legal_move_codes(board, color))
+    if not root_moves:
+        # like the serial search, being mated ends the search at once and a stalemate is searched to every depth
+        mated = is_in_check(board, color)
+        stats_dict["worker_nodes"] = []
+        stats_dict["search_time"] = time.monotonic() - start
+        stats_dict["depth_completed"] = (1 if mated else n)
+        return ((-1 * CHECKMATE if mated else 0), [], stats_dict["depth_completed"])
+
+    check_info = get_check_info(board, color)
+    root_moves.sort(key=lambda move: score_move(board, move, check_info), reverse=True)
+    checks = [move for move in root_moves if gives_check(board, move, check_info)]
+    quiet_move = next((move for move in root_moves if not gives_check(board, move, check_info)), None)
+
+    max_depth = (n - 1) * 2 + 1
+    alpha = multiprocessing.Value("i", 0)
+    stop = multiprocessing.Event()
+    deadline = (None if time_limit is None else start + time_limit)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(max_depth, tt_size_mb, node_limit, alpha, stop)) as executor:
+        root_split = _RootSplit(executor, alpha, stop, deadline, cancel)
+        for depth in range(1, n + 1):
+            if root_split._limit_reached():
+                break
+            plies = (depth - 1) * 2 + 1
+            if plies == 1:
+                # like the serial search, only a check can mate on the last move and any other move scores 0
+                if not checks:
+                    depth_score, line = 0, [quiet_move]
+                else:
+                    depth_score, line = root_split.search(board, color, checks, plies)
+                    if depth_score is not None and depth_score < 0 and quiet_move is not None:
+                        depth_score, line = 0, [quiet_move]
+            else:
+                depth_score, line = root_split.search(board, color, root_moves, plies)
+            if depth_score is None:
+                break
+            score, moves = depth_score, _decode_line(board, line)
+            depth_completed = depth
+            # the root moves that did best at this depth go first at the next one
+            if line:
+                root_moves.remove(line[0])
+                root_moves.insert(0, line[0])
+            if score >= MATE_THRESHOLD or score <= -MATE_THRESHOLD:
+                break
+
+    worker_nodes = [root_split.worker_nodes[pid] for pid in sorted(root_split.worker_nodes)]
+    stats_dict["nodes_explored"] += sum(worker_nodes)
+    stats_dict["worker_nodes"] = worker_nodes
+    stats_dict["search_time"] = time.monotonic() - start
+    stats_dict["depth_completed"] = depth_completed
+    return (to_mate_result(score), moves, depth_completed)
+
+
+def run_speedup(fen: str, n: int, workers: Optional[int] = None, tt_size_mb: float = 16,
+                parallel: str = ROOT_SPLIT) -> float:
+    """Find the mate in n with the serial and the parallel search, and print the time, nodes and speedup.
+    :param parallel: ROOT_SPLIT or LAZY_SMP
+    :returns: the speedup, serial time over parallel time"""
+    from .core.board import fen_to_board
+
+    board = fen_to_board(fen)
+    color = board.get_turn()
+    serial_stats = {}  # type: dict
+    start = time.monotonic()
+    serial_score, serial_moves, _ = iterative_deepening(board, color, n, serial_stats, TranspositionTable(tt_size_mb))
+    serial_time = time.monotonic() - start
+    parallel_stats = {}  # type: dict
+    if parallel == LAZY_SMP:
+        score, moves, _ = lazy_smp_iterative_deepening(board, color, n, workers, parallel_stats, tt_size_mb)
+    else:
+        score, moves, _ = parallel_iterative_deepening(board, color, n, workers, parallel_stats, tt_size_mb)
+    parallel_time = parallel_stats["search_time"]
+
+    print("serial:   score %d in %d moves, %d nodes in %.2fs" % (
+        serial_score, len(serial_moves), serial_stats["nodes_explored"], serial_time))
+    print("%-9s score %d in %d moves, %d nodes in %.2fs" % (
+        parallel + ":", score, len(moves), parallel_stats["nodes_explored"], parallel_time))
+    for i, nodes in enumerate(parallel_stats["worker_nodes"]):
+        print("  worker %d: %d nodes" % (i, nodes))
+    speedup = serial_time / max(parallel_time, 1e-9)
+    print("speedup: %.2fx" % speedup)
+    return speedup
+
+
+# state of a lazy SMP worker process, see _init_lazy_smp_worker
+_worker_table = None  # type: Optional[SharedTranspositionTable]
+
+
+def _init_lazy_smp_worker(table: SharedTranspositionTable, stop) -> None:
+    global _worker_table, _worker_stop
+    _worker_table = table
+    _worker_stop = stop
+
+
+def _lazy_smp_task(board: Board, color: Color, n: int, seed: Optional[int], search: str,
+                   time_limit: Optional[float], node_limit: Optional[int]) -> Tuple[int, list, int, dict, int]:
+    """Run the whole iterative deepening search with the shared table.
+    :returns: (score, moves, depth completed, stats, worker pid)"""
+    stats = {}  # type: dict
+    score, moves, depth_completed = iterative_deepening(board, color, n, stats, _worker_table,
+                                                        time_limit=time_limit, node_limit=node_limit,
+                                                        cancel=_worker_stop, search=search, seed=seed)
+    if not _worker_stop.is_set() and (depth_completed == n or score == CHECKMATE or score == -1 * CHECKMATE):
+        # this search is over, so the others can stop
+        _worker_stop.set()
+    return (score, moves, depth_completed, stats, os.getpid())
+
+
+def lazy_smp_iterative_deepening(board: Board, color: Color, n: int, workers: Optional[int] = None,
+                                 stats_dict: Optional[dict] = None, tt_size_mb: float = 16,
+                                 time_limit: Optional[float] = None, node_limit: Optional[int] = None,
+                                 cancel=None, search: str = NEGAMAX) -> Tuple[int, list, int]:
+    """Same as engine.iterative_deepening, run by several processes at once on the whole tree ("lazy SMP").
+    They share one transposition table in shared memory, so each uses what the others found, and each orders
+    quiet moves slightly differently (see NegamaxSearch) so they don't all search the same moves at the same time.
+    The result is the one of the first process to finish, and the others are then stopped.
+    :param workers: number of processes, by default one per CPU
+    :param tt_size_mb: size of the shared transposition table
+    :param node_limit: number of nodes each process may explore
+    :returns: (score, moves, depth completed). Besides the usual statistics, stats_dict gets the nodes explored
+        by each worker ("worker_nodes") and the time taken ("search_time")"""
+    if stats_dict is None:
+        stats_dict = {}
+    stats_dict.setdefault("nodes_explored", 0)
+    if workers is None:
+        workers = (os.cpu_count() or 1)
+    start = time.monotonic()
+    table = SharedTranspositionTable(tt_size_mb)
+    stop = multiprocessing.Event()
+    results = []
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_lazy_smp_worker,
+                                 initargs=(table, stop)) as executor:
+            # the first worker keeps the usual move order
+            pending = {executor.submit(_lazy_smp_task, board, color, n, (None if i == 0 else i), search,
+                                       time_limit, node_limit)
+                       for i in range(workers)}
+            while pending:
+                done, pending = wait(pending, timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                results.extend(future.result() for future in done)
+                if cancel is not None and cancel.is_set():
+                    stop.set()
+    finally:
+        table.close()
+        table.unlink()
+
+    # a finished search wins, then the deepest one, then the one that finished first
+    score, moves, depth_completed, _, _ = max(
+        results, key=lambda result: (result[0] == CHECKMATE or result[0] == -1 * CHECKMATE, result[2]))
+    worker_nodes = [result[3].get("nodes_explored", 0) for result in sorted(results, key=lambda result: result[4])]
+    stats_dict["nodes_explored"] += sum(worker_nodes)
+    for key in ["tt_hits", "tt_misses", "tt_stores", "tt_collisions"]:
+        stats_dict[key] = sum(result[3].get(key, 0) for result in results)
+    stats_dict["worker_nodes"] = worker_nodes
+    stats_dict["search_time"] = time.monotonic() - start
+    stats_dict["depth_completed"] = depth_completed
+    return (score, moves, depth_completed)
@@ -0,0 +1,213 @@
+"""
+Perft: count the leaf nodes of the full move tree to a fixed depth.
+
+The counts for the standard positions are known, so this checks the move generator
+(castling, en-passant, promotions, pins and checks), and timing it measures its speed.
+See https://www.chessprogramming.org/Perft_Results
+"""
+
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from .core.board import Board, Color, fen_to_board
+from .core.move import Move
+from .core.piece_movement_rules import gen_legal_move_codes
+from .core.utils import get_opposite_color
+from .engine import gen_all_moves
+
+
+class PerftPosition(NamedTuple):
+    name: str
+    fen: str
+    # known number of leaf nodes, by depth
+    counts: Dict[int, int]
+
+
+PERFT_POSITIONS = [
+    PerftPosition("start", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+                  {1: 20, 2: 400, 3: 8902, 4: 197281, 5: 4865609, 6: 119060324}),
+    PerftPosition("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+                  {1: 48, 2: 2039, 3: 97862, 4: 4085603, 5: 193690690}),
+    PerftPosition("position 3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+                  {1: 14, 2: 191, 3: 2812, 4: 43238, 5: 674624, 6: 11030083}),
+    PerftPosition("position 4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+                  {1: 6, 2: 264, 3: 9467, 4: 422333, 5: 15833292}),
+    PerftPosition("position 5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+                  {1: 44, 2: 1486, 3: 62379, 4: 2103487, 5: 89941194}),
+    PerftPosition("position 6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+                  {1: 46, 2: 2079, 3: 89890, 4: 3894594, 5: 164075551}),
+]
+
+
+class PerftTable:
+    """Bounded cache of subtree counts, keyed by the hash of the position and the depth.
+    The same subtree is reached through many move orders, so its count only has to be found once.
+    There is one entry per slot, and a new entry always replaces the old one"""
+
+    # bytes used by one entry: key (8), depth (1), count (8)
+    ENTRY_SIZE = 17
+
+    def __init__(self, size_mb: float = 64):
+        size = 1
+        while size * 2 * self.ENTRY_SIZE <= size_mb * 1024 * 1024:
+            size *= 2
+        self._mask = size - 1
+        self._keys = array("Q", bytes(8 * size))
+        self._depths = array("b", bytes(size))
+        self._counts = array("Q", bytes(8 * size))
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def get(self, key: int, depth: int) -> int:
+        """:returns: the count stored for the position and depth, or -1"""
+        slot = (key + depth) & self._mask
+        if self._keys[slot] == key and self._depths[slot] == depth:
+            self.hits += 1
+            return self._counts[slot]
+        self.misses += 1
+        return -1
+
+    def put(self, key: int, depth: int, count: int) -> None:
+        slot = (key + depth) & self._mask
+        self._keys[slot] = key
+        self._depths[slot] = depth
+        self._counts[slot] = count
+
+
+def perft(board: Board, depth: int, color: Optional[Color] = None, table: Optional[PerftTable] = None) -> int:
+    """Count the positions reached after exactly depth moves.
+    :param color: player to move, by default the one to move on the board
+    :param table: cache of subtree counts to read from and fill"""
+    if color is None:
+        color = board.get_turn()
+    if depth == 0:
+        return 1
+    if depth == 1:
+        # no need to make the last moves, only count them
+        return sum(1 for _ in gen_legal_move_codes(board, color))
+    if table is not None:
+        nodes = table.get(board._hash, depth)
+        if nodes >= 0:
+            return nodes
+    opp_color = get_opposite_color(color)
+    nodes = 0
+    for move in list(gen_legal_move_codes(board, color)):
+        undo = board.make_move(move)
+        nodes += perft(board, depth - 1, opp_color, table)
+        board.unmake_move(undo)
+    if table is not None:
+        table.put(board._hash, depth, nodes)
+    return nodes
+
+
+def divide(board: Board, depth: int, color: Optional[Color] = None,
+           table: Optional[PerftTable] = None) -> List[Tuple[Move, int]]:
+    """Perft split by the first move.
+    :returns: (move, number of positions after depth moves starting with that move)"""
+    if color is None:
+        color = board.get_turn()
+    opp_color = get_opposite_color(color)
+    result = []
+    for move in list(gen_all_moves(board, color)):
+        undo = board.make_move(move)
+        result.append((move, perft(board, depth - 1, opp_color, table)))
+        board.unmake_move(undo)
+    return result
+
+
+# cache used by the subtrees counted in a worker process, see parallel_divide
+_worker_table = None  # type: Optional[PerftTable]
+
+
+def _init_worker(table_mb: float) -> None:
+    global _worker_table
+    _worker_table = (PerftTable(table_mb) if table_mb > 0 else None)
+
+
+def _perft_task(board: Board, path: List[Move], depth: int) -> int:
+    for move in path:
+        board.make_move(move)
+    return perft(board, depth, table=_worker_table)
+
+
+def parallel_divide(board: Board, depth: int, workers: Optional[int] = None, table_mb: float = 64,
+                    split_ply: int = 1) -> List[Tuple[Move, int]]:
+    """Same as divide, with the subtrees counted by a pool of processes.
+    :param workers: number of processes, by default one per CPU
+    :param table_mb: size of the cache of subtree counts in each process, 0 for none
+    :param split_ply: 1 to give each process the subtree after a first move,
+        2 to split further by second move, which balances the work better when there are few first moves"""
+    color = board.get_turn()
+    root_moves = list(gen_all_moves(board, color))
+    if depth <= split_ply:
+        return divide(board, depth, color)
+
+    # (index of the first move, moves to make, depth left after them)
+    tasks = []  # type: List[Tuple[int, List[Move], int]]
+    for i, move in enumerate(root_moves):
+        if split_ply == 1:
+            tasks.append((i, [move], depth - 1))
+        else:
+            undo = board.make_move(move)
+            for reply in list(gen_all_moves(board, get_opposite_color(color))):
+                tasks.append((i, [move, reply], depth - 2))
+            board.unmake_move(undo)
+
+    counts = [0] * len(root_moves)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(table_mb,)) as executor:
+        futures = [(i, executor.submit(_perft_task, board, path, task_depth)) for i, path, task_depth in tasks]
+        for i, future in futures:
+            counts[i] += future.result()
+    return list(zip(root_moves, counts))
+
+
+def run_perft(fen: str, depth: int, show_divide: bool = False, table_mb: float = 0,
+              workers: int = 1, split_ply: int = 1) -> int:
+    """Print the perft count of the position (and the divide if asked for) with the speed
+    :param table_mb: size of the cache of subtree counts, 0 for none
+    :param workers: number of processes to count with"""
+    board = fen_to_board(fen)
+    table = (PerftTable(table_mb) if table_mb > 0 else None)
+    start = time.perf_counter()
+    if workers > 1:
+        result = parallel_divide(board, depth, workers, table_mb, split_ply)
+    elif show_divide:
+        result = divide(board, depth, table=table)
+    else:
+        result = None
+    if result is not None:
+        nodes = 0
+        for move, count in result:
+            if show_divide:
+                print("%s: %d" % (move.show(board), count))
+            nodes += count
+    else:
+        nodes = perft(board, depth, table=table)
+    elapsed = time.perf_counter() - start
+    print("depth %d: %d nodes in %.2fs (%d nps)" % (depth, nodes, elapsed, nodes / max(elapsed, 1e-9)))
+    return nodes
+
+
+def run_suite(max_depth: int = 3) -> bool:
+    """Run perft on the reference positions up to max_depth and compare to the known counts.
+    :returns: True iff all counts match"""
+    ok = True
+    for position in PERFT_POSITIONS:
+        board = fen_to_board(position.fen)
+        for depth in sorted(position.counts):
+            if depth > max_depth:
+                break
+            start = time.perf_counter()
+            nodes = perft(board, depth)
+            elapsed = time.perf_counter() - start
+            expected = position.counts[depth]
+            status = ("ok" if nodes == expected else "FAIL (expected %d)" % expected)
+            print("%-12s depth %d: %10d nodes in %7.2fs (%7d nps) %s" % (
+                position.name, depth, nodes, elapsed, nodes / max(elapsed, 1e-9), status))
+            ok = ok and nodes == expected
+    return ok
@@ -0,0 +1,204 @@
+"""
+Streaming PGN reader and game replayer.
+
+Games are read one at a time from any iterable of lines (e.g. an open file), so files of any size can be read
+without loading them whole. Moves in standard algebraic notation (SAN) are resolved against the legal moves
+of the position they are played in, and replay makes them on a Board.
+Comments, variations and numeric annotation glyphs are skipped.
+See http://www.saremba.de/chessgml/standards/pgn/pgn-complete.htm
+"""
+
+import os
+import re
+import time
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from .core.board import (BISHOP_CODE, KING_CODE, KNIGHT_CODE, MOVE_CASTLE, MOVE_DEST_SHIFT, MOVE_PROMOTION_SHIFT,
+                         MOVE_SQUARE_MASK, PAWN_CODE, QUEEN_CODE, ROOK_CODE, TYPE_MASK, Board, fen_to_board,
+                         index_to_sq, sq_to_index)
+from .core.move import Move, decode_move
+from .core.piece_movement_rules import gen_legal_move_codes
+
+# tokens of the movetext
+RESULTS = frozenset(["1-0", "0-1", "1/2-1/2", "*"])
+
+_TAG = re.compile(r'^\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]\s*$')
+# everything that can appear in movetext, in the order it is tried.
+# Castling goes before move numbers, so that 0-0 is not read as the number 0
+_TOKEN = re.compile(r"""
+    (?P<comment>\{[^}]*\}?)
+    | (?P<line_comment>;.*)
+    | (?P<open>\()
+    | (?P<close>\))
+    | (?P<nag>\$\d+)
+    | (?P<result>1-0|0-1|1/2-1/2|\*)
+    | (?P<castle>[O0]-[O0](?:-[O0])?[+#!?]*)
+    | (?P<number>\d+\.*)
+    | (?P<san>[a-hNBRQKO0x1-8=+#!?-]+)
+    | (?P<other>\S)
+""", re.VERBOSE)
+_SAN = re.compile(r"^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$")
+
+PIECE_LETTERS = {"N": KNIGHT_CODE, "B": BISHOP_CODE, "R": ROOK_CODE, "Q": QUEEN_CODE, "K": KING_CODE}
+
+
+class PgnError(Exception):
+    pass
+
+
+class PgnGame(NamedTuple):
+    # tag pairs, e.g. {"White": ..., "Black": ..., "Result": ...}
+    headers: Dict[str, str]
+    # moves of the main line in SAN, without check and annotation marks
+    moves: List[str]
+    # result at the end of the movetext
+    result: str
+
+
+def read_games(lines: Iterable[str]) -> Iterator[PgnGame]:
+    """Read the games one at a time.
+    :param lines: e.g. an open PGN file"""
+    headers = {}  # type: Dict[str, str]
+    moves = []  # type: List[str]
+    # nesting of the variation being skipped, 0 in the main line
+    depth = 0
+    in_comment = False
+    for line in lines:
+        if in_comment:
+            end = line.find("}")
+            if end == -1:
+                continue
+            line = line[end + 1:]
+            in_comment = False
+        elif line.startswith("%"):
+            # escaped line
+            continue
+        elif line.startswith("["):
+            match = _TAG.match(line)
+            if match:
+                if moves:
+                    # a game without a result at its end
+                    yield PgnGame(headers, moves, headers.get("Result", "*"))
+                    headers, moves, depth = {}, [], 0
+                headers[match.group(1)] = match.group(2).replace('\\"', '"').replace("\\\\", "\\")
+                continue
+
+        for token in _TOKEN.finditer(line):
+            kind = token.lastgroup
+            if kind == "san" or kind == "castle":
+                if depth == 0:
+                    moves.append(token.group().rstrip("+#!?"))
+            elif kind == "comment":
+                in_comment = not token.group().endswith("}")
+            elif kind == "open":
+                depth += 1
+            elif kind == "close":
+                depth = max(0, depth - 1)
+            elif kind == "result" and depth == 0:
+                yield PgnGame(headers, moves, token.group())
+                headers, moves = {}, []
+            elif kind == "other":
+                raise PgnError("unexpected %r in movetext: %s" % (token.group(), line.strip()))
+    if moves or headers:
+        yield PgnGame(headers, moves, headers.get("Result", "*"))
+
+
+def parse_san(board: Board, san: str) -> int:
+    """Find the legal move of the player to move described by the SAN, packed into an int.
+    :raises PgnError: if no legal move or more than one matches"""
+    san = san.rstrip("+#!?")
+    color = board.get_turn()
+    if san in ("O-O", "0-0", "O-O-O", "0-0-0"):
+        kingside = len(san) == 3
+        for code in gen_legal_move_codes(board, color):
+            if code & MOVE_CASTLE and ((code >> MOVE_DEST_SHIFT) & MOVE_SQUARE_MASK >
+                                       code & MOVE_SQUARE_MASK) == kingside:
+                return code
+        raise PgnError("illegal castling: %s" % san)
+
+    match = _SAN.match(san)
+    if match is None:
+        raise PgnError("not a move: %s" % san)
+    piece, from_file, from_rank, dest, promotion = match.groups()
+    piece_type = (PIECE_LETTERS[piece] if piece else PAWN_CODE)
+    dest_index = sq_to_index(dest)
+    promotion_type = (PIECE_LETTERS[promotion] if promotion else 0)
+    squares = board._board
+    found = 0
+    for code in gen_legal_move_codes(board, color):
+        src = code & MOVE_SQUARE_MASK
+        if ((code >> MOVE_DEST_SHIFT) & MOVE_SQUARE_MASK != dest_index or
+                squares[src] & TYPE_MASK != piece_type or
+                (code >> MOVE_PROMOTION_SHIFT) & TYPE_MASK != promotion_type or
+                code & MOVE_CASTLE):
+            continue
+        sq = index_to_sq(src)
+        if (from_file and sq[0] != from_file) or (from_rank and sq[1] != from_rank):
+            continue
+        if found:
+            raise PgnError("ambiguous move: %s" % san)
+        found = code
+    if not found:
+        raise PgnError("illegal move: %s" % san)
+    return found
+
+
+def start_board(headers: Dict[str, str]) -> Board:
+    """Starting position of a game, from its FEN tag if it has one"""
+    if "FEN" in headers:
+        return fen_to_board(headers["FEN"])
+    return Board()
+
+
+def replay(game: PgnGame, board: Optional[Board] = None) -> Iterator[Tuple[Board, Move]]:
+    """Play the moves of the game on a board.
+    :param board: board to play on, by default the start position of the game
+    :returns: (board after the move, move) for each move. The board is the same object each time,
+        so copy it to keep a position"""
+    if board is None:
+        board = start_board(game.headers)
+    for ply, san in enumerate(game.moves):
+        try:
+            code = parse_san(board, san)
+        except PgnError as e:
+            raise PgnError("%s at ply %d of %s - %s" % (
+                str(e), ply + 1, game.headers.get("White", "?"), game.headers.get("Black", "?")))
+        move = decode_move(board, code)
+        board.make_move(code)
+        yield board, move
+
+
+def pgn_paths(paths: Iterable[str]) -> Iterator[str]:
+    """The given PGN files, and the .pgn files anywhere under the given directories"""
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.endswith(".pgn"):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+
+def run_replay(paths: Iterable[str], throughput: bool = False) -> Tuple[int, int]:
+    """Replay every game in the files, printing each game, or with throughput only the totals and the speed.
+    :returns: (number of games, number of plies)"""
+    games = 0
+    plies = 0
+    start = time.perf_counter()
+    for path in pgn_paths(paths):
+        with open(path) as fp:
+            for game in read_games(fp):
+                game_plies = 0
+                for _ in replay(game):
+                    game_plies += 1
+                games += 1
+                plies += game_plies
+                if not throughput:
+                    print("%s: %s - %s %s (%d plies)" % (path, game.headers.get("White", "?"),
+                                                         game.headers.get("Black", "?"), game.result, game_plies))
+    elapsed = time.perf_counter() - start
+    print("%d games, %d plies in %.2fs (%.1f games/s, %d plies/s)" % (
+        games, plies, elapsed, games / max(elapsed, 1e-9), plies / max(elapsed, 1e-9)))
+    return games, plies
@@ -0,0 +1,217 @@
+"""
+Batch mate-puzzle solver.
+
+Reads one position per line, as FEN or EPD, and looks for the mate each one asks for.
+The input is read lazily and only a bounded number of positions are in flight at once,
+so memory stays flat however long the input is. Results come out as JSON lines in input order.
+
+Recognised lines:
+- EPD with a "dm" (direct mate) opcode, e.g. `r5rk/5p1p/5R2/4B3/8/8/7P/7K w - - dm 3; id "puzzle 1";`
+- FEN with an optional "mate in N" or "#N" annotation after it, e.g. `r5rk/5p1p/5R2/4B3/8/8/7P/7K w - - 0 1 mate in 3`
+Blank lines and lines starting with "#" or "//" are skipped.
+"""
+
+import json
+import re
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import IO, Dict, Iterable, Iterator, NamedTuple, Optional, Tuple
+
+from .book import OpeningBook
+from .core.board import fen_to_board
+from .engine import CHECKMATE, iterative_deepening
+from .transposition import TranspositionTable
+
+# result statuses
+SOLVED = "solved"
+UNSOLVED = "unsolved"
+TIMEOUT = "timeout"
+ERROR = "error"
+
+_FEN_BOARD = re.compile(r"^[1-8pnbrqkPNBRQK]+(/[1-8pnbrqkPNBRQK]+){7}$")
+_MATE_ANNOTATION = re.compile(r"(?:\bdm\s+|\bmate\s+in\s+|#)(\d+)", re.IGNORECASE)
+_EPD_ID = re.compile(r"\bid\s+\"([^\"]*)\"")
+
+
+class Puzzle(NamedTuple):
+    # line number in the input, from 1
+    line: int
+    # id from the EPD "id" opcode, or the line number
+    id: str
+    fen: str
+    # number of moves to mate in
+    n: int
+
+
+def parse_puzzle(text: str, line: int, default_n: int) -> Optional[Puzzle]:
+    """Read a position from a line of FEN or EPD.
+    :param default_n: number of moves to mate in when the line doesn't say
+    :returns: None for blank lines and comments
+    :raises ValueError: if the line is not a position"""
+    text = text.strip()
+    if not text or text.startswith("#") or text.startswith("//"):
+        return None
+    fields = text.split()
+    if not _FEN_BOARD.match(fields[0]):
+        raise ValueError("line %d is not a FEN or EPD position: %s" % (line, text))
+    # board, side to move, castling, en passant and for FEN the two move counters
+    position = [fields[0]]
+    for field in fields[1:4]:
+        if field.endswith(";") or not re.match(r"^([wb]|-|[KQkq]+|[a-h][36])$", field):
+            break
+        position.append(field)
+    rest = " ".join(fields[len(position):])
+    match = _MATE_ANNOTATION.search(rest)
+    n = (int(match.group(1)) if match else default_n)
+    match = _EPD_ID.search(rest)
+    puzzle_id = (match.group(1) if match else str(line))
+    return Puzzle(line, puzzle_id, " ".join(position), n)
+
+
+def read_puzzles(lines: Iterable[str], default_n: int) -> Iterator[Tuple[int, str, Optional[Puzzle]]]:
+    """Parse the lines one at a time.
+    :returns: (line number, line, puzzle or None if the line is not a position) for each line that is not skipped"""
+    for i, text in enumerate(lines, start=1):
+        try:
+            puzzle = parse_puzzle(text, i, default_n)
+        except ValueError:
+            yield (i, text.strip(), None)
+            continue
+        if puzzle is not None:
+            yield (i, text.strip(), puzzle)
+
+
+def solve_puzzle(puzzle: Puzzle, time_limit: Optional[float] = None, node_limit: Optional[int] = None,
+                 tt_size_mb: float = 4, book_path: Optional[str] = None) -> Dict:
+    """Look for a mate in puzzle.n moves by the side to move.
+    :param book_path: opening book whose move is searched first, see iterative_deepening. It is opened for each
+        puzzle since a mapped file can't be sent to the worker processes
+    :returns: the result as a dict, see SOLVED, UNSOLVED and TIMEOUT for its status"""
+    start = time.perf_counter()
+    board = fen_to_board(puzzle.fen)
+    stats = {}  # type: dict
+    book = (None if book_path is None else OpeningBook(book_path))
+    try:
+        score, moves, depth_completed = iterative_deepening(board, board.get_turn(), puzzle.n, stats,
+                                                            TranspositionTable(tt_size_mb),
+                                                            time_limit=time_limit, node_limit=node_limit, book=book)
+    finally:
+        if book is not None:
+            book.close()
+    if score == CHECKMATE:
+        status = SOLVED
+    elif depth_completed < puzzle.n:
+        status = TIMEOUT
+    else:
+        status = UNSOLVED
+    return {
+        "line": puzzle.line,
+        "id": puzzle.id,
+        "fen": puzzle.fen,
+        "n": puzzle.n,
+        "status": status,
+        "moves": ([move.uci() for move in moves] if status == SOLVED else []),
+        "depth_completed": depth_completed,
+        "nodes": stats["nodes_explored"],
+        "time": round(time.perf_counter() - start, 4),
+    }
+
+
+def _error_result(line: int, text: str, error: str) -> Dict:
+    return {"line": line, "id": str(line), "fen": text, "status": ERROR, "error": error}
+
+
+def solve_stream(lines: Iterable[str], out: IO[str], default_n: int = 3, workers: int = 1,
+                 time_limit: Optional[float] = None, node_limit: Optional[int] = None,
+                 tt_size_mb: float = 4, window: Optional[int] = None,
+                 book_path: Optional[str] = None) -> Dict[str, int]:
+    """Solve the puzzles in lines and write one JSON result per line to out, in input order.
+    :param workers: number of processes; 1 solves in this process
+    :param time_limit: seconds allowed for each position
+    :param node_limit: nodes allowed for each position
+    :param window: most positions read but not yet written, by default 4 per worker
+    :param book_path: opening book file, see solve_puzzle
+    :returns: number of results with each status, and "positions"""
+    counts = {SOLVED: 0, UNSOLVED: 0, TIMEOUT: 0, ERROR: 0, "positions": 0, "nodes": 0}
+
+    def write(result: Dict) -> None:
+        counts[result["status"]] += 1
+        counts["positions"] += 1
+        counts["nodes"] += result.get("nodes", 0)
+        out.write(json.dumps(result) + "\n")
+
+    if workers <= 1:
+        for line, text, puzzle in read_puzzles(lines, default_n):
+            if puzzle is None:
+                write(_error_result(line, text, "not a FEN or EPD position"))
+                continue
+            try:
+                write(solve_puzzle(puzzle, time_limit, node_limit, tt_size_mb, book_path))
+            except Exception as e:
+                write(_error_result(line, text, str(e)))
+        return counts
+
+    if window is None:
+        window = 4 * workers
+    # results which are done but wait for an earlier one, by position in the input
+    done_results = {}  # type: Dict[int, Dict]
+    pending = {}  # type: dict
+    next_to_write = 0
+    submitted = 0
+    puzzles = read_puzzles(lines, default_n)
+
+    def collect(block: bool) -> None:
+        nonlocal next_to_write
+        if not pending:
+            return
+        done, _ = wait(list(pending), timeout=(None if block else 0), return_when=FIRST_COMPLETED)
+        for future in done:
+            index, line, text = pending.pop(future)
+            try:
+                done_results[index] = future.result()
+            except Exception as e:
+                done_results[index] = _error_result(line, text, str(e))
+        while next_to_write in done_results:
+            write(done_results.pop(next_to_write))
+            next_to_write += 1
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for line, text, puzzle in puzzles:
+            # never hold more than window positions between reading and writing
+            while submitted - next_to_write >= window:
+                collect(block=True)
+            if puzzle is None:
+                done_results[submitted] = _error_result(line, text, "not a FEN or EPD position")
+            else:
+                future = executor.submit(solve_puzzle, puzzle, time_limit, node_limit, tt_size_mb, book_path)
+                pending[future] = (submitted, line, text)
+            submitted += 1
+            collect(block=False)
+        while next_to_write < submitted:
+            collect(block=True)
+    return counts
+
+
+def run_solve(input_path: str, output_path: Optional[str] = None, default_n: int = 3, workers: int = 1,
+              time_limit: Optional[float] = None, node_limit: Optional[int] = None, tt_size_mb: float = 4,
+              window: Optional[int] = None, book_path: Optional[str] = None) -> Dict[str, int]:
+    """Solve the puzzles in a file ("-" for stdin), write the results to a file (stdout by default)
+    and print the totals and the throughput to stderr"""
+    start = time.perf_counter()
+    in_fp = (sys.stdin if input_path == "-" else open(input_path))
+    out_fp = (sys.stdout if output_path is None else open(output_path, "w"))
+    try:
+        counts = solve_stream(in_fp, out_fp, default_n, workers, time_limit, node_limit, tt_size_mb, window, book_path)
+    finally:
+        if in_fp is not sys.stdin:
+            in_fp.close()
+        if out_fp is not sys.stdout:
+            out_fp.close()
+        else:
+            out_fp.flush()
+    elapsed = time.perf_counter() - start
+    print("%d positions in %.2fs (%.1f positions/s, %d nodes/s): %d solved, %d unsolved, %d timed out, %d errors" % (
+        counts["positions"], elapsed, counts["positions"] / max(elapsed, 1e-9), counts["nodes"] / max(elapsed, 1e-9),
+        counts[SOLVED], counts[UNSOLVED], counts[TIMEOUT], counts[ERROR]), file=sys.stderr)
+    return counts
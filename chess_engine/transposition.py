@@ -0,0 +1,266 @@
+"""
+Transposition table for the search.
+
+Entries live in flat preallocated arrays, one array per field, rather than in a dict of objects.
+The table is split into buckets of two slots:
+- the first slot keeps the entry that was searched the deepest
+- the second slot is always replaced
+BucketTable has this layout for any fields, and dfpn.ProofTable uses it too.
+
+SharedTranspositionTable keeps the same buckets in shared memory, so several processes can search with one table.
+"""
+
+from array import array
+from multiprocessing import shared_memory
+from typing import Optional, Tuple
+
+# bound types
+EXACT = 0
+# the true score is at least the stored score (beta cutoff)
+LOWER = 1
+# the true score is at most the stored score (alpha cutoff)
+UPPER = 2
+
+# bytes used by one entry: key (8), depth (1), score (4), bound (1), move (4)
+ENTRY_SIZE = 18
+
+NO_MOVE = 0
+
+TTEntry = Tuple[int, int, int, int]
+
+
+class BucketTable:
+    """Flat preallocated arrays, one per field, split into buckets of two slots:
+    the first slot keeps the entry with the highest priority (e.g. the deepest search), the second is always replaced.
+    Subclasses list their fields in FIELDS and read and write them through _probe_slot and _store_slot"""
+
+    # (attribute, array typecode) of each field besides the key
+    FIELDS = ()  # type: Tuple[Tuple[str, str], ...]
+    # bytes used by one entry
+    ENTRY_SIZE = 8
+
+    def __init__(self, size_mb: float = 16):
+        """
+        :param size_mb: approximate memory used by the table, in megabytes
+        """
+        max_entries = max(2, int(size_mb * 1024 * 1024) // self.ENTRY_SIZE)
+        # number of buckets is a power of 2, so a bucket can be found by masking the key
+        num_buckets = 1
+        while num_buckets * 4 <= max_entries:
+            num_buckets *= 2
+        self._mask = num_buckets - 1
+        size = num_buckets * 2
+
+        # a key of 0 marks an empty slot
+        self._keys = array("Q", bytes(8 * size))
+        self._arrays = [self._keys]
+        for name, typecode in self.FIELDS:
+            values = array(typecode, bytes(array(typecode).itemsize * size))
+            setattr(self, name, values)
+            self._arrays.append(values)
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.collisions = 0
+
+    def __len__(self) -> int:
+        """Number of slots"""
+        return len(self._keys)
+
+    def _probe_slot(self, key: int) -> int:
+        """:returns: the slot holding the key, or -1"""
+        slot = (key & self._mask) << 1
+        keys = self._keys
+        if keys[slot] != key:
+            slot += 1
+            if keys[slot] != key:
+                self.misses += 1
+                if keys[slot] or keys[slot - 1]:
+                    # the bucket holds other positions
+                    self.collisions += 1
+                return -1
+        self.hits += 1
+        return slot
+
+    def _store_slot(self, key: int, priority: int, priorities: array) -> int:
+        """:param priorities: the field the first slot of a bucket is kept by
+        :returns: the slot to write the entry for the key to"""
+        slot = (key & self._mask) << 1
+        keys = self._keys
+        if keys[slot] != key and priority < priorities[slot]:
+            # the first slot holds a more valuable entry for another key
+            slot += 1
+        elif keys[slot] != key and keys[slot]:
+            # the entry in the first slot is demoted to the always-replace slot
+            for values in self._arrays:
+                values[slot + 1] = values[slot]
+        self.stores += 1
+        return slot
+
+    def clear(self) -> None:
+        """Empty every slot. The counters are kept"""
+        for values in self._arrays:
+            values[:] = array(values.typecode, bytes(values.itemsize * len(values)))
+
+    def update_stats(self, stats_dict: dict) -> None:
+        """Report the counters through the search stats"""
+        stats_dict["tt_hits"] = self.hits
+        stats_dict["tt_misses"] = self.misses
+        stats_dict["tt_stores"] = self.stores
+        stats_dict["tt_collisions"] = self.collisions
+
+
+class TranspositionTable(BucketTable):
+    FIELDS = (("_depths", "b"), ("_scores", "i"), ("_bounds", "b"), ("_moves", "I"))
+    ENTRY_SIZE = ENTRY_SIZE
+
+    def probe(self, key: int) -> Optional[TTEntry]:
+        """
+        :returns: (depth, score, bound, move) stored for the key, or None
+        """
+        slot = self._probe_slot(key)
+        if slot < 0:
+            return None
+        return self._depths[slot], self._scores[slot], self._bounds[slot], self._moves[slot]
+
+    def store(self, key: int, depth: int, score: int, bound: int, move: int = NO_MOVE) -> None:
+        slot = self._store_slot(key, depth, self._depths)
+        if self._keys[slot] == key and move == NO_MOVE:
+            # keep the best move from an earlier search of this position
+            move = self._moves[slot]
+        self._keys[slot] = key
+        self._depths[slot] = depth
+        self._scores[slot] = score
+        self._bounds[slot] = bound
+        self._moves[slot] = move
+
+
+# layout of the data word of a SharedTranspositionTable slot:
+# bits 0-19 are the move, 20-21 the bound, 22-29 the depth + 128 and 30-61 the score + 2^31
+SHARED_BOUND_SHIFT = 20
+SHARED_DEPTH_SHIFT = 22
+SHARED_SCORE_SHIFT = 30
+SHARED_MOVE_MASK = (1 << SHARED_BOUND_SHIFT) - 1
+# bytes used by one entry of a SharedTranspositionTable: key xor data (8), data (8)
+SHARED_ENTRY_SIZE = 16
+
+
+class SharedTranspositionTable(TranspositionTable):
+    """Transposition table in multiprocessing.shared_memory, for several processes searching the same position.
+
+    Each slot is two 64-bit words: the data (depth, score, bound and move packed together) and the key xor the data.
+    When two processes write the same slot at once, the words may come from different entries,
+    and then the key no longer matches, so the slot reads as empty. No lock is needed.
+    The counters (hits, misses...) are kept by each process for its own probes and stores.
+
+    The table is created with a size and opened in other processes by name, or by pickling it.
+    The process which created it should unlink it once the search is over."""
+
+    def __init__(self, size_mb: float = 16, name: Optional[str] = None):
+        """
+        :param size_mb: approximate memory used by the table, in megabytes. Ignored when opening by name
+        :param name: name of a table created by another process
+        """
+        if name is None:
+            max_entries = max(2, int(size_mb * 1024 * 1024) // SHARED_ENTRY_SIZE)
+            num_buckets = 1
+            while num_buckets * 4 <= max_entries:
+                num_buckets *= 2
+            self._shm = shared_memory.SharedMemory(create=True, size=num_buckets * 2 * SHARED_ENTRY_SIZE)
+            # a new segment is filled with zeros, which is an empty slot
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+            num_buckets = self._shm.size // (2 * SHARED_ENTRY_SIZE)
+        self._mask = num_buckets - 1
+        self._words = self._shm.buf.cast("Q")
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.collisions = 0
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def __getstate__(self) -> dict:
+        return {"name": self._shm.name}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(name=state["name"])
+
+    def __len__(self) -> int:
+        """Number of slots"""
+        return len(self._words) // 2
+
+    def close(self) -> None:
+        """Stop using the table in this process"""
+        self._words.release()
+        self._shm.close()
+
+    def unlink(self) -> None:
+        """Free the shared memory, once every process has closed the table"""
+        self._shm.unlink()
+
+    def clear(self) -> None:
+        """Empty every slot, for every process using the table. The counters are kept.
+        Nothing should be searching with the table meanwhile"""
+        self._shm.buf[:len(self._words) * 8] = bytes(len(self._words) * 8)
+
+    def probe(self, key: int) -> Optional[TTEntry]:
+        """
+        :returns: (depth, score, bound, move) stored for the key, or None
+        """
+        words = self._words
+        slot = (key & self._mask) << 2
+        data = words[slot + 1]
+        if words[slot] ^ data != key:
+            data = words[slot + 3]
+            if words[slot + 2] ^ data != key:
+                self.misses += 1
+                if words[slot + 2] or words[slot]:
+                    self.collisions += 1
+                return None
+        self.hits += 1
+        return (((data >> SHARED_DEPTH_SHIFT) & 0xff) - 128, (data >> SHARED_SCORE_SHIFT) - (1 << 31),
+                (data >> SHARED_BOUND_SHIFT) & 3, data & SHARED_MOVE_MASK)
+
+    def store(self, key: int, depth: int, score: int, bound: int, move: int = NO_MOVE) -> None:
+        words = self._words
+        slot = (key & self._mask) << 2
+        data = words[slot + 1]
+        stored_key = words[slot] ^ data
+        if stored_key != key and depth < ((data >> SHARED_DEPTH_SHIFT) & 0xff) - 128:
+            # the depth-preferred slot holds a deeper search of another position
+            slot += 2
+        elif stored_key != key and data:
+            # the deeper entry is demoted to the always-replace slot
+            words[slot + 2] = words[slot]
+            words[slot + 3] = data
+        data = words[slot + 1]
+        if words[slot] ^ data == key and move == NO_MOVE:
+            # keep the best move from an earlier search of this position
+            move = data & SHARED_MOVE_MASK
+        data = (move | (bound << SHARED_BOUND_SHIFT) | ((depth + 128) << SHARED_DEPTH_SHIFT) |
+                ((score + (1 << 31)) << SHARED_SCORE_SHIFT))
+        words[slot] = key ^ data
+        words[slot + 1] = data
+        self.stores += 1
+
+
+def score_to_tt(score: int, ply: int, mate_threshold: int) -> int:
+    """Mate scores are stored relative to the position rather than to the root of the search"""
+    if score >= mate_threshold:
+        return score + ply
+    elif score <= -mate_threshold:
+        return score - ply
+    return score
+
+
+def score_from_tt(score: int, ply: int, mate_threshold: int) -> int:
+    if score >= mate_threshold:
+        return score - ply
+    elif score <= -mate_threshold:
+        return score + ply
+    return score
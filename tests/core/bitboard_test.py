@@ -0,0 +1,88 @@
+import unittest as T
+
+from chess_engine.core.bitboard import KNIGHT_ATTACKS, rook_attacks
+from chess_engine.core.board import (BLACK, WHITE, Board, fen_to_board,
+                                     get_piece_list, index_to_sq,
+                                     INDEX_TO_SQ64, SQ64_TO_INDEX, sq_to_index)
+from chess_engine.core.move import gen_successor
+from chess_engine.core.piece_movement_rules import (BITBOARD, MAILBOX,
+                                                    get_backend,
+                                                    get_piece_valid_squares,
+                                                    is_in_check, is_square_attacked,
+                                                    set_backend)
+
+FENS = [
+    "1r6/4b2k/1q1pNrpp/p2Pp3/4P3/1P1R3Q/5PPP/5RK1 w",
+    "3r1b1k/5Q1p/p2p1P2/5R2/4q2P/1P2P3/PB5K/8 w",
+    "r1bq2r1/b4pk1/p1pp1p2/1p2pP2/1P2P1PB/3P4/1PPQ2P1/R3K2R w",
+    "r5rk/2p1Nppp/3p3P/pp2p1P1/4P3/2qnPQK1/8/R6R w",
+    "7k/5p2/8/4B3/8/8/8/K7 w",
+]
+
+
+def bb_of(*squares):
+    bb = 0
+    for sq in squares:
+        bb |= 1 << INDEX_TO_SQ64[sq_to_index(sq)]
+    return bb
+
+
+class AttackTableTest(T.TestCase):
+    def test_knight_attacks_corner(self):
+        assert KNIGHT_ATTACKS[INDEX_TO_SQ64[sq_to_index("a1")]] == bb_of("b3", "c2")
+
+    def test_rook_attacks_blocked(self):
+        occupied = bb_of("a4", "c1")
+        assert rook_attacks(INDEX_TO_SQ64[sq_to_index("a1")], occupied) == bb_of("a2", "a3", "a4", "b1", "c1")
+
+
+class BackendTest(T.TestCase):
+    def setUp(self):
+        self.backend = get_backend()
+
+    def tearDown(self):
+        set_backend(self.backend)
+
+    def all_valid_squares(self, board: Board, backend: str) -> dict:
+        set_backend(backend)
+        squares = {}
+        for color in [WHITE, BLACK]:
+            for index, _ in get_piece_list(board, color):
+                squares[index_to_sq(index)] = sorted(get_piece_valid_squares(board, index))
+        return squares
+
+    def test_backends_agree_on_valid_squares(self):
+        boards = [Board()] + [fen_to_board(fen) for fen in FENS]
+        for board in boards:
+            assert self.all_valid_squares(board, MAILBOX) == self.all_valid_squares(board, BITBOARD)
+
+    def test_backends_agree_on_check(self):
+        for fen in FENS:
+            board = fen_to_board(fen)
+            for color in [WHITE, BLACK]:
+                set_backend(MAILBOX)
+                expected = is_in_check(Board(board), color)
+                set_backend(BITBOARD)
+                assert is_in_check(Board(board), color) == expected
+
+    def test_backends_agree_on_attacked_squares(self):
+        for fen in FENS:
+            board = fen_to_board(fen)
+            for color in [WHITE, BLACK]:
+                attacked = {}
+                for backend in [MAILBOX, BITBOARD]:
+                    set_backend(backend)
+                    attacked[backend] = [index for index in SQ64_TO_INDEX
+                                         if is_square_attacked(board, index, color)]
+                assert attacked[MAILBOX] == attacked[BITBOARD]
+
+    def test_bitboards_follow_moves(self):
+        board = gen_successor(Board(), sq_to_index("e2"), sq_to_index("e4"))
+        board[sq_to_index("d5")] = "p"
+        board = gen_successor(board, sq_to_index("e4"), sq_to_index("d5"))
+        assert self.all_valid_squares(board, MAILBOX) == self.all_valid_squares(board, BITBOARD)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            set_backend("0x88")
+        assert get_backend() == self.backend
@@ -1,6 +1,14 @@
-from chess_engine.core.board import (WHITE, Board, dump_board, get_piece_list,
+import pytest
+
+from chess_engine.core import board as board_module
+from chess_engine.core.board import (BLACK, BLACK_KINGSIDE, BLACK_QUEENSIDE,
+                                     WHITE, WHITE_KINGSIDE, WHITE_QUEENSIDE,
+                                     Board, compute_hash, dump_board,
+                                     fen_to_board, find_king_index,
+                                     get_piece_list,
                                      index_to_sq, is_valid_square, load_board,
                                      sq_to_index, starter_board)
+from chess_engine.core.move import Move
 
 
 def test_sq_to_index():
@@ -91,3 +99,120 @@ def test_piece_list():
     pl = get_piece_list(board, WHITE)
     apl = [(index_to_sq(idx), piece) for idx, piece in pl]
     assert sorted(apl) == starter_piece_list
+
+
+def assert_make_unmake(board: Board, move: Move) -> Board:
+    """Make the move on a copy of the board, check that unmake restores it, and return the board after the move"""
+    before = Board(board)
+    undo = board.make_move(move)
+    after = Board(board)
+    board.unmake_move(undo)
+    assert dump_board(board) == dump_board(before)
+    assert board._bitboards == before._bitboards
+    assert board._castling == before._castling
+    assert board.get_ep_capture_index() == before.get_ep_capture_index()
+    assert board._pieces == before._pieces
+    assert board._king_index == before._king_index
+    assert_piece_tables(after)
+    return after
+
+
+def assert_piece_tables(board: Board) -> None:
+    """The piece sets and king indexes kept up to date by the board match the ones found by a full scan"""
+    fresh = Board(board._board)
+    assert board._pieces == fresh._pieces
+    assert board._king_index == fresh._king_index
+
+
+def test_make_unmake_castle():
+    board = fen_to_board("r3k2r/8/8/8/8/8/8/R3K2R w KQkq -")
+    after = assert_make_unmake(board, Move("K", sq_to_index("e1"), sq_to_index("g1"), is_castle=True))
+    assert after[sq_to_index("f1")] == "R"
+    assert after[sq_to_index("g1")] == "K"
+    assert after._castling == BLACK_KINGSIDE | BLACK_QUEENSIDE
+
+
+def test_make_unmake_en_passant():
+    board = fen_to_board("4k3/8/8/3pP3/8/8/8/4K3 w - d6")
+    assert board.get_ep_pawn_index() == sq_to_index("d5")
+    after = assert_make_unmake(board, Move("P", sq_to_index("e5"), sq_to_index("d6"),
+                                           is_capture=True, is_en_passant=True))
+    assert after[sq_to_index("d5")] == "E"
+    assert after[sq_to_index("d6")] == "P"
+
+
+def test_make_unmake_promotion_capture():
+    board = fen_to_board("1r2k3/P7/8/8/8/8/8/4K3 w - -")
+    after = assert_make_unmake(board, Move("P", sq_to_index("a7"), sq_to_index("b8"),
+                                           promotion="Q", is_capture=True))
+    assert after[sq_to_index("b8")] == "Q"
+
+
+def test_king_index_follows_castling():
+    board = fen_to_board("r3k2r/8/8/8/8/8/8/R3K2R w KQkq -")
+    board.make_move(Move("K", sq_to_index("e1"), sq_to_index("c1"), is_castle=True))
+    assert find_king_index(board, WHITE) == sq_to_index("c1")
+    assert find_king_index(board, BLACK) == sq_to_index("e8")
+    assert [(index_to_sq(idx), piece) for idx, piece in get_piece_list(board, WHITE)] == [
+        ("c1", "K"), ("d1", "R"), ("h1", "R")]
+
+
+def test_make_move_castling_rights():
+    board = Board()
+    board.make_move(Move("P", sq_to_index("h2"), sq_to_index("h4")))
+    assert board.get_ep_capture_index() == sq_to_index("h3")
+    board.make_move(Move("R", sq_to_index("h1"), sq_to_index("h3")))
+    assert board.get_ep_capture_index() == -1
+    assert not board.can_castle(WHITE_KINGSIDE)
+    assert board.can_castle(WHITE_QUEENSIDE)
+
+
+def play(board: Board, moves: list) -> Board:
+    for piece, src, dest in moves:
+        board.make_move(Move(piece, sq_to_index(src), sq_to_index(dest)))
+    return board
+
+
+def test_hash_transposition():
+    b1 = play(Board(), [("N", "g1", "f3"), ("n", "b8", "c6"), ("N", "b1", "c3")])
+    b2 = play(Board(), [("N", "b1", "c3"), ("n", "b8", "c6"), ("N", "g1", "f3")])
+    assert b1.get_hash() == b2.get_hash() == compute_hash(b1)
+    assert b1 == b2
+    # boards are mutable, so only their hash key can go in a set
+    with pytest.raises(TypeError):
+        hash(b1)
+
+
+def test_hash_back_to_start():
+    board = play(Board(), [("N", "g1", "f3"), ("n", "g8", "f6"), ("N", "f3", "g1"), ("n", "f6", "g8")])
+    assert board == Board()
+
+
+def test_hash_side_to_move():
+    assert fen_to_board("4k3/8/8/8/8/8/8/4K3 w - -") != fen_to_board("4k3/8/8/8/8/8/8/4K3 b - -")
+
+
+def test_hash_en_passant_only_when_capturable():
+    board = play(Board(), [("P", "e2", "e4")])
+    assert board == fen_to_board("rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3")
+    assert board == fen_to_board("rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq -")
+    b1 = fen_to_board("4k3/8/8/8/3p4/8/4P3/4K3 w - -")
+    b2 = fen_to_board("4k3/8/8/8/3p4/8/4P3/4K3 w - -")
+    play(b1, [("P", "e2", "e4")])
+    play(b2, [("P", "e2", "e3"), ("k", "e8", "d8"), ("P", "e3", "e4"), ("k", "d8", "e8")])
+    assert b1 != b2
+
+
+def test_hash_debug_mode(monkeypatch):
+    monkeypatch.setattr(board_module, "DEBUG_HASH", True)
+    board = fen_to_board("r3k2r/1P6/8/8/3p4/8/4P3/R3K2R w KQkq -")
+    undos = [
+        board.make_move(Move("P", sq_to_index("e2"), sq_to_index("e4"))),
+        board.make_move(Move("p", sq_to_index("d4"), sq_to_index("e3"), is_capture=True, is_en_passant=True)),
+        board.make_move(Move("K", sq_to_index("e1"), sq_to_index("c1"), is_castle=True)),
+        board.make_move(Move("r", sq_to_index("h8"), sq_to_index("h1"), is_capture=False)),
+        board.make_move(Move("P", sq_to_index("b7"), sq_to_index("a8"), promotion="N", is_capture=True)),
+    ]
+    for undo in reversed(undos):
+        board.unmake_move(undo)
+    assert board == fen_to_board("r3k2r/1P6/8/8/3p4/8/4P3/R3K2R w KQkq -")
@@ -0,0 +1,78 @@
+from chess_engine.core.board import (BLACK, BLACK_BIT, KING_CODE, KNIGHT_CODE,
+                                     PAWN_CODE, WHITE, Board,
+                                     compute_evaluation, fen_to_board,
+                                     sq_to_index)
+from chess_engine.core.evaluation import MAX_PHASE, PST_ENDGAME, PST_MIDDLEGAME
+from chess_engine.core.move import Move
+from chess_engine.core.piece_movement_rules import gen_legal_move_codes
+from chess_engine.engine import evaluate, score_board
+from chess_engine.perft import PERFT_POSITIONS
+
+
+def test_start_position():
+    board = Board()
+    material, middlegame, endgame, phase = board.get_evaluation()
+    assert material == [1039, 1039]
+    assert middlegame[WHITE] == middlegame[BLACK]
+    assert endgame[WHITE] == endgame[BLACK]
+    assert phase == MAX_PHASE
+    assert evaluate(board, WHITE) == evaluate(board, BLACK) == 0
+    assert score_board(board) == 0
+
+
+def test_tables_are_mirrored():
+    # the same piece on the mirrored square is worth the same to either color
+    for white, black in [("e4", "e5"), ("a1", "a8"), ("g2", "g7")]:
+        for code in [PAWN_CODE, KNIGHT_CODE, KING_CODE]:
+            for table in [PST_MIDDLEGAME, PST_ENDGAME]:
+                assert table[code][sq_to_index(white)] == table[code | BLACK_BIT][sq_to_index(black)]
+
+
+def walk(board: Board, depth: int) -> int:
+    """Make and take back every move to the given depth, checking the incremental evaluation at each node"""
+    assert board.get_evaluation() == compute_evaluation(board)
+    if depth == 0:
+        return 1
+    nodes = 0
+    for code in list(gen_legal_move_codes(board, board.get_turn())):
+        undo = board.make_move(code)
+        nodes += walk(board, depth - 1)
+        board.unmake_move(undo)
+    assert board.get_evaluation() == compute_evaluation(board)
+    return nodes
+
+
+def test_incremental_evaluation():
+    # the perft positions have castling, en-passant, promotions and captures of every kind
+    for position in PERFT_POSITIONS:
+        board = fen_to_board(position.fen)
+        assert walk(board, 2) == position.counts[2], position.name
+
+
+def test_material_and_phase():
+    board = fen_to_board("4k3/8/8/8/8/8/8/R3K3 w")
+    assert score_board(board) == 5
+    assert board.get_phase() == 2
+    board.make_move(Move("R", sq_to_index("a1"), sq_to_index("a8")))
+    assert board.get_material(WHITE) == 1005
+    # promotions and captures change the phase
+    board = fen_to_board("1r2k3/P7/8/8/8/8/8/4K3 w")
+    assert board.get_phase() == 2
+    board.make_move(Move("P", sq_to_index("a7"), sq_to_index("b8"), promotion="Q", is_capture=True))
+    assert board.get_phase() == 4
+    assert score_board(board) == 9
+
+
+def test_evaluate_tapers():
+    # with only kings and pawns the endgame tables are used: the centralised king is better
+    board = fen_to_board("7k/8/8/8/4K3/8/8/8 w")
+    assert board.get_phase() == 0
+    king_bonus = PST_ENDGAME[KING_CODE][sq_to_index("e4")] - PST_ENDGAME[KING_CODE | BLACK_BIT][sq_to_index("h8")]
+    assert evaluate(board, WHITE) == king_bonus > 0
+    assert evaluate(board, BLACK) == -evaluate(board, WHITE)
+    # and with all the pieces on, the middlegame tables
+    board = fen_to_board("rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b")
+    pawn_bonus = PST_MIDDLEGAME[PAWN_CODE][sq_to_index("e4")] - PST_MIDDLEGAME[PAWN_CODE][sq_to_index("e2")]
+    assert evaluate(board, WHITE) == pawn_bonus
+    # material counts in centipawns
+    assert evaluate(fen_to_board("4k3/8/8/8/8/8/8/R3K3 w"), WHITE) > 400
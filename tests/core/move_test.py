@@ -0,0 +1,61 @@
+import pytest
+
+from chess_engine.core.board import (MOVE_CAPTURE, MOVE_CASTLE,
+                                     MOVE_EN_PASSANT, QUEEN_CODE, Board,
+                                     fen_to_board, sq_to_index)
+from chess_engine.core.move import (Move, build_move, build_move_code,
+                                    decode_move, encode_move, move_dest,
+                                    move_promotion, move_src, pack_move)
+from chess_engine.core.piece_movement_rules import (gen_legal_move_codes,
+                                                    gen_legal_moves)
+
+
+def test_pack_and_unpack():
+    code = pack_move(sq_to_index("b7"), sq_to_index("a8"), QUEEN_CODE, MOVE_CAPTURE)
+    assert move_src(code) == sq_to_index("b7")
+    assert move_dest(code) == sq_to_index("a8")
+    assert move_promotion(code) == QUEEN_CODE
+    assert code & MOVE_CAPTURE
+    assert code < (1 << 32)
+
+
+def test_flags():
+    board = fen_to_board("r3k3/8/8/3pP3/8/8/8/R3K2R w KQq d6")
+    assert build_move_code(board, sq_to_index("e1"), sq_to_index("g1")) & MOVE_CASTLE
+    assert build_move_code(board, sq_to_index("e5"), sq_to_index("d6")) & MOVE_EN_PASSANT
+    assert build_move_code(board, sq_to_index("a1"), sq_to_index("a8")) & MOVE_CAPTURE
+    assert build_move_code(board, sq_to_index("a1"), sq_to_index("a2")) == pack_move(sq_to_index("a1"),
+                                                                                      sq_to_index("a2"))
+
+
+def test_decode_matches_move():
+    board = fen_to_board("r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 b kq - 0 1")
+    for code in gen_legal_move_codes(board, board.get_turn()):
+        move = decode_move(board, code)
+        assert move.code == code
+        assert encode_move(move) == encode_move(code) == code
+        same = build_move(board, move.src, move.dest, move.promotion)
+        assert (same.piece, same.promotion, same.is_capture, same.is_castle, same.is_en_passant) == \
+            (move.piece, move.promotion, move.is_capture, move.is_castle, move.is_en_passant)
+    assert sorted(m.code for m in gen_legal_moves(board, board.get_turn())) == \
+        sorted(gen_legal_move_codes(board, board.get_turn()))
+
+
+def test_promotion_names_follow_color():
+    board = fen_to_board("8/8/8/8/8/8/1p5k/7K b")
+    assert sorted(m.promotion for m in gen_legal_moves(board, board.get_turn()) if m.promotion) == \
+        ["b", "n", "q", "r"]
+
+
+def test_make_move_takes_packed_moves():
+    board = Board()
+    undo = board.make_move(build_move_code(board, sq_to_index("e2"), sq_to_index("e4")))
+    assert board == fen_to_board("rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3")
+    board.unmake_move(undo)
+    assert board == Board()
+
+
+def test_move_has_no_dict():
+    move = Move("P", sq_to_index("e2"), sq_to_index("e4"))
+    with pytest.raises(AttributeError):
+        move.extra = 1
@@ -1,10 +1,16 @@
 import unittest as T
 
-from chess_engine.core.board import (dump_board, fen_to_board,
+from chess_engine.core.board import (dump_board, fen_to_board, index_to_sq,
                                 load_board, print_board, sq_to_index,
-                                BLACK, WHITE, Board)
-from chess_engine.core.move import gen_successor
-from chess_engine.core.piece_movement_rules import (_has_no_legal_moves,
+                                BLACK, WHITE, Board, MOVE_CAPTURE, MOVE_EN_PASSANT,
+                                MOVE_PROMOTION_SHIFT, TYPE_MASK)
+from chess_engine.core.move import decode_move, gen_successor
+from chess_engine.core.piece_movement_rules import (BACKENDS, _has_no_legal_moves,
+                                               gen_capture_move_codes,
+                                               gen_check_move_codes,
+                                               gen_legal_move_codes,
+                                               get_backend, set_backend,
+                                               gen_legal_moves,
                                                get_bishop_valid_squares,
                                                get_king_valid_squares,
                                                get_knight_valid_squares,
@@ -13,8 +19,11 @@ from chess_engine.core.piece_movement_rules import (_has_no_legal_moves,
                                                get_promotions,
                                                get_queen_valid_squares,
                                                get_rook_valid_squares,
+                                               gives_check,
                                                is_in_check, is_in_checkmate,
-                                               is_in_stalemate, is_legal_move)
+                                               is_in_stalemate, is_legal_move,
+                                               is_square_attacked)
+from chess_engine.perft import PERFT_POSITIONS
 
 
 class PieceMovementTest(T.TestCase):
@@ -229,6 +238,212 @@ class PieceMovementTest(T.TestCase):
         assert get_promotions(board, sq_to_index("a2"), sq_to_index("b1")) == []
 
 
+class SquareAttackedTest(T.TestCase):
+    def attacked_squares(self, board: Board, color) -> list:
+        return sorted(sq for sq in
+                      [f + r for f in "abcdefgh" for r in "12345678"]
+                      if is_square_attacked(board, sq_to_index(sq), color))
+
+    def test_knight(self):
+        board = fen_to_board("7k/8/8/8/8/8/8/N6K w")
+        assert self.attacked_squares(board, WHITE) == ["b3", "c2", "g1", "g2", "h2"]
+
+    def test_pawns_attack_forwards(self):
+        board = fen_to_board("7k/8/8/3p4/8/8/4P3/K7 w")
+        assert self.attacked_squares(board, WHITE) == ["a2", "b1", "b2", "d3", "f3"]
+        assert self.attacked_squares(board, BLACK) == ["c4", "e4", "g7", "g8", "h7"]
+
+    def test_sliders_are_blocked(self):
+        board = fen_to_board("7k/8/8/8/8/2p5/8/Q3n2K w")
+        attacked = self.attacked_squares(board, WHITE)
+        assert "d1" in attacked
+        assert "e1" in attacked
+        assert "f1" not in attacked
+        assert "b2" in attacked
+        assert "c3" in attacked
+        assert "d4" not in attacked
+        assert "a8" in attacked
+
+    def test_own_pieces_do_not_count(self):
+        board = Board()
+        assert is_square_attacked(board, sq_to_index("f3"), WHITE)
+        assert not is_square_attacked(board, sq_to_index("f3"), BLACK)
+        assert not is_square_attacked(board, sq_to_index("e4"), WHITE)
+
+
+class LegalMoveTest(T.TestCase):
+    def legal_moves(self, fen: str) -> list:
+        board = fen_to_board(fen)
+        return sorted(index_to_sq(m.src) + index_to_sq(m.dest) + (m.promotion or "")
+                      for m in gen_legal_moves(board, board.get_turn()))
+
+    def test_pinned_piece_stays_on_pin_ray(self):
+        moves = self.legal_moves("4r2k/8/8/8/8/8/4B3/4K3 w")
+        assert [m for m in moves if m.startswith("e2")] == []
+        moves = self.legal_moves("4r2k/8/8/8/8/8/4R3/4K3 w")
+        assert [m for m in moves if m.startswith("e2")] == ["e2e3", "e2e4", "e2e5", "e2e6", "e2e7", "e2e8"]
+
+    def test_only_evasions_in_check(self):
+        moves = self.legal_moves("4r2k/8/8/8/8/8/3B4/R3K3 w")
+        # block with the bishop, or move the king off the file
+        assert moves == ["d2e3", "e1d1", "e1f1", "e1f2"]
+
+    def test_double_check_only_king_moves(self):
+        moves = self.legal_moves("4r2k/8/8/8/8/5n2/3Q4/R3K3 w")
+        assert all(m.startswith("e1") for m in moves)
+        assert moves == ["e1d1", "e1f1", "e1f2"]
+
+    def test_en_passant_discovering_rank_check(self):
+        moves = self.legal_moves("8/8/8/K2pP2r/8/8/8/7k w - d6")
+        assert "e5d6" not in moves
+        assert "e5e6" in moves
+
+    def test_castling(self):
+        moves = self.legal_moves("r3k2r/8/8/8/8/8/8/R3K2R w KQkq -")
+        assert "e1g1" in moves
+        assert "e1c1" in moves
+        # the king can't pass through an attacked square
+        moves = self.legal_moves("r3k2r/8/8/8/8/8/5r2/R3K2R w KQ -")
+        assert "e1g1" not in moves
+        assert "e1c1" in moves
+
+    def test_promotions(self):
+        moves = self.legal_moves("7k/P7/8/8/8/8/8/K7 w")
+        assert [m for m in moves if m.startswith("a7")] == ["a7a8B", "a7a8N", "a7a8Q", "a7a8R"]
+
+    def test_moves_of_one_piece(self):
+        board = fen_to_board("4r2k/8/8/8/8/8/3B4/R3K3 w")
+        all_moves = list(gen_legal_move_codes(board, WHITE))
+        for sq in ["a1", "d2", "e1"]:
+            src = sq_to_index(sq)
+            moves = list(gen_legal_move_codes(board, WHITE, src))
+            assert moves == [code for code in all_moves if code & 0x7f == src]
+        # only moves of the given color
+        assert list(gen_legal_move_codes(board, BLACK, sq_to_index("d2"))) == []
+        assert list(gen_legal_move_codes(board, WHITE, sq_to_index("e8"))) == []
+
+
+class CaptureGenerationTest(T.TestCase):
+    def setUp(self):
+        self.backend = get_backend()
+
+    def tearDown(self):
+        set_backend(self.backend)
+
+    def captures(self, fen: str) -> list:
+        board = fen_to_board(fen)
+        return sorted(decode_move(board, code).uci() for code in gen_capture_move_codes(board, board.get_turn()))
+
+    def test_captures_and_promotions_only(self):
+        for backend in BACKENDS:
+            set_backend(backend)
+            # the king can't take the pawn defended by the queen, the a-pawn promotes by moving and by taking,
+            # and the e-pawn takes en-passant. No quiet rook or king moves
+            moves = self.captures("1n2k3/P7/8/3pPp2/8/2q1p3/3RK3/8 w - f6")
+            assert moves == ["a7a8b", "a7a8n", "a7a8q", "a7a8r", "a7b8b", "a7b8n", "a7b8q", "a7b8r",
+                             "d2d5", "e5f6"], backend
+
+    def test_all_evasions_in_check(self):
+        for backend in BACKENDS:
+            set_backend(backend)
+            # in check, quiet king moves and blocks are generated too
+            assert self.captures("4r2k/8/8/8/8/8/3B4/R3K3 w") == ["d2e3", "e1d1", "e1f1", "e1f2"], backend
+
+    def test_same_as_filtered_legal_moves(self):
+        for backend in BACKENDS:
+            set_backend(backend)
+            for position in PERFT_POSITIONS:
+                board = fen_to_board(position.fen)
+                color = board.get_turn()
+                for code in list(gen_legal_move_codes(board, color)):
+                    undo = board.make_move(code)
+                    opponent = not color
+                    expected = [move for move in gen_legal_move_codes(board, opponent)
+                                if move & (MOVE_CAPTURE | MOVE_EN_PASSANT | (TYPE_MASK << MOVE_PROMOTION_SHIFT))]
+                    if is_in_check(board, opponent):
+                        expected = list(gen_legal_move_codes(board, opponent))
+                    assert sorted(gen_capture_move_codes(board, opponent)) == sorted(expected), backend
+                    board.unmake_move(undo)
+
+
+class CheckGenerationTest(T.TestCase):
+    def setUp(self):
+        self.backend = get_backend()
+
+    def tearDown(self):
+        set_backend(self.backend)
+
+    def checks(self, fen: str) -> list:
+        board = fen_to_board(fen)
+        return sorted(decode_move(board, code).uci() for code in gen_check_move_codes(board, board.get_turn()))
+
+    def test_direct_discovered_and_promotion_checks(self):
+        for backend in BACKENDS:
+            set_backend(backend)
+            # every knight move uncovers the bishop, the pawn promotes to a queen or rook on the king's rank,
+            # the h-rook checks directly and by castling. The a-rook is stopped by the bishop
+            assert self.checks("5k2/1P6/3N4/8/8/B7/8/R3K2R w K") == [
+                "b7b8q", "b7b8r", "d6b5", "d6c4", "d6c8", "d6e4", "d6e8", "d6f5", "d6f7", "e1g1", "h1f1", "h1h8"
+            ], backend
+
+    def test_en_passant_discovered_check(self):
+        for backend in BACKENDS:
+            set_backend(backend)
+            # taking en-passant takes both pawns off the rook's rank, pushing the pawn leaves the black pawn there
+            assert self.checks("8/8/8/RPp4k/8/8/8/4K3 w - c6") == ["b5c6"], backend
+
+    def test_same_as_filtered_legal_moves(self):
+        for backend in BACKENDS:
+            set_backend(backend)
+            for position in PERFT_POSITIONS:
+                board = fen_to_board(position.fen)
+                color = board.get_turn()
+                for code in list(gen_legal_move_codes(board, color)):
+                    undo = board.make_move(code)
+                    opponent = not color
+                    expected = []
+                    for move in list(gen_legal_move_codes(board, opponent)):
+                        reply_undo = board.make_move(move)
+                        if is_in_check(board, color):
+                            expected.append(move)
+                        board.unmake_move(reply_undo)
+                    assert sorted(gen_check_move_codes(board, opponent)) == sorted(expected), backend
+                    board.unmake_move(undo)
+
+
+class GivesCheckTest(T.TestCase):
+    def checking_moves(self, fen: str) -> list:
+        board = fen_to_board(fen)
+        return sorted(index_to_sq(m.src) + index_to_sq(m.dest) + (m.promotion or "")
+                      for m in gen_legal_moves(board, board.get_turn()) if gives_check(board, m))
+
+    def test_direct_check(self):
+        assert self.checking_moves("7k/8/8/6N1/8/8/8/K7 w") == ["g5f7"]
+
+    def test_discovered_check(self):
+        # any move of the bishop uncovers the rook
+        moves = self.checking_moves("4k3/8/8/8/4B3/8/8/K3R3 w")
+        assert "e4b1" in moves and "e4h1" in moves
+        assert "e4d5" in moves
+
+    def test_blocker_moving_along_the_line(self):
+        # the pawn stays between the queen and the king
+        moves = self.checking_moves("4k3/8/8/8/4P3/8/8/K3Q3 w")
+        assert "e4e5" not in moves
+        # the rook stays on the line as well, but checks by itself
+        assert "e4e7" in self.checking_moves("4k3/8/8/8/4R3/8/8/K3Q3 w")
+
+    def test_castling_and_promotion(self):
+        assert "e1g1" in self.checking_moves("5k2/8/8/8/8/8/8/4K2R w K")
+        assert "b7b8Q" in self.checking_moves("7k/1P6/8/8/8/8/8/K7 w")
+        assert "b7b8N" not in self.checking_moves("7k/1P6/8/8/8/8/8/K7 w")
+
+    def test_en_passant_discovered_check(self):
+        # both pawns leave the fifth rank
+        assert "e5d6" in self.checking_moves("8/8/8/R2pP2k/8/8/8/K7 w - d6")
+        assert "e5d6" not in self.checking_moves("8/8/8/R2pP3/7k/8/8/K7 w - d6")
+
+
 class CheckTest(T.TestCase):
     def test_bishop_check(self):
         board = fen_to_board("7k/8/8/4B3/8/8/8/K7 w")
@@ -0,0 +1,37 @@
+from chess_engine.core.board import fen_to_board, sq_to_index
+from chess_engine.core.move import build_move
+from chess_engine.core.see import static_exchange
+
+
+def see(fen: str, src: str, dest: str, promotion=None) -> int:
+    board = fen_to_board(fen)
+    return static_exchange(board, build_move(board, sq_to_index(src), sq_to_index(dest), promotion))
+
+
+def test_undefended_piece():
+    assert see("4k3/8/8/3r4/8/8/8/3RK3 w", "d1", "d5") == 5
+
+
+def test_defended_by_pawn():
+    # rook takes a pawn defended by a pawn
+    assert see("4k3/8/2p5/3p4/8/8/8/3RK3 w", "d1", "d5") == 1 - 5
+
+
+def test_xray_recapture():
+    # the rook behind the first one joins in once it has captured
+    assert see("3rk3/8/8/3p4/8/8/3R4/3RK3 w", "d2", "d5") == 1
+    # two rooks each: white wins the pawn and loses a rook whether or not it recaptures
+    assert see("3rk3/3r4/8/3p4/8/8/3R4/3RK3 w", "d2", "d5") == 1 - 5
+
+
+def test_stop_when_recapture_loses():
+    # the queen takes a knight defended by a pawn: black recaptures and white stops
+    assert see("4k3/8/2p5/3n4/8/8/8/3QK3 w", "d1", "d5") == 3 - 9
+
+
+def test_king_cannot_take_defended_piece():
+    assert see("8/8/8/4k3/3p4/8/5B2/Q3K3 w", "f2", "d4") == 1
+
+
+def test_en_passant():
+    assert see("4k3/8/8/3pP3/8/8/8/4K3 w - d6", "e5", "d6") == 1
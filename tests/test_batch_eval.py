@@ -0,0 +1,86 @@
+import pytest
+
+from chess_engine.core.board import BLACK, WHITE, Board, fen_to_board
+from chess_engine.core.piece_movement_rules import gen_legal_move_codes
+from chess_engine.engine import evaluate
+from chess_engine.perft import PERFT_POSITIONS
+from chess_engine.pgn import pgn_paths, read_games, replay
+
+np = pytest.importorskip("numpy")
+batch_eval = pytest.importorskip("chess_engine.batch_eval")
+
+
+def perft_boards():
+    """The perft positions and the positions after each of their moves"""
+    boards = []
+    for position in PERFT_POSITIONS:
+        board = fen_to_board(position.fen)
+        boards.append(board)
+        for code in gen_legal_move_codes(board, board.get_turn()):
+            child = Board(board)
+            child.make_move(code)
+            boards.append(child)
+    return boards
+
+
+def test_pack():
+    fens = [position.fen for position in PERFT_POSITIONS]
+    squares = batch_eval.pack_fens(fens)
+    assert squares.shape == (len(fens), 64)
+    assert squares.dtype == np.int8
+    assert (squares == batch_eval.pack_boards(fen_to_board(fen) for fen in fens)).all()
+    # a8 first: black rook, knight, ..., then white pawns and pieces at the end
+    assert squares[0, :8].tolist() == [12, 10, 11, 13, 14, 11, 10, 12]
+    assert squares[0, 56:].tolist() == [4, 2, 3, 5, 6, 3, 2, 4]
+    assert batch_eval.pack_boards([]).shape == (0, 64)
+    with pytest.raises(ValueError):
+        batch_eval.pack_fens(["8/8/8 w - - 0 1"])
+
+
+def test_same_as_evaluate():
+    # without mobility and pawn structure, the batch gives the score of engine.evaluate
+    boards = perft_boards()
+    terms = batch_eval.batch_terms(batch_eval.pack_boards(boards))
+    for i, board in enumerate(boards):
+        assert terms["material"][i] + terms["piece_square"][i] == evaluate(board, WHITE)
+
+
+def test_mobility():
+    start = batch_eval.batch_terms(batch_eval.pack_boards([Board()]))
+    assert start["mobility"].tolist() == [0]
+    assert start["pawns"].tolist() == [0]
+    # the rook has 7 squares up the file and 3 along the rank before its own king
+    terms = batch_eval.batch_terms(batch_eval.pack_fens(["4k3/8/8/8/8/8/8/R3K3 w Q - 0 1"]))
+    assert terms["mobility"].tolist() == [10 * batch_eval.MOBILITY_WEIGHT]
+    # the queen (16 squares) captures the pawn but does not go past it, the knight (3) can't land on its king
+    terms = batch_eval.batch_terms(batch_eval.pack_fens(["4k3/8/8/8/8/2p5/1Q6/KN6 w - - 0 1"]))
+    assert terms["mobility"].tolist() == [(16 + 3) * batch_eval.MOBILITY_WEIGHT]
+
+
+def test_pawn_structure():
+    # white: a2 and a3 doubled and isolated, neither passed. Black: a4 isolated, h5 isolated and passed
+    fen = "4k3/8/8/7p/p7/P7/P7/4K3 w - - 0 1"
+    terms = batch_eval.batch_terms(batch_eval.pack_fens([fen]))
+    white = batch_eval.DOUBLED_PAWN + 2 * batch_eval.ISOLATED_PAWN
+    black = 2 * batch_eval.ISOLATED_PAWN + batch_eval.PASSED_PAWN
+    assert terms["pawns"].tolist() == [white - black]
+    assert batch_eval.board_terms(fen_to_board(fen))["pawns"] == white - black
+
+
+def test_same_as_scalar(monkeypatch):
+    boards = perft_boards()
+    for path in pgn_paths(["data"]):
+        with open(path) as fp:
+            for game in read_games(fp):
+                boards.extend(Board(board) for board, _ in replay(game))
+    # several chunks, the last one partly filled
+    monkeypatch.setattr(batch_eval, "CHUNK_SIZE", 1000)
+    squares = batch_eval.pack_boards(boards)
+    assert batch_eval.batch_evaluate(squares).tolist() == [batch_eval.board_evaluate(b, WHITE) for b in boards]
+    colors = np.array([board.get_turn() for board in boards])
+    assert batch_eval.batch_evaluate(squares, colors).tolist() == [
+        batch_eval.board_evaluate(board, board.get_turn()) for board in boards]
+    terms = batch_eval.batch_terms(squares[:100])
+    for i, board in enumerate(boards[:100]):
+        assert {name: terms[name][i] for name in batch_eval.TERMS} == batch_eval.board_terms(board)
+    assert batch_eval.board_evaluate(boards[0], BLACK) == -batch_eval.board_evaluate(boards[0], WHITE)
@@ -0,0 +1,176 @@
+import random
+
+import pytest
+
+from chess_engine.book import (ENTRY, ENTRY_SIZE, MAGIC, OpeningBook, build_book,
+                               decode_book_move, encode_book_move)
+from chess_engine.core.board import WHITE, Board, fen_to_board, sq_to_index
+from chess_engine.core.move import build_move_code
+from chess_engine.core.piece_movement_rules import gen_legal_move_codes
+from chess_engine.engine import DFPN, MINIMAX, NEGAMAX, STATIC, find_best_move, find_mate_in_n
+from chess_engine.perft import PERFT_POSITIONS
+from chess_engine.pgn import read_games, replay
+
+
+def uci_code(board: Board, uci: str) -> int:
+    return build_move_code(board, sq_to_index(uci[:2]), sq_to_index(uci[2:4]))
+
+
+@pytest.fixture(scope="module")
+def book_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("book") / "book.bin")
+    build_book(["data"], path, max_ply=20)
+    return path
+
+
+def test_encode_book_move():
+    board = Board()
+    assert encode_book_move(uci_code(board, "e2e4")) == (12 << 6) | 28
+    # castling is the king taking its rook, promotions count from the knight
+    board = fen_to_board("r3k2r/P7/8/8/8/8/8/R3K2R w KQkq - 0 1")
+    assert encode_book_move(build_move_code(board, sq_to_index("e1"), sq_to_index("g1"))) == (4 << 6) | 7
+    assert encode_book_move(build_move_code(board, sq_to_index("e1"), sq_to_index("c1"))) == (4 << 6) | 0
+    assert encode_book_move(build_move_code(board, sq_to_index("a7"), sq_to_index("b8"), 5)) == \
+        (4 << 12) | (48 << 6) | 57
+    assert encode_book_move(build_move_code(board, sq_to_index("a7"), sq_to_index("b8"), 2)) == \
+        (1 << 12) | (48 << 6) | 57
+    board = fen_to_board("r3k2r/8/8/8/8/8/8/R3K2R b KQkq - 0 1")
+    assert encode_book_move(build_move_code(board, sq_to_index("e8"), sq_to_index("g8"))) == (60 << 6) | 63
+
+
+def test_decode_book_move():
+    for position in PERFT_POSITIONS:
+        board = fen_to_board(position.fen)
+        codes = list(gen_legal_move_codes(board, board.get_turn()))
+        assert len(set(encode_book_move(code) for code in codes)) == len(codes)
+        for code in codes:
+            assert decode_book_move(board, encode_book_move(code)) == code
+    # e2e5
+    assert decode_book_move(Board(), (12 << 6) | 36) is None
+
+
+def test_build(book_path):
+    with open(book_path, "rb") as fp:
+        data = fp.read()
+    assert data.startswith(MAGIC) and (len(data) - len(MAGIC)) % ENTRY_SIZE == 0
+    entries = [ENTRY.unpack_from(data, i) for i in range(len(MAGIC), len(data), ENTRY_SIZE)]
+    assert entries == sorted(entries, key=lambda entry: (entry[0], -entry[2], entry[1]))
+    with OpeningBook(book_path) as book:
+        assert len(book) == len(entries)
+        start = book.entries(Board().get_hash())
+        assert start[0].move == encode_book_move(uci_code(Board(), "e2e4"))
+        assert [entry.weight for entry in start] == sorted((entry.weight for entry in start), reverse=True)
+        for entry in start:
+            assert entry.wins + entry.draws + entry.losses == entry.weight
+        # every position of a game is in the book up to the last ply added, with the move played
+        with open("data/carlsen_caruana_2018.pgn") as fp:
+            game = next(read_games(fp))
+        board = Board()
+        for ply, (after, move) in enumerate(replay(game)):
+            if ply == 20:
+                assert book.moves(after) == []
+                break
+            assert move.code in [code for code, _ in book.moves(board)]
+            board = Board(after)
+
+
+def test_build_options(tmp_path, book_path):
+    path = str(tmp_path / "book.bin")
+    games, skipped, count = build_book(["data"], path, max_ply=1)
+    assert games > 0 and skipped == 0
+    with OpeningBook(path) as book:
+        assert len(book) == count == len(book.entries(Board().get_hash()))
+        assert sum(entry.weight for entry in book.entries(Board().get_hash())) <= games
+    build_book(["data"], path, max_ply=20, min_games=2)
+    with open(path, "rb") as fp:
+        data = fp.read()
+    weights = [ENTRY.unpack_from(data, i)[2] for i in range(len(MAGIC), len(data), ENTRY_SIZE)]
+    assert weights and min(weights) >= 2
+    with OpeningBook(book_path) as book:
+        assert len(weights) < len(book)
+    # games without a result are left out
+    pgn = tmp_path / "unfinished.pgn"
+    pgn.write_text('[Result "*"]\n\n1. e4 e5 *\n')
+    assert build_book([str(pgn)], path) == (0, 0, 0)
+    # a game with a move that can't be played is skipped, without its moves before that one
+    pgn.write_text('[Result "1-0"]\n\n1. e4 e5 2. Ke3 1-0\n\n[Result "0-1"]\n\n1. d4 d5 0-1\n')
+    assert build_book([str(pgn)], path) == (1, 1, 2)
+    with OpeningBook(path) as book:
+        assert [code for code, _ in book.moves(Board())] == [uci_code(Board(), "d2d4")]
+
+
+def test_empty_and_bad_books(tmp_path):
+    path = tmp_path / "empty.bin"
+    path.write_bytes(MAGIC)
+    with OpeningBook(str(path)) as book:
+        assert len(book) == 0
+        assert book.entries(Board().get_hash()) == []
+        assert book.choose(Board()) is None
+    path.write_bytes(MAGIC + bytes(ENTRY_SIZE - 1))
+    with pytest.raises(ValueError):
+        OpeningBook(str(path))
+    # files without the header, e.g. Polyglot books from other programs
+    for data in (b"", ENTRY.pack(Board().get_hash(), (12 << 6) | 28, 1, 0)):
+        path.write_bytes(data)
+        with pytest.raises(ValueError):
+            OpeningBook(str(path))
+
+
+def test_choose(tmp_path):
+    board = Board()
+    key = board.get_hash()
+    e2e4 = uci_code(board, "e2e4")
+    d2d4 = uci_code(board, "d2d4")
+    path = tmp_path / "book.bin"
+    # a move that is not legal, e.g. from a hash collision, is skipped
+    path.write_bytes(MAGIC +
+                     ENTRY.pack(key - 1, encode_book_move(e2e4), 9, 0) +
+                     ENTRY.pack(key, (12 << 6) | 36, 5, 0) +
+                     ENTRY.pack(key, encode_book_move(e2e4), 3, (2 << 16) | 1) +
+                     ENTRY.pack(key, encode_book_move(d2d4), 1, 0) +
+                     ENTRY.pack(key + 1, encode_book_move(d2d4), 9, 0))
+    with OpeningBook(str(path)) as book:
+        assert len(book.entries(key)) == 3
+        moves = book.moves(board)
+        assert [code for code, _ in moves] == [e2e4, d2d4]
+        assert moves[0][1].wins == 2 and moves[0][1].draws == 0 and moves[0][1].losses == 1
+        assert book.choose(board) == e2e4
+        rng = random.Random(1)
+        assert set(book.choose(board, rng) for _ in range(50)) == {e2e4, d2d4}
+
+
+def test_find_best_move(book_path):
+    with OpeningBook(book_path) as book:
+        stats = {}  # type: dict
+        score, moves = find_best_move(Board(), WHITE, 3, stats_dict=stats, book=book)
+        assert stats["book"] and stats["nodes_explored"] == 0
+        assert (score, moves[0].code) == (0, uci_code(Board(), "e2e4"))
+        # out of the book the search runs as usual
+        board = fen_to_board("4k3/8/8/8/8/8/8/R3K3 w Q - 0 1")
+        stats = {}
+        score, moves = find_best_move(board, WHITE, 2, stats_dict=stats, horizon=STATIC, book=book)
+        assert not stats["book"] and stats["nodes_explored"] > 0
+        assert moves
+
+
+def test_find_mate_in_n(tmp_path):
+    board = fen_to_board("r5rk/5p1p/5R2/4B3/8/8/7P/7K w")
+    for search in (NEGAMAX, MINIMAX):
+        expected_stats = {}  # type: dict
+        expected = find_mate_in_n(board, WHITE, 3, stats_dict=expected_stats, search=search)
+        # the book move is only searched first, so even a move that doesn't mate gives the same result
+        for uci in ("f6a6", "h2h3"):
+            path = tmp_path / "book.bin"
+            path.write_bytes(MAGIC + ENTRY.pack(board.get_hash(), encode_book_move(uci_code(board, uci)), 1, 0))
+            with OpeningBook(str(path)) as book:
+                stats = {}  # type: dict
+                score, moves = find_mate_in_n(board, WHITE, 3, stats_dict=stats, search=search, book=book)
+                assert stats["book"]
+                assert (score, [move.code for move in moves]) == (expected[0], [move.code for move in expected[1]])
+                if uci == "f6a6":
+                    assert stats["nodes_explored"] < expected_stats["nodes_explored"]
+    with OpeningBook(str(path)) as book:
+        with pytest.raises(ValueError):
+            find_mate_in_n(board, WHITE, 3, search=DFPN, book=book)
+        with pytest.raises(ValueError):
+            find_mate_in_n(board, WHITE, 3, workers=2, book=book)
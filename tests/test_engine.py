@@ -4,12 +4,18 @@ Some of the puzzles are fetched from here: http://wtharvey.com/m8n4.txt
 
 import unittest as T
 
-from chess_engine.core.board import (ROOK, WHITE,
-                                     index_to_sq, load_board,
+from chess_engine.core.board import (BLACK, ROOK, WHITE, Board,
+                                     fen_to_board, index_to_sq, load_board,
                                      sq_to_index)
-from chess_engine.core.move import Move
-from chess_engine.engine import (MIN, dls_minimax,
-                                 gen_all_moves, score_move)
+from chess_engine.core.move import Move, encode_move
+from chess_engine.core.piece_movement_rules import (_has_no_legal_moves,
+                                                    is_in_check)
+from chess_engine.core.utils import get_opposite_color
+from chess_engine.engine import (CHECKMATE, MIN, MINIMAX, NEGAMAX,
+                                 QUIESCENCE, STATIC, NegamaxSearch,
+                                 dls_minimax, evaluate, find_best_move,
+                                 find_mate_in_n, gen_all_moves,
+                                 quiescence_search, score_move)
 
 
 
@@ -62,6 +68,12 @@ class MoveOrderingTest(T.TestCase):
 
         assert win_move_index < idle_move_index
 
+    def test_captures_by_exchange(self):
+        board = fen_to_board("4k3/8/2p5/3n2b1/8/8/8/K2Q2R1 w")
+        scores = {index_to_sq(m.src) + index_to_sq(m.dest): score_move(board, m) for m in gen_all_moves(board, WHITE)}
+        # taking the free bishop goes first, and the queen lost for a knight goes after the quiet moves
+        assert scores["g1g5"] > scores["d1d2"] > scores["d1d5"]
+
 
 class PositionRankingTest(T.TestCase):
     def test_not_lose_immediately(self):
@@ -83,3 +95,116 @@ class PositionRankingTest(T.TestCase):
         assert move_list[0].src == sq_to_index("e8")
         assert move_list[0].dest == sq_to_index("f8")
 
+
+
+class NegamaxTest(T.TestCase):
+    FENS = [
+        "1r6/4b2k/1q1pNrpp/p2Pp3/4P3/1P1R3Q/5PPP/5RK1 w",
+        "r1b1r1k1/1pq1bp1p/p3pBp1/3pR3/7Q/2PB4/PP3PPP/5RK1 w",
+        "r5rk/5p1p/5R2/4B3/8/8/7P/7K w",
+        "5B2/6P1/1p6/8/1N6/kP6/2K5/8 w",
+    ]
+
+    def assert_mating_line(self, board: Board, color, moves):
+        board = Board(board)
+        for move in moves:
+            assert encode_move(move) in [encode_move(m) for m in gen_all_moves(board, color)]
+            board.make_move(move)
+            color = get_opposite_color(color)
+        assert is_in_check(board, color)
+        assert _has_no_legal_moves(board, color)
+
+    def test_same_mates_as_minimax(self):
+        for fen in self.FENS:
+            board = fen_to_board(fen)
+            expected, expected_moves = find_mate_in_n(board, WHITE, 3, search=MINIMAX)
+            result, moves = find_mate_in_n(board, WHITE, 3, search=NEGAMAX)
+            assert result == expected == CHECKMATE
+            assert len(moves) == len(expected_moves)
+            self.assert_mating_line(board, WHITE, moves)
+
+    def test_mate_for_black(self):
+        board = fen_to_board("r6k/8/8/8/8/8/6PP/7K b")
+        result, moves = find_mate_in_n(board, BLACK, 1)
+        assert result == CHECKMATE
+        self.assert_mating_line(board, BLACK, moves)
+
+    def test_killers_and_history(self):
+        board = fen_to_board(self.FENS[1])
+        negamax = NegamaxSearch(5)
+        score, moves = negamax.search(board, WHITE, 5)
+        assert score >= CHECKMATE - 5
+        assert len(moves) == 5
+        assert any(killer for killers in negamax.killers for killer in killers)
+        assert any(negamax.history)
+
+    def test_unknown_search(self):
+        with self.assertRaises(ValueError):
+            find_mate_in_n(Board(), WHITE, 1, search="mcts")
+
+
+class QuiescenceTest(T.TestCase):
+    # the knight is defended by the pawn, so taking it loses the queen
+    DEFENDED = "4k3/8/4p3/3n4/8/8/8/3QK3 w"
+    HANGING = "4k3/8/8/3n4/8/8/8/3QK3 w"
+
+    def test_stand_pat(self):
+        # nothing to capture, so the score is the evaluation
+        board = fen_to_board("4k3/8/8/8/8/8/4P3/4K3 w")
+        assert quiescence_search(board, WHITE, -CHECKMATE, CHECKMATE) == evaluate(board, WHITE)
+        assert quiescence_search(board, BLACK, -CHECKMATE, CHECKMATE) == evaluate(board, BLACK)
+
+    def test_captures_are_played_out(self):
+        board = fen_to_board(self.HANGING)
+        assert quiescence_search(board, WHITE, -CHECKMATE, CHECKMATE) > evaluate(board, WHITE) + 250
+        # taking the defended knight loses more than it wins, so white stands pat
+        board = fen_to_board(self.DEFENDED)
+        assert quiescence_search(board, WHITE, -CHECKMATE, CHECKMATE) == evaluate(board, WHITE)
+        # the board is left as it was
+        assert board == fen_to_board(self.DEFENDED)
+
+    def test_delta_pruning(self):
+        # far below alpha, winning a pawn can't help, so no capture is searched
+        board = fen_to_board("4k3/8/8/3p4/8/8/8/3QK3 w")
+        stats = {"nodes_explored": 0}
+        quiescence_search(board, WHITE, 5000, 5001, stats_dict=stats)
+        assert stats["nodes_explored"] == 1
+
+    def test_mated_in_quiescence(self):
+        # in check every evasion is searched, and there are none
+        board = fen_to_board("R5k1/5ppp/8/8/8/8/8/6K1 b")
+        assert quiescence_search(board, BLACK, -CHECKMATE - 1, CHECKMATE + 1) == -CHECKMATE
+
+    def test_horizon(self):
+        board = fen_to_board(self.DEFENDED)
+        for search in [NEGAMAX, MINIMAX]:
+            # with the static evaluation at the horizon, the queen takes the knight
+            _, moves = find_best_move(board, WHITE, 1, search=search, horizon=STATIC)
+            assert moves[0].uci() == "d1d5"
+            # the quiescence search sees the pawn taking back
+            scores = []
+            for depth in [1, 2, 3]:
+                score, moves = find_best_move(board, WHITE, depth, search=search, horizon=QUIESCENCE)
+                assert moves[0].uci() != "d1d5"
+                scores.append(score)
+            assert all(abs(score - scores[0]) < 50 for score in scores)
+            _, moves = find_best_move(fen_to_board(self.HANGING), WHITE, 1, search=search)
+            assert moves[0].uci() == "d1d5"
+
+    def test_same_score_for_both_searches(self):
+        board = fen_to_board("r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq -")
+        for depth in [1, 2]:
+            negamax_score, _ = find_best_move(board, WHITE, depth, search=NEGAMAX)
+            minimax_score, _ = find_best_move(board, WHITE, depth, search=MINIMAX)
+            assert negamax_score == minimax_score
+        board = fen_to_board("3qk3/8/8/3Q4/8/8/8/4K3 b")
+        negamax_score, negamax_moves = find_best_move(board, BLACK, 2, search=NEGAMAX)
+        minimax_score, minimax_moves = find_best_move(board, BLACK, 2, search=MINIMAX)
+        assert negamax_score == minimax_score > 0
+        assert negamax_moves[0].uci() == minimax_moves[0].uci() == "d8d5"
+
+    def test_finds_mates(self):
+        board = fen_to_board("6k1/5ppp/8/8/8/8/8/R5K1 w")
+        score, moves = find_best_move(board, WHITE, 3)
+        assert score == CHECKMATE
+        assert [move.uci() for move in moves] == ["a1a8"]
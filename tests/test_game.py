@@ -0,0 +1,96 @@
+import os
+
+import pytest
+
+from chess_engine import Game, IllegalMoveError, MoveError
+from chess_engine.core.board import BLACK, E, KING, KNIGHT, ROOK, WHITE, Board, sq_to_index
+from chess_engine.core.piece_movement_rules import gen_legal_moves
+from chess_engine.pgn import read_games, replay
+
+
+def test_apply_moves_scholars_mate(capsys):
+    game = Game()
+    assert game.apply_moves(["e2e4", "e7e5", "f1c4", "b8c6", "d1h5", "g8f6", "h5f7"]) == 7
+    assert game.is_in_checkmate(BLACK)
+    # nothing is printed
+    assert capsys.readouterr().out == ""
+
+
+def test_apply_moves_forms():
+    ucis = ["e2e4", "d7d5", "e4d5", "g8f6", "f1b5", "c7c6", "d5c6", "d8a5", "c6b7", "a5b5", "b7a8q"]
+    game = Game()
+    assert game.apply_moves(iter(ucis)) == 11
+    # (from, to, promotion) tuples, upper case promotions and Moves are read the same way
+    other = Game()
+    other.apply_moves([("e2", "e4", None), ("d7", "d5", "")] + ucis[2:-1] + [("b7", "a8", "Q")])
+    assert other._board == game._board
+    board = Board()
+    moves = []
+    for uci in ucis:
+        move = next(m for m in gen_legal_moves(board, board.get_turn()) if m.uci() == uci)
+        board.make_move(move)
+        moves.append(move)
+    other = Game()
+    other.apply_moves(moves)
+    assert other._board == game._board == board
+
+
+def test_apply_moves_special_moves():
+    game = Game()
+    # en passant, castling and an under-promotion
+    game.apply_moves(["e2e4", "d7d5", "e4e5", "f7f5", "e5f6", "e8f7", "g1f3", "b8c6", "f1c4", "c8e6",
+                      "e1g1", "d8d6", "f6g7", "a7a6", "g7h8n"])
+    board = game._board
+    assert board.get_turn() == BLACK
+    assert board[sq_to_index("f5")] == board[sq_to_index("f6")] == board[sq_to_index("e1")] == E
+    assert board[sq_to_index("g1")] == KING
+    assert board[sq_to_index("f1")] == ROOK
+    assert board[sq_to_index("h8")] == KNIGHT
+
+
+def test_apply_moves_illegal_ply():
+    game = Game()
+    with pytest.raises(IllegalMoveError) as info:
+        game.apply_moves(["e2e4", "e7e5", "e1e3", "d7d6"])
+    error = info.value
+    assert isinstance(error, MoveError)
+    assert error.ply == 3
+    assert error.move == "e1e3"
+    assert error.color == WHITE
+    assert error.reason == "illegal move"
+    # the moves before the illegal one stay played
+    expected = Game()
+    expected.apply_moves(["e2e4", "e7e5"])
+    assert game._board == expected._board
+
+
+@pytest.mark.parametrize("moves, ply, reason", [
+    (["e2e4", "e4e5"], 2, "the piece on e4 is not black's"),
+    (["e3e4"], 1, "no piece on e3"),
+    (["e2e9"], 1, "not a move"),
+    ([("e2", "e4", "K")], 1, "not a move"),
+    (["e2e4", "d7d5", "e4d5", "c7c6", "d5c6", "d8d7", "c6b7", "d7d6", "b7a8"], 9, "promotion piece missing"),
+    (["e2e4", "d7d5", "e4d5", "c7c6", "d5c6", "d8d7", "c6b7", "d7d6", "b7a8k"], 9, "not a move"),
+    (["e2e4", "e7e5", "e1g1"], 3, "illegal move"),
+])
+def test_apply_moves_errors(moves, ply, reason):
+    with pytest.raises(IllegalMoveError) as info:
+        Game().apply_moves(moves)
+    assert info.value.ply == ply
+    assert info.value.reason == reason
+
+
+def test_apply_moves_games():
+    # the games in data/, as UCI, give the same positions as the PGN replay
+    for name in sorted(name for name in os.listdir("data") if name.endswith(".pgn"))[:10]:
+        with open(os.path.join("data", name)) as fp:
+            pgn_game = next(read_games(fp))
+        if "FEN" in pgn_game.headers:
+            continue
+        ucis = []
+        board = None
+        for board, move in replay(pgn_game):
+            ucis.append(move.uci())
+        game = Game()
+        assert game.apply_moves(ucis) == len(ucis)
+        assert game._board == board, name
@@ -1,4 +1,6 @@
 import sys
+import tempfile
+import threading
 import unittest as T
 from typing import List
 
@@ -6,7 +8,10 @@ from chess_engine.core.board import (BISHOP, WHITE, Board, fen_to_board,
                                      index_to_sq, load_board, print_board,
                                      sq_to_index)
 from chess_engine.core.move import Move
-from chess_engine.engine import CHECKMATE, find_mate_in_n
+from chess_engine.core.piece_movement_rules import _has_no_legal_moves, gen_legal_moves, is_in_check
+from chess_engine.dfpn import INFINITY, ProofNumberSearch, ProofTable, node_key
+from chess_engine.engine import CHECKMATE, DFPN, MINIMAX, NEGAMAX, find_mate_in_n, iterative_deepening
+from chess_engine.pgn import read_games, replay
 
 
 def write_mate_result(board: Board, moves: List[Move], fp) -> None:
@@ -17,6 +22,8 @@ def write_mate_result(board: Board, moves: List[Move], fp) -> None:
         ))
 
 class MateInOneTest(T.TestCase):
+    SEARCH = NEGAMAX
+
     def test_simple_rook_mate_in_1(self):
         board = load_board([
             ["", "", "", "k", "", "", "", ""],
@@ -29,7 +36,7 @@ class MateInOneTest(T.TestCase):
             ["R", "", "", "", "", "", "", ""],
         ])
 
-        mate_result = find_mate_in_n(board, WHITE, 1)
+        mate_result = find_mate_in_n(board, WHITE, 1, search=self.SEARCH)
         assert mate_result[0] == CHECKMATE
         assert len(mate_result[1]) == 1
         winning_move = mate_result[1][0]
@@ -48,7 +55,7 @@ class MateInOneTest(T.TestCase):
             ["", "", "", "", "", "", "", ""],
             ["", "", "R", "", "", "", "", ""],
         ])
-        mate_result = find_mate_in_n(board, WHITE, 1)
+        mate_result = find_mate_in_n(board, WHITE, 1, search=self.SEARCH)
         assert mate_result[0] == 0
         assert len(mate_result[1]) == 1
 
@@ -63,7 +70,7 @@ class MateInOneTest(T.TestCase):
             ["", "", "", "", "", "", "", ""],
             ["", "", "", "", "", "", "", ""],
         ])
-        mate_result = find_mate_in_n(board, WHITE, 2)
+        mate_result = find_mate_in_n(board, WHITE, 2, search=self.SEARCH)
 
         assert mate_result[0] == CHECKMATE
 
@@ -78,7 +85,7 @@ class MateInOneTest(T.TestCase):
             ["", "P", "", "", "", "", "B", ""],
             [""] * 8,
         ])
-        result, mating_moves = find_mate_in_n(board, WHITE, 1)
+        result, mating_moves = find_mate_in_n(board, WHITE, 1, search=self.SEARCH)
         assert result == CHECKMATE
         write_mate_result(board, mating_moves, sys.stdout)
         assert len(mating_moves) == 1
@@ -88,10 +95,12 @@ class MateInOneTest(T.TestCase):
 
 
 class MateInTwoTest(T.TestCase):
+    SEARCH = NEGAMAX
+
     def test_mate_in_2_p1(self):
         fen = "1r6/4b2k/1q1pNrpp/p2Pp3/4P3/1P1R3Q/5PPP/5RK1 w"
         board = fen_to_board(fen)
-        result, mating_moves = find_mate_in_n(board, WHITE, 2)
+        result, mating_moves = find_mate_in_n(board, WHITE, 2, search=self.SEARCH)
         write_mate_result(board, mating_moves, sys.stdout)
         assert result == CHECKMATE
         assert len(mating_moves) == 3
@@ -99,26 +108,28 @@ class MateInTwoTest(T.TestCase):
     def test_mate_in_2_p2(self):
         fen = "3r1b1k/5Q1p/p2p1P2/5R2/4q2P/1P2P3/PB5K/8 w"
         board = fen_to_board(fen)
-        result, mating_moves = find_mate_in_n(board, WHITE, 2)
+        result, mating_moves = find_mate_in_n(board, WHITE, 2, search=self.SEARCH)
         assert result == CHECKMATE
         assert len(mating_moves) == 3
 
     def test_mate_in_2_p3(self):
         fen = "r1bq2r1/b4pk1/p1pp1p2/1p2pP2/1P2P1PB/3P4/1PPQ2P1/R3K2R w"
         board = fen_to_board(fen)
-        result, mating_moves = find_mate_in_n(board, WHITE, 2)
-        with open("mate.txt", "w") as fp:
+        result, mating_moves = find_mate_in_n(board, WHITE, 2, search=self.SEARCH)
+        with tempfile.TemporaryFile("w") as fp:
             write_mate_result(board, mating_moves, fp)
         assert result == CHECKMATE
         assert len(mating_moves) == 3
 
 
 class MateInThreeTest(T.TestCase):
+    SEARCH = NEGAMAX
+
     def assert_find_mate(self, fen: str):
         board = fen_to_board(fen)
         stats_dict = {}  # type: dict
-        result, mating_moves = find_mate_in_n(board, WHITE, 3, stats_dict=stats_dict)
-        with open("mate.txt", "w") as fp:
+        result, mating_moves = find_mate_in_n(board, WHITE, 3, stats_dict=stats_dict, search=self.SEARCH)
+        with tempfile.TemporaryFile("w") as fp:
            write_mate_result(board, mating_moves, fp)
         print(stats_dict)
         assert result == CHECKMATE
@@ -137,7 +148,7 @@ class MateInThreeTest(T.TestCase):
         is the same from the perspective of the engine
         """
         board = fen_to_board("r5rk/5p1p/5R2/4B3/8/8/7P/7K w")
-        result, mating_moves = find_mate_in_n(board, WHITE, 3)
+        result, mating_moves = find_mate_in_n(board, WHITE, 3, search=self.SEARCH)
         # with open("mate.txt", "w") as fp:
         # write_mate_result(board, mating_moves, fp)
         assert result == CHECKMATE
@@ -146,7 +157,7 @@ class MateInThreeTest(T.TestCase):
     def test_mate_in_2_p3(self):
         """This is a reworking of above into mate in 2"""
         board = fen_to_board("r5rk/7p/R4p2/4B3/8/8/7P/7K w")
-        result, mating_moves = find_mate_in_n(board, WHITE, 3)
+        result, mating_moves = find_mate_in_n(board, WHITE, 3, search=self.SEARCH)
         # with open("mate.txt", "w") as fp:
         #    write_mate_result(board, mating_moves, fp)
         assert result == CHECKMATE
@@ -157,12 +168,15 @@ class MateInThreeTest(T.TestCase):
 
 
 class MateInFourTest(T.TestCase):
+    SEARCH = NEGAMAX
+    MATE_IN_4 = "r5rk/2p1Nppp/3p3P/pp2p1P1/4P3/2qnPQK1/8/R6R w"
+
     def assert_find_mate_in_4(self, fen: str):
         board = fen_to_board(fen)
         stats_dict = {}  # type: dict
         print_board(board)
-        result, mating_moves = find_mate_in_n(board, WHITE, 4, stats_dict=stats_dict)
-        with open("mate.txt", "w") as fp:
+        result, mating_moves = find_mate_in_n(board, WHITE, 4, stats_dict=stats_dict, search=self.SEARCH)
+        with tempfile.TemporaryFile("w") as fp:
            write_mate_result(board, mating_moves, fp)
         print(stats_dict)
         assert result == CHECKMATE
@@ -172,8 +186,193 @@ class MateInFourTest(T.TestCase):
         """Puzzles taken from here:
         http://wtharvey.com/m8n4.txt
         """
-        self.assert_find_mate_in_4("r5rk/2p1Nppp/3p3P/pp2p1P1/4P3/2qnPQK1/8/R6R w")
+        self.assert_find_mate_in_4(self.MATE_IN_4)
+
+
+
+class IterativeDeepeningTest(T.TestCase):
+    MATE_IN_3 = "r1b1r1k1/1pq1bp1p/p3pBp1/3pR3/7Q/2PB4/PP3PPP/5RK1 w"
+
+    def test_shallow_mate_stops_early(self):
+        board = fen_to_board("r5rk/7p/R4p2/4B3/8/8/7P/7K w")
+        result, mating_moves, depth = iterative_deepening(board, WHITE, 4)
+        assert result == CHECKMATE
+        assert depth == 2
+        assert len(mating_moves) == 3
+
+    def test_node_limit(self):
+        board = fen_to_board(self.MATE_IN_3)
+        before = board.get_hash()
+        stats_dict = {}  # type: dict
+        result, mating_moves = find_mate_in_n(board, WHITE, 3, stats_dict=stats_dict, node_limit=50)
+        assert result != CHECKMATE
+        assert stats_dict["depth_completed"] < 3
+        assert stats_dict["nodes_explored"] <= 50
+        # the board given to the search is left alone
+        assert board.get_hash() == before
+        assert board == fen_to_board(self.MATE_IN_3)
+
+    def test_cancel(self):
+        board = fen_to_board(self.MATE_IN_3)
+        cancel = threading.Event()
+        cancel.set()
+        result, mating_moves, depth = iterative_deepening(board, WHITE, 3, cancel=cancel)
+        assert (result, mating_moves, depth) == (0, [], 0)
+
+    def test_time_limit(self):
+        board = fen_to_board(self.MATE_IN_3)
+        result, mating_moves, depth = iterative_deepening(board, WHITE, 3, time_limit=0)
+        assert depth == 0
+
+class DfpnMateInOneTest(MateInOneTest):
+    SEARCH = DFPN
+
+
+class DfpnMateInTwoTest(MateInTwoTest):
+    SEARCH = DFPN
+
+
+class DfpnMateInThreeTest(MateInThreeTest):
+    SEARCH = DFPN
+
+
+class DfpnMateInFourTest(MateInFourTest):
+    SEARCH = DFPN
+
+
+class ProofNumberSearchTest(T.TestCase):
+    MATE_IN_5 = "2q1nk1r/4Rp2/1ppp1P2/6Pp/3p1B2/3P3P/PPP1Q3/6K1 w"
+
+    def assert_mates(self, board: Board, color: bool, moves: List[Move]):
+        """The moves can be played on the board and end in a mate of the other color"""
+        board = Board(board)
+        for move in moves:
+            assert move.uci() in [m.uci() for m in gen_legal_moves(board, board.get_turn())]
+            board.make_move(move)
+        assert is_in_check(board, not color)
+        assert _has_no_legal_moves(board, not color)
+
+    def test_mate_in_5(self):
+        board = fen_to_board(self.MATE_IN_5)
+        stats_dict = {}  # type: dict
+        result, mating_moves = find_mate_in_n(board, WHITE, 5, stats_dict=stats_dict, search=DFPN)
+        assert result == CHECKMATE
+        assert len(mating_moves) == 9
+        self.assert_mates(board, WHITE, mating_moves)
+        assert stats_dict["depth_completed"] == 5
+        assert stats_dict["tt_stores"] > 0
+
+    def test_long_forced_mate(self):
+        # the last 6 moves of malinin_savinov_1988.pgn are a forced mate, every one of them a check
+        with open("data/weird-mates/malinin_savinov_1988.pgn") as fp:
+            game = next(read_games(fp))
+        boards = [Board(board) for board, _ in replay(game)]
+        board = boards[-12]
+        stats_dict = {}  # type: dict
+        result, mating_moves = find_mate_in_n(board, WHITE, 6, stats_dict=stats_dict, search=DFPN)
+        assert result == CHECKMATE
+        assert len(mating_moves) == 11
+        self.assert_mates(board, WHITE, mating_moves)
+        # the forcing line is proven without searching the quiet moves
+        assert stats_dict["nodes_explored"] < 1000
+
+    def test_no_mate(self):
+        board = fen_to_board(IterativeDeepeningTest.MATE_IN_3)
+        result, mating_moves = find_mate_in_n(board, WHITE, 2, search=DFPN)
+        assert result == 0
+        assert len(mating_moves) == 1
+
+    def test_small_table(self):
+        # entries are replaced once the table is full, which costs nodes but not the proof
+        table = ProofTable(0.001)
+        assert len(table) == 32
+        board = fen_to_board(self.MATE_IN_5)
+        search = ProofNumberSearch({"nodes_explored": 0}, table)
+        assert search.prove(board, WHITE, 5)
+        self.assert_mates(board, WHITE, search.mating_line(board, WHITE, 5))
+        assert table.collisions > 0
+        # the depth is part of the key
+        assert node_key(board, 4) != node_key(board, 5)
+        assert table.probe(node_key(board, 5))[:2] == (0, INFINITY)
+        table.clear()
+        assert table.probe(node_key(board, 5)) is None
+
+    def test_node_limit(self):
+        board = fen_to_board(self.MATE_IN_5)
+        stats_dict = {}  # type: dict
+        result, _ = find_mate_in_n(board, WHITE, 5, stats_dict=stats_dict, node_limit=5, search=DFPN)
+        assert result != CHECKMATE
+        assert stats_dict["depth_completed"] == 0
+        assert stats_dict["nodes_explored"] <= 5
+
+    def test_limit_reached_after_the_proof(self):
+        board = fen_to_board(self.MATE_IN_5)
+        proof_stats = {"nodes_explored": 0}
+        assert ProofNumberSearch(proof_stats, ProofTable(16)).prove(board, WHITE, 5)
+        # building the mating line searches more nodes than the proof did
+        stats_dict = {}  # type: dict
+        result, mating_moves = find_mate_in_n(board, WHITE, 5, stats_dict=stats_dict,
+                                              node_limit=proof_stats["nodes_explored"] + 1, search=DFPN)
+        assert result == CHECKMATE
+        assert stats_dict["depth_completed"] == 5
+        assert stats_dict["nodes_explored"] > proof_stats["nodes_explored"] + 1
+        self.assert_mates(board, WHITE, mating_moves)
+
+    def test_single_process(self):
+        board = fen_to_board(self.MATE_IN_5)
+        with self.assertRaises(ValueError):
+            find_mate_in_n(board, WHITE, 5, search=DFPN, workers=2)
+
+
+class ChecksOnlyTest(T.TestCase):
+    # every move of the mate in 5 is a check
+    MATE_IN_5 = ProofNumberSearchTest.MATE_IN_5
+    # the mate in 3 starts with a quiet under-promotion
+    QUIET_MATE_IN_3 = "5B2/6P1/1p6/8/1N6/kP6/2K5/8 w"
+
+    def test_checking_mate(self):
+        for search in [NEGAMAX, DFPN]:
+            board = fen_to_board(self.MATE_IN_5)
+            stats_dict = {}  # type: dict
+            result, mating_moves = find_mate_in_n(board, WHITE, 5, stats_dict=stats_dict, search=search,
+                                                  checks_only=True)
+            assert result == CHECKMATE, search
+            assert len(mating_moves) == 9, search
+            assert stats_dict["checks_only"], search
+
+    def test_fewer_nodes(self):
+        board = fen_to_board(MateInFourTest.MATE_IN_4)
+        full_stats = {}  # type: dict
+        find_mate_in_n(board, WHITE, 4, stats_dict=full_stats)
+        checks_stats = {}  # type: dict
+        find_mate_in_n(board, WHITE, 4, stats_dict=checks_stats, checks_only=True)
+        assert checks_stats["checks_only"]
+        assert checks_stats["nodes_explored"] * 5 < full_stats["nodes_explored"]
+
+    def test_falls_back_to_every_move(self):
+        for search in [NEGAMAX, DFPN]:
+            board = fen_to_board(self.QUIET_MATE_IN_3)
+            stats_dict = {}  # type: dict
+            result, mating_moves = find_mate_in_n(board, WHITE, 3, stats_dict=stats_dict, search=search,
+                                                  checks_only=True)
+            assert result == CHECKMATE, search
+            assert mating_moves[0].uci() == "g7g8n", search
+            assert not stats_dict["checks_only"], search
+
+    def test_limits_stop_before_the_fallback(self):
+        board = fen_to_board(self.QUIET_MATE_IN_3)
+        stats_dict = {}  # type: dict
+        result, _ = find_mate_in_n(board, WHITE, 3, stats_dict=stats_dict, checks_only=True, node_limit=10)
+        assert result != CHECKMATE
+        assert stats_dict["checks_only"]
+        assert stats_dict["nodes_explored"] <= 10
 
+    def test_unsupported(self):
+        board = fen_to_board(self.MATE_IN_5)
+        with self.assertRaises(ValueError):
+            find_mate_in_n(board, WHITE, 5, search=MINIMAX, checks_only=True)
+        with self.assertRaises(ValueError):
+            find_mate_in_n(board, WHITE, 5, workers=2, checks_only=True)
 
 
 # class MateInFiveTest(T.TestCase):
@@ -0,0 +1,98 @@
+import unittest as T
+
+from chess_engine.core.board import BLACK, WHITE, Board, fen_to_board
+from chess_engine.core.move import encode_move
+from chess_engine.core.piece_movement_rules import _has_no_legal_moves, is_in_check
+from chess_engine.core.utils import get_opposite_color
+from chess_engine.engine import (CHECKMATE, LAZY_SMP, MINIMAX, NEGAMAX,
+                                 NegamaxSearch, find_mate_in_n, gen_all_moves)
+from chess_engine.parallel import (lazy_smp_iterative_deepening,
+                                   parallel_iterative_deepening)
+
+
+class ParallelSearchTest(T.TestCase):
+    FENS = [
+        ("r5rk/5p1p/5R2/4B3/8/8/7P/7K w", 3),
+        ("5B2/6P1/1p6/8/1N6/kP6/2K5/8 w", 3),
+        ("r5rk/7p/R4p2/4B3/8/8/7P/7K w", 3),
+    ]
+
+    def assert_mating_line(self, board: Board, color, moves):
+        board = Board(board)
+        for move in moves:
+            assert encode_move(move) in [encode_move(m) for m in gen_all_moves(board, color)]
+            board.make_move(move)
+            color = get_opposite_color(color)
+        assert is_in_check(board, color)
+        assert _has_no_legal_moves(board, color)
+
+    def test_same_mates_as_serial(self):
+        for fen, n in self.FENS:
+            board = fen_to_board(fen)
+            expected, expected_moves = find_mate_in_n(board, WHITE, n)
+            stats = {}  # type: dict
+            score, moves = find_mate_in_n(board, WHITE, n, stats_dict=stats, workers=2)
+            assert score == expected == CHECKMATE
+            assert len(moves) == len(expected_moves)
+            self.assert_mating_line(board, WHITE, moves)
+            assert 0 < len(stats["worker_nodes"]) <= 2
+            assert sum(stats["worker_nodes"]) == stats["nodes_explored"]
+
+    def test_mate_for_black(self):
+        board = fen_to_board("r6k/8/8/8/8/8/6PP/7K b")
+        score, moves, depth = parallel_iterative_deepening(board, BLACK, 2, workers=2)
+        assert score == CHECKMATE
+        assert depth == 1
+        self.assert_mating_line(board, BLACK, moves)
+
+    def test_no_mate(self):
+        board = fen_to_board("4k3/8/8/8/8/8/8/4K3 w")
+        stats = {}  # type: dict
+        score, moves, depth = parallel_iterative_deepening(board, WHITE, 2, workers=2, stats_dict=stats)
+        assert score == 0
+        assert depth == 2
+        assert stats["depth_completed"] == 2
+
+    def test_only_negamax(self):
+        with self.assertRaises(ValueError):
+            find_mate_in_n(fen_to_board(self.FENS[0][0]), WHITE, 2, search=MINIMAX, workers=2)
+
+
+class LazySMPTest(T.TestCase):
+    FENS = ParallelSearchTest.FENS
+    assert_mating_line = ParallelSearchTest.assert_mating_line
+
+    def test_same_mates_as_serial(self):
+        for search in [NEGAMAX, MINIMAX]:
+            for fen, n in self.FENS:
+                board = fen_to_board(fen)
+                expected, expected_moves = find_mate_in_n(board, WHITE, n, search=search)
+                stats = {}  # type: dict
+                score, moves = find_mate_in_n(board, WHITE, n, stats_dict=stats, workers=2, parallel=LAZY_SMP,
+                                              search=search)
+                assert score == expected == CHECKMATE
+                assert len(moves) == len(expected_moves)
+                self.assert_mating_line(board, WHITE, moves)
+                assert len(stats["worker_nodes"]) == 2
+                assert stats["tt_stores"] > 0
+
+    def test_mate_for_black(self):
+        board = fen_to_board("r6k/8/8/8/8/8/6PP/7K b")
+        score, moves, depth = lazy_smp_iterative_deepening(board, BLACK, 2, workers=2)
+        assert score == CHECKMATE
+        assert depth == 1
+        self.assert_mating_line(board, BLACK, moves)
+
+    def test_no_mate(self):
+        board = fen_to_board("4k3/8/8/8/8/8/8/4K3 w")
+        score, moves, depth = lazy_smp_iterative_deepening(board, WHITE, 2, workers=2)
+        assert score == 0
+        assert depth == 2
+
+    def test_unknown_parallel_search(self):
+        with self.assertRaises(ValueError):
+            find_mate_in_n(fen_to_board(self.FENS[0][0]), WHITE, 2, workers=2, parallel="threads")
+
+    def test_seeded_orders_differ(self):
+        assert NegamaxSearch(3).history == NegamaxSearch(3).history
+        assert NegamaxSearch(3, seed=1).history != NegamaxSearch(3, seed=2).history
@@ -0,0 +1,69 @@
+import unittest as T
+
+from chess_engine.core.board import fen_to_board
+from chess_engine.core.piece_movement_rules import (BACKENDS, get_backend,
+                                                    set_backend)
+from chess_engine.perft import (PERFT_POSITIONS, PerftTable, divide,
+                                parallel_divide, perft)
+
+
+class PerftTest(T.TestCase):
+    def setUp(self):
+        self.backend = get_backend()
+
+    def tearDown(self):
+        set_backend(self.backend)
+
+    def test_reference_positions(self):
+        for backend in BACKENDS:
+            set_backend(backend)
+            for position in PERFT_POSITIONS:
+                board = fen_to_board(position.fen)
+                for depth in [1, 2]:
+                    assert perft(board, depth) == position.counts[depth], (backend, position.name, depth)
+
+    def test_reference_positions_depth_3(self):
+        # the positions with the fewest nodes at depth 3
+        for name in ["start", "position 3", "position 4"]:
+            position = next(p for p in PERFT_POSITIONS if p.name == name)
+            assert perft(fen_to_board(position.fen), 3) == position.counts[3], name
+
+    def test_divide(self):
+        position = PERFT_POSITIONS[1]
+        board = fen_to_board(position.fen)
+        result = divide(board, 2)
+        assert len(result) == position.counts[1]
+        assert sum(count for _, count in result) == position.counts[2]
+        # the board is left as it was
+        assert board == fen_to_board(position.fen)
+
+    def test_hashed_perft(self):
+        table = PerftTable(1)
+        position = PERFT_POSITIONS[2]
+        board = fen_to_board(position.fen)
+        assert perft(board, 3, table=table) == position.counts[3]
+        assert table.hits == 0
+        # the second time the count comes from the table
+        assert perft(board, 3, table=table) == position.counts[3]
+        assert table.hits == 1
+        # counts are cached by depth as well as position
+        assert perft(board, 2, table=table) == position.counts[2]
+        assert perft(board, 4, table=table) == position.counts[4]
+
+    def test_perft_table_replaces(self):
+        table = PerftTable(0.001)
+        table.put(5, 2, 100)
+        assert table.get(5, 2) == 100
+        assert table.get(5, 3) == -1
+        table.put(5 + len(table), 2, 7)
+        assert table.get(5, 2) == -1
+        assert table.get(5 + len(table), 2) == 7
+
+    def test_parallel_divide(self):
+        position = PERFT_POSITIONS[3]
+        board = fen_to_board(position.fen)
+        expected = [count for _, count in divide(board, 3)]
+        for split_ply in [1, 2]:
+            result = parallel_divide(board, 3, workers=2, table_mb=1, split_ply=split_ply)
+            assert [count for _, count in result] == expected
+        assert sum(expected) == position.counts[3]
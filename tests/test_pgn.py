@@ -0,0 +1,117 @@
+import os
+
+import pytest
+
+from chess_engine.core.board import (BLACK, WHITE, Board, fen_to_board,
+                                     index_to_sq, sq_to_index)
+from chess_engine.core.move import decode_move
+from chess_engine.core.piece_movement_rules import is_in_checkmate
+from chess_engine.pgn import (PgnError, parse_san, pgn_paths, read_games,
+                              replay)
+
+PGN = """[Event "First"]
+[White "A"]
+[Black "B \\"the second\\""]
+[Result "1-0"]
+
+1. e4 {a comment
+over two lines} e5 2. Nf3 (2. f4 exf4 (2... d5) 3. Nf3) 2... Nc6 $1 3. Bc4; to the end of the line
+3... Nd4?! 4. Nxe5 Qg5 5. Nxf7 Qxg2 6. Rf1 Qxe4+ 7. Be2 Nf3# 0-1
+
+% an escaped line
+[Event "Second"]
+[FEN "4k3/8/8/8/8/8/8/R3K3 w Q - 0 1"]
+
+1. O-O-O Kf7 *
+"""
+
+
+def san_to_uci(fen: str, san: str) -> str:
+    board = fen_to_board(fen)
+    move = decode_move(board, parse_san(board, san))
+    return move.uci()
+
+
+def test_read_games():
+    games = list(read_games(PGN.splitlines(keepends=True)))
+    assert len(games) == 2
+    first, second = games
+    assert first.headers["White"] == "A"
+    assert first.headers["Black"] == 'B "the second"'
+    assert first.moves == ["e4", "e5", "Nf3", "Nc6", "Bc4", "Nd4", "Nxe5", "Qg5", "Nxf7", "Qxg2", "Rf1", "Qxe4",
+                           "Be2", "Nf3"]
+    assert first.result == "0-1"
+    assert second.moves == ["O-O-O", "Kf7"]
+    assert second.result == "*"
+
+
+def test_castling_with_zeros():
+    pgn = "1. e4 e5 2. Nf3 Nc6 3. Bc4 Bc5 4. 0-0 Nf6 5. d3 d6 6. Be3 Be6 7. Nc3 Qd7 8. a3 0-0-0! 0-1"
+    game, = read_games([pgn])
+    assert game.moves[6:] == ["0-0", "Nf6", "d3", "d6", "Be3", "Be6", "Nc3", "Qd7", "a3", "0-0-0"]
+    assert game.result == "0-1"
+    boards = [Board(board) for board, _ in replay(game)]
+    assert boards[6][sq_to_index("g1")] == "K" and boards[6][sq_to_index("f1")] == "R"
+    assert boards[-1][sq_to_index("c8")] == "k" and boards[-1][sq_to_index("d8")] == "r"
+
+
+def test_games_are_streamed():
+    lines_read = []
+
+    def lines():
+        for line in (PGN * 3).splitlines(keepends=True):
+            lines_read.append(line)
+            yield line
+
+    games = read_games(lines())
+    next(games)
+    assert len(lines_read) < len(PGN.splitlines())
+
+
+def test_replay():
+    first, second = read_games(PGN.splitlines(keepends=True))
+    positions = list(replay(first))
+    assert len(positions) == 14
+    board, move = positions[-1]
+    assert move.uci() == "d4f3"
+    assert is_in_checkmate(board, WHITE)
+    board, move = list(replay(second))[0]
+    assert move.is_castle
+    assert index_to_sq(move.dest) == "c1"
+
+
+def test_parse_san():
+    start = Board()
+    assert san_to_uci("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq -", "Nf3") == "g1f3"
+    # disambiguation by file and by rank
+    assert san_to_uci("8/4k3/8/8/8/8/4K3/R6R w - -", "Rhd1") == "h1d1"
+    assert san_to_uci("4k3/8/8/R7/8/8/8/R3K3 w - -", "R1a3") == "a1a3"
+    # only one of the knights can move, the other is pinned
+    assert san_to_uci("4k3/4r3/8/1N6/8/8/4N3/4K3 w - -", "Nd4") == "b5d4"
+    assert san_to_uci("4k3/8/8/3pP3/8/8/8/4K3 w - d6", "exd6") == "e5d6"
+    assert san_to_uci("8/1P5k/8/8/8/8/8/K7 w - -", "b8=N") == "b7b8n"
+    assert san_to_uci("r3k3/8/8/8/8/8/8/4K3 b q -", "O-O-O") == "e8c8"
+    with pytest.raises(PgnError):
+        parse_san(start, "Nd4")
+    with pytest.raises(PgnError):
+        parse_san(fen_to_board("8/4k3/8/8/8/8/4K3/R6R w - -"), "Rd1")
+
+
+def test_data_games_match_python_chess():
+    chess_pgn = pytest.importorskip("chess.pgn")
+    for path in pgn_paths(["data"]):
+        with open(path) as fp:
+            expected = chess_pgn.read_game(fp)
+        with open(path) as fp:
+            game = next(read_games(fp))
+        assert [move.uci() for _, move in replay(game)] == [move.uci() for move in expected.mainline_moves()], path
+
+
+def test_data_results():
+    for fname, color in [("alekhine_nn_1915.pgn", BLACK), ("fischer_greenblatt_1977.pgn", BLACK)]:
+        with open(os.path.join("data", fname)) as fp:
+            game = next(read_games(fp))
+        board = None
+        for board, _ in replay(game):
+            pass
+        assert is_in_checkmate(board, color)
@@ -0,0 +1,96 @@
+import io
+import json
+import os
+import tempfile
+import unittest as T
+
+from chess_engine.book import ENTRY, MAGIC, encode_book_move
+from chess_engine.core.board import fen_to_board, sq_to_index
+from chess_engine.core.move import build_move_code
+from chess_engine.solve import (ERROR, SOLVED, TIMEOUT, UNSOLVED, Puzzle,
+                                parse_puzzle, solve_puzzle, solve_stream)
+
+PUZZLES = [
+    'r5rk/5p1p/5R2/4B3/8/8/7P/7K w - - dm 3; id "rook lift";',
+    "r1b1r1k1/1pq1bp1p/p3pBp1/3pR3/7Q/2PB4/PP3PPP/5RK1 w - - 0 1 mate in 3",
+    "",
+    "4k3/8/8/8/8/8/8/4K3 w - - 0 1",
+    "not a position",
+    "r6k/8/8/8/8/8/6PP/7K b #1",
+]
+
+
+class ParsePuzzleTest(T.TestCase):
+    def test_epd(self):
+        puzzle = parse_puzzle(PUZZLES[0], 1, 5)
+        assert puzzle == Puzzle(1, "rook lift", "r5rk/5p1p/5R2/4B3/8/8/7P/7K w - -", 3)
+
+    def test_fen_with_annotation(self):
+        puzzle = parse_puzzle(PUZZLES[1], 2, 5)
+        assert puzzle.n == 3
+        assert puzzle.id == "2"
+        assert fen_to_board(puzzle.fen) == fen_to_board("r1b1r1k1/1pq1bp1p/p3pBp1/3pR3/7Q/2PB4/PP3PPP/5RK1 w - - 0 1")
+        assert parse_puzzle(PUZZLES[5], 6, 5).n == 1
+
+    def test_default_n(self):
+        assert parse_puzzle(PUZZLES[3], 4, 5).n == 5
+
+    def test_skipped_and_bad_lines(self):
+        assert parse_puzzle("", 1, 3) is None
+        assert parse_puzzle("# comment", 1, 3) is None
+        with self.assertRaises(ValueError):
+            parse_puzzle(PUZZLES[4], 5, 3)
+
+
+class SolveTest(T.TestCase):
+    def results(self, out: io.StringIO) -> list:
+        return [json.loads(line) for line in out.getvalue().splitlines()]
+
+    def test_solve_puzzle(self):
+        result = solve_puzzle(parse_puzzle(PUZZLES[0], 1, 3))
+        assert result["status"] == SOLVED
+        assert result["moves"] == ["f6a6", "f7f6", "e5f6", "g8g7", "a6a8"]
+        result = solve_puzzle(parse_puzzle(PUZZLES[0], 1, 3), node_limit=50)
+        assert result["status"] == TIMEOUT
+
+    def test_solve_puzzle_with_book(self):
+        puzzle = parse_puzzle(PUZZLES[0], 1, 3)
+        board = fen_to_board(puzzle.fen)
+        move = encode_book_move(build_move_code(board, sq_to_index("f6"), sq_to_index("a6")))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "book.bin")
+            with open(path, "wb") as fp:
+                fp.write(MAGIC + ENTRY.pack(board.get_hash(), move, 1, 0))
+            result = solve_puzzle(puzzle, book_path=path)
+        expected = solve_puzzle(puzzle)
+        assert result["status"] == SOLVED
+        assert result["moves"] == expected["moves"]
+        assert result["nodes"] < expected["nodes"]
+
+    def test_stream_in_order(self):
+        for workers in [1, 2]:
+            out = io.StringIO()
+            counts = solve_stream(PUZZLES, out, default_n=2, workers=workers)
+            results = self.results(out)
+            assert [r["line"] for r in results] == [1, 2, 4, 5, 6]
+            assert [r["status"] for r in results] == [SOLVED, SOLVED, UNSOLVED, ERROR, SOLVED]
+            assert counts[SOLVED] == 3
+            assert counts["positions"] == 5
+
+    def test_input_is_read_lazily(self):
+        lines_read = []
+
+        def lines():
+            for line in PUZZLES * 3:
+                lines_read.append(line)
+                yield line
+
+        class Output(io.StringIO):
+            def write(self, text):
+                # lines read but not written: the window, the line waiting for room in it and the blank lines
+                assert len(lines_read) - len(self.getvalue().splitlines()) <= 2 + 1 + 3
+                return super().write(text)
+
+        out = Output()
+        solve_stream(lines(), out, default_n=1, workers=2, window=2)
+        assert len(self.results(out)) == 15
@@ -0,0 +1,154 @@
+import pickle
+import unittest as T
+
+from chess_engine.core.board import WHITE, fen_to_board
+from chess_engine.engine import (CHECKMATE, MATE_THRESHOLD, find_mate_in_n,
+                                 iterative_deepening)
+from chess_engine.transposition import (EXACT, LOWER, UPPER,
+                                        SharedTranspositionTable,
+                                        TranspositionTable, score_from_tt,
+                                        score_to_tt)
+
+
+class TranspositionTableTest(T.TestCase):
+    def test_probe_after_store(self):
+        tt = TranspositionTable(0.01)
+        tt.store(12345, 3, 7, EXACT, 99)
+        assert tt.probe(12345) == (3, 7, EXACT, 99)
+        assert tt.probe(54321) is None
+        assert tt.hits == 1
+        assert tt.misses == 1
+
+    def test_keeps_best_move_without_new_move(self):
+        tt = TranspositionTable(0.01)
+        tt.store(12345, 3, 7, LOWER, 99)
+        tt.store(12345, 5, 2, UPPER)
+        assert tt.probe(12345) == (5, 2, UPPER, 99)
+
+    def test_replacement(self):
+        tt = TranspositionTable(0.01)
+        # three keys that fall in the same bucket
+        size = len(tt) // 2
+        a, b, c = 1, 1 + size, 1 + 2 * size
+        tt.store(a, 5, 0, EXACT)
+        # shallower entry goes to the always-replace slot
+        tt.store(b, 2, 0, EXACT)
+        assert tt.probe(a) is not None
+        assert tt.probe(b) is not None
+        tt.store(c, 1, 0, EXACT)
+        assert tt.probe(a) is not None
+        assert tt.probe(b) is None
+        # deeper entry takes the depth-preferred slot, the old one is demoted
+        tt.store(b, 6, 0, EXACT)
+        assert tt.probe(b) == (6, 0, EXACT, 0)
+        assert tt.probe(a) == (5, 0, EXACT, 0)
+        assert tt.probe(c) is None
+
+    def test_clear(self):
+        tt = TranspositionTable(0.01)
+        tt.store(12345, 3, 7, EXACT, 99)
+        tt.store(12345 + len(tt) // 2, 2, 1, LOWER, 5)
+        tt.clear()
+        assert tt.probe(12345) is None
+        assert tt.probe(12345 + len(tt) // 2) is None
+        assert tt.stores == 2
+        # an entry stored after the clear doesn't pick up the old move
+        tt.store(12345, 1, 0, UPPER)
+        assert tt.probe(12345) == (1, 0, UPPER, 0)
+
+    def test_mate_scores_are_relative_to_position(self):
+        score = CHECKMATE - 5
+        stored = score_to_tt(score, 2, MATE_THRESHOLD)
+        assert stored == CHECKMATE - 3
+        assert score_from_tt(stored, 4, MATE_THRESHOLD) == CHECKMATE - 7
+        assert score_from_tt(score_to_tt(-score, 2, MATE_THRESHOLD), 4, MATE_THRESHOLD) == -CHECKMATE + 7
+        assert score_to_tt(3, 2, MATE_THRESHOLD) == 3
+
+    def test_search_stats(self):
+        board = fen_to_board("r5rk/5p1p/5R2/4B3/8/8/7P/7K w")
+        stats = {}
+        score, moves = find_mate_in_n(board, WHITE, 3, stats_dict=stats)
+        assert score == CHECKMATE
+        for key in ["tt_hits", "tt_misses", "tt_stores", "tt_collisions"]:
+            assert key in stats
+        assert stats["tt_stores"] > 0
+
+
+class SharedTranspositionTableTest(T.TestCase):
+    def setUp(self):
+        self.tt = SharedTranspositionTable(0.01)
+
+    def tearDown(self):
+        self.tt.close()
+        self.tt.unlink()
+
+    def test_probe_after_store(self):
+        tt = self.tt
+        tt.store(12345, 3, -7, UPPER, 99)
+        assert tt.probe(12345) == (3, -7, UPPER, 99)
+        assert tt.probe(54321) is None
+        # extreme values survive the packing
+        key = (1 << 64) - 1
+        tt.store(key, -1, CHECKMATE + 200, LOWER, (1 << 20) - 1)
+        assert tt.probe(key) == (-1, CHECKMATE + 200, LOWER, (1 << 20) - 1)
+
+    def test_same_replacement_as_table(self):
+        tt = self.tt
+        size = len(tt) // 2
+        a, b, c = 1, 1 + size, 1 + 2 * size
+        tt.store(a, 5, 0, EXACT)
+        tt.store(b, 2, 0, EXACT)
+        tt.store(c, 1, 0, EXACT)
+        assert tt.probe(a) is not None
+        assert tt.probe(b) is None
+        tt.store(b, 6, 0, EXACT)
+        assert tt.probe(b) == (6, 0, EXACT, 0)
+        assert tt.probe(a) == (5, 0, EXACT, 0)
+        assert tt.probe(c) is None
+
+    def test_opened_by_name(self):
+        self.tt.store(777, 4, 12, EXACT, 5)
+        other = pickle.loads(pickle.dumps(self.tt))
+        try:
+            assert other.probe(777) == (4, 12, EXACT, 5)
+            other.store(888, 1, 2, LOWER, 3)
+        finally:
+            other.close()
+        assert self.tt.probe(888) == (1, 2, LOWER, 3)
+
+    def test_clear(self):
+        self.tt.store(777, 4, 12, EXACT, 5)
+        other = pickle.loads(pickle.dumps(self.tt))
+        try:
+            # clearing in one process empties the table for the others
+            other.clear()
+            assert self.tt.probe(777) is None
+            self.tt.store(777, 1, 2, LOWER)
+            assert other.probe(777) == (1, 2, LOWER, 0)
+        finally:
+            other.close()
+
+    def test_checks_only_search_with_shared_table(self):
+        # no mate with checks only, so the table is cleared before searching every move
+        board = fen_to_board("5B2/6P1/1p6/8/1N6/kP6/2K5/8 w")
+        stats = {}  # type: dict
+        score, moves, depth = iterative_deepening(board, WHITE, 3, stats, self.tt, checks_only=True)
+        assert score == CHECKMATE
+        assert moves[0].uci() == "g7g8n"
+        assert not stats["checks_only"]
+
+    def test_torn_entry_is_a_miss(self):
+        tt = self.tt
+        tt.store(12345, 3, 7, EXACT, 99)
+        slot = (12345 & tt._mask) << 2
+        # the data of another entry, written without its key word
+        tt._words[slot + 1] ^= 1
+        assert tt.probe(12345) is None
+
+    def test_search_with_shared_table(self):
+        board = fen_to_board("r5rk/5p1p/5R2/4B3/8/8/7P/7K w")
+        stats = {}  # type: dict
+        score, moves, depth = iterative_deepening(board, WHITE, 3, stats, self.tt)
+        assert score == CHECKMATE
+        assert len(moves) == 5
+        assert stats["tt_stores"] > 0